@@ -0,0 +1,128 @@
+# Copyright 2011-2014 Doug Latornell and The University of British Columbia
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Start up time benchmark for bloomcast runs that end early because
+there are no new wind data, as most cron runs do.
+
+Each run executes :func:`bloomcast.bloomcast.main` in a fresh
+interpreter in a scratch copy of the :file:`run/` directory, with the
+wind data probe mocked to return the date in :file:`wind_data_date` so
+that no network access is needed.
+
+Usage::
+
+  python benchmarks/startup.py [runs]
+"""
+import datetime
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = (
+    'arrow', 'bs4', 'mako', 'matplotlib', 'requests', 'SOGcommand')
+
+CHILD_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import datetime
+from unittest import mock
+import bloomcast.bloomcast
+sys.argv = ['bloomcast', 'config.yaml']
+with mock.patch(
+        'bloomcast.wind.WindProcessor.probe_data_date',
+        return_value=datetime.date({date.year}, {date.month}, {date.day})):
+    bloomcast.bloomcast.main()
+print(json.dumps({{
+    'main': time.perf_counter() - start,
+    'heavy_modules': sorted(
+        module for module in {heavy_modules!r} if module in sys.modules),
+}}))
+'''
+
+
+def make_run_dir(scratch_dir, data_date):
+    """Copy the run directory to the scratch directory and adjust its
+    config and infiles for a run that starts on the most recent Sep 19
+    and finds no new wind data.
+    """
+    run_dir = os.path.join(scratch_dir, 'run')
+    shutil.copytree(os.path.join(REPO_DIR, 'run'), run_dir)
+    config_file = os.path.join(run_dir, 'config.yaml')
+    with open(config_file, 'rt') as file_obj:
+        config = yaml.safe_load(file_obj)
+    config['logging']['use_test_smtpd'] = True
+    config['logging']['bloomcast_log_filename'] = 'bloomcast.log'
+    config['logging']['bloom_date_log_filename'] = 'bloom_date.log'
+    with open(config_file, 'wt') as file_obj:
+        yaml.safe_dump(config, file_obj)
+    run_start_year = (
+        data_date.year if data_date >= data_date.replace(month=9, day=19)
+        else data_date.year - 1)
+    base_infile = os.path.join(run_dir, config['infiles']['base'])
+    with open(base_infile, 'rt') as file_obj:
+        infile = yaml.safe_load(file_obj)
+    infile['initial_conditions']['init_datetime']['value'] = (
+        datetime.datetime(run_start_year, 9, 19, 18, 49))
+    with open(base_infile, 'wt') as file_obj:
+        yaml.safe_dump(infile, file_obj)
+    with open(os.path.join(run_dir, 'wind_data_date'), 'wt') as file_obj:
+        file_obj.write('{0:%Y-%m-%d}\n'.format(data_date))
+    return run_dir
+
+
+def run_once(run_dir, data_date):
+    """Run bloomcast in a fresh interpreter and return a dict of the
+    wall clock times for the whole process and for :func:`main`, and
+    the heavy modules that were imported.
+    """
+    code = CHILD_CODE.format(date=data_date, heavy_modules=HEAVY_MODULES)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    start = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, '-c', code], cwd=run_dir, env=env,
+        stderr=subprocess.DEVNULL)
+    result = json.loads(output.decode('utf-8').splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    data_date = datetime.date.today() - datetime.timedelta(days=1)
+    scratch_dir = tempfile.mkdtemp(prefix='bloomcast_startup_')
+    try:
+        run_dir = make_run_dir(scratch_dir, data_date)
+        results = [run_once(run_dir, data_date) for i in range(runs)]
+    finally:
+        shutil.rmtree(scratch_dir)
+    for key in ('process', 'main'):
+        times = [result[key] for result in results]
+        print('{0:>8}: median {1:.3f} s, min {2:.3f} s over {3} runs'
+              .format(key, statistics.median(times), min(times), runs))
+    print('heavy modules imported: {0}'.format(
+        ', '.join(results[-1]['heavy_modules']) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# Copyright 2011-2014 Doug Latornell and The University of British Columbia
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Forcing data archive module for SoG-bloomcast project.
+
+Processed forcing data series are stored per station and quantity as
+NumPy binary files so that SOG forcing data files can be regenerated
+from them without downloading the data again.
+"""
+import logging
+import os
+import sys
+import numpy as np
+
+
+log = logging.getLogger('bloomcast.archive')
+
+
+class ForcingArchive(object):
+    """Archive of forcing data series.
+
+    Each series is stored in the :file:`{archive_dir}/{station_id}/{qty}/`
+    directory as 3 NumPy binary files of equal length arrays:
+
+    * :file:`timestamps.npy`: :kbd:`datetime64[h]` for hourly series,
+      or :kbd:`datetime64[D]` for daily series
+    * :file:`values.npy`: 1 value, or 1 row of components, per timestamp
+    * :file:`patched.npy`: Boolean mask that is true for values that
+      were patched by interpolation
+
+    Series are read through memory mapping.
+    """
+    FIELDS = ('timestamps', 'values', 'patched')
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+
+    def _path(self, station_id, qty, field):
+        return os.path.join(
+            self.archive_dir, str(station_id), qty, '{0}.npy'.format(field))
+
+    def has_series(self, station_id, qty):
+        """Return True if there is a series for the quantity from the
+        station in the archive.
+        """
+        return all(
+            os.path.exists(self._path(station_id, qty, field))
+            for field in self.FIELDS)
+
+    def read(self, station_id, qty, start=None, end=None):
+        """Return a tuple of memory mapped timestamps, values, and
+        patched mask arrays of the series for the quantity from the
+        station.
+
+        If ``start`` or ``end`` are given the arrays are sliced to the
+        timestamps from ``start`` up to, but not including, ``end``.
+        """
+        timestamps, values, patched = (
+            np.load(self._path(station_id, qty, field), mmap_mode='r')
+            for field in self.FIELDS)
+        i, j = 0, timestamps.size
+        if start is not None:
+            i = np.searchsorted(
+                timestamps, np.array(start, dtype=timestamps.dtype))
+        if end is not None:
+            j = np.searchsorted(
+                timestamps, np.array(end, dtype=timestamps.dtype))
+        return timestamps[i:j], values[i:j], patched[i:j]
+
+    def write(self, station_id, qty, timestamps, values, patched):
+        """Store the series for the quantity from the station.
+
+        Archived values at or after the first of the timestamps are
+        replaced by the new ones, and those before it are kept.
+        """
+        timestamps = np.asarray(timestamps)
+        if not timestamps.size:
+            return
+        arrays = (timestamps, np.asarray(values), np.asarray(patched))
+        if self.has_series(station_id, qty):
+            archived = self.read(station_id, qty, end=timestamps[0])
+            arrays = tuple(
+                np.concatenate((old, new))
+                for old, new in zip(archived, arrays))
+        series_dir = os.path.dirname(self._path(station_id, qty, 'timestamps'))
+        os.makedirs(series_dir, exist_ok=True)
+        for field, array in zip(self.FIELDS, arrays):
+            path = self._path(station_id, qty, field)
+            with open(path + '.tmp', 'wb') as file_obj:
+                np.save(file_obj, array)
+            os.replace(path + '.tmp', path)
+        log.debug('archived {0} {1} data values for station {2} to {3}'
+                  .format(timestamps.size, qty, station_id, arrays[0][-1]))
+
+
+def write_forcing_data_files(config):
+    """Write the SOG forcing data files from the series in the forcing
+    data archive.
+    """
+    # Imported here because the processor modules import the archive
+    # via utils
+    from .meteo import MeteoProcessor
+    from .rivers import RiversProcessor
+    from .wind import WindProcessor
+    wind = WindProcessor(config)
+    wind.load_archived_data('wind', config.climate.wind.station_id)
+    with open(config.climate.wind.output_files['wind'], 'wt') as file_obj:
+        file_obj.write(wind.format_data_buffer())
+    meteo = MeteoProcessor(config)
+    for qty in config.climate.meteo.quantities:
+        meteo.load_archived_data(qty, config.climate.meteo.station_id)
+        with open(config.climate.meteo.output_files[qty], 'wt') as file_obj:
+            file_obj.write(meteo.format_data_buffer(qty))
+    rivers = RiversProcessor(config)
+    for river in 'major minor'.split():
+        rivers.load_archived_data(
+            river, getattr(config.rivers, river).station_id)
+        with open(config.rivers.output_files[river], 'wt') as file_obj:
+            file_obj.write(rivers.format_data_buffer(river))
+
+
+def run(config_file):
+    """Regenerate the SOG forcing data files from the forcing data
+    archive independent of bloomcast.
+    """
+    from .utils import Config
+    logging.basicConfig(level=logging.DEBUG)
+    config = Config()
+    config.load_config(config_file)
+    write_forcing_data_files(config)
+
+
+if __name__ == '__main__':
+    run(sys.argv[1])
@@ -14,7 +14,7 @@
 
 """Driver module for SoG-bloomcast project
 """
-from copy import copy
+import calendar
 import datetime
 import logging
 import logging.handlers
@@ -22,26 +22,24 @@ import math
 import os
 import subprocess
 import sys
-import time
-import arrow
 import numpy as np
-import mako.template
-from matplotlib.dates import (
-    date2num,
-    DateFormatter,
-    DayLocator,
-    HourLocator,
-    MonthLocator,
+# matplotlib, mako, and SOGcommand are imported in the methods of the
+# stages that use them so that runs that end early because there are
+# no new wind data start quickly
+from .ensemble import (
+    BloomWatcher,
+    EnsembleScheduler,
+    RunProgress,
+    RunWatchdog,
+    SOG_RunCache,
+    median_wall_times,
 )
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_agg import FigureCanvasAgg
-import SOGcommand
 from .meteo import MeteoProcessor
 from .rivers import RiversProcessor
 from .utils import (
     Config,
-    SOG_HoffmuellerProfile,
-    SOG_Timeseries,
+    read_SOG_Hoffmueller_profiles,
+    read_SOG_timeseries,
 )
 from .wind import WindProcessor
 
@@ -59,7 +57,14 @@ class Bloomcast(object):
 
     :arg config_file: Path for the bloomcast configuration file.
     :type config_file: string
+
+    The ensemble member with the :kbd:`avg_forcing` key is the central
+    estimate; all other members provide the bounds on it.
     """
+    central_member = 'avg_forcing'
+    # Spring bloom criterion; see _calc_bloom_date()
+    NITRATE_HALF_SATURATION_CONCENTRATION = 0.5  # uM
+    PHYTOPLANKTON_PEAK_WINDOW_HALF_WIDTH = 4     # days
     # Colours for graph lines
     nitrate_colours = {'avg': '#30b8b8', 'bounds': '#82dcdc'}
     diatoms_colours = {'avg': 'green', 'bounds': '#56c056'}
@@ -99,14 +104,14 @@ class Bloomcast(object):
         # river flow data are available.
         # River flow data are only available in a rolling 18-month window.
         run_start_yr_jan1 = (
-            arrow.get(self.config.run_start_date).replace(month=1, day=1))
-        river_date_limit = arrow.now().replace(months=-18)
+            self.config.run_start_date.date().replace(month=1, day=1))
+        river_date_limit = _months_before(datetime.date.today(), 18)
         if run_start_yr_jan1 < river_date_limit:
             log.error(
                 'A bloomcast run starting {0.run_start_date:%Y-%m-%d} cannot '
                 'be done today because there are no river flow data availble '
-                'prior to {1}'
-                .format(self.config, river_date_limit.format('YYYY-MM-DD')))
+                'prior to {1:%Y-%m-%d}'
+                .format(self.config, river_date_limit))
             return
         try:
             self._get_forcing_data()
@@ -114,10 +119,19 @@ class Bloomcast(object):
             log.info('Wind data date {0:%Y-%m-%d} is unchanged since last run'
                      .format(self.config.data_date))
             return
-        self._run_SOG()
-        self._get_results_timeseries()
+        self._init_results()
+        for key in self._run_SOG():
+            self._get_results_timeseries(key)
+            self._get_results_profiles(key)
+        # Members whose runs failed have no results
+        self.members = [
+            key for key in self.config.infiles['edits'] if key in self.nitrate]
+        if self.central_member not in self.members:
+            log.error(
+                'SOG {0} run failed, so there are no bloomcast results'
+                .format(self.central_member))
+            return
         self._create_timeseries_graphs()
-        self._get_results_profiles()
         self._create_profile_graphs()
         self._calc_bloom_date()
         self._render_results()
@@ -182,10 +196,6 @@ class Bloomcast(object):
         if not self.config.get_forcing_data:
             log.info('Skipped collection and processing of forcing data')
             return
-        wind = WindProcessor(self.config)
-        self.config.data_date = wind.make_forcing_data_file()
-        log.info('based on wind data forcing data date is {0:%Y-%m-%d}'
-                 .format(self.config.data_date))
         try:
             with open('wind_data_date', 'rt') as file_obj:
                 last_data_date = datetime.datetime.strptime(
@@ -193,6 +203,16 @@ class Bloomcast(object):
         except IOError:
             # Fake a wind data date to get things rolling
             last_data_date = self.config.run_start_date.date()
+        wind = WindProcessor(self.config)
+        # Check the latest month of wind data before downloading and
+        # processing all of it
+        probe_data_date = wind.probe_data_date()
+        if probe_data_date == last_data_date:
+            self.config.data_date = probe_data_date
+            raise NoNewWindData
+        self.config.data_date = wind.make_forcing_data_file()
+        log.info('based on wind data forcing data date is {0:%Y-%m-%d}'
+                 .format(self.config.data_date))
         if self.config.data_date == last_data_date:
             raise NoNewWindData
         else:
@@ -204,61 +224,129 @@ class Bloomcast(object):
         rivers.make_forcing_data_files()
 
     def _run_SOG(self):
-        """Run SOG.
+        """Run SOG for the ensemble members with no more than the
+        configured maximum number of runs at a time, and generate the
+        member keys in the order that their runs finish.
+
+        The keys of members whose runs are terminated by the watchdog
+        are not generated.
         """
         if not self.config.run_SOG:
             log.info('Skipped running SOG')
+            yield from self.config.infiles['edits']
             return
-        processes = {}
-        base_infile = self.config.infiles['base']
-        for key in self.config.infiles['edits']:
-            proc = SOGcommand.api.run(
-                self.config.SOG_executable,
-                base_infile,
-                self.config.infiles['edits'][key],
-                key + '.stdout')
-            processes[key] = proc
-            log.info('SOG {0} run started at {1:%Y-%m-%d %H:%M:%S} as pid {2}'
-                     .format(key, datetime.datetime.now(), proc.pid))
-        while processes:
-            time.sleep(30)
-            for key, proc in copy(processes).items():
-                if proc.poll() is None:
-                    continue
-                else:
-                    processes.pop(key)
-                    log.info('SOG {0} run finished at {1:%Y-%m-%d %H:%M:%S}'
-                             .format(key, datetime.datetime.now()))
-
-    def _get_results_timeseries(self):
-        """Read SOG results time series of interest and create
-        SOG_Timeseries objects from them.
+        run_cache = None
+        if self.config.SOG_run_cache:
+            run_cache = SOG_RunCache(
+                self.config.SOG_run_cache['dir'],
+                self.config.SOG_run_cache['max_size_mb'] * 1024 * 1024)
+        scheduler = EnsembleScheduler(
+            self.config.SOG_executable, self.config.infiles['base'],
+            self.config.max_concurrent_SOG_runs,
+            self.config.logging.run_metrics_log_filename, run_cache,
+            self.config.logging.SOG_progress_log_interval)
+        wall_times = {}
+        if self.config.SOG_watchdog:
+            wall_times = median_wall_times(
+                self.config.logging.run_metrics_log_filename)
+        for key, edit_files in self.config.infiles['edits'].items():
+            run_hours = (
+                self.config.run_end_dates[key] - self.config.run_start_date)
+            scheduler.add_member(
+                key, edit_files, self._bloom_watcher(key),
+                RunProgress(
+                    self.config.std_bio_ts_outfiles[key],
+                    run_hours.total_seconds() / 3600),
+                self._run_watchdog(key, wall_times))
+        yield from scheduler.run()
+
+    def _run_watchdog(self, key, wall_times):
+        """Return a RunWatchdog for the ensemble member's SOG run, or None
+        if the watchdog is not configured.
+
+        The member's wall time budget is the configured factor times the
+        median wall time of its recent completed runs in ``wall_times``.
+        Members with no run history have no wall time budget.
+        """
+        if not self.config.SOG_watchdog:
+            return None
+        watchdog = self.config.SOG_watchdog
+        budget = None
+        if key in wall_times:
+            budget = watchdog['budget_factor'] * wall_times[key]
+        return RunWatchdog(
+            self.config.std_bio_ts_outfiles[key], budget,
+            watchdog['stall_timeout'])
+
+    def _bloom_watcher(self, key):
+        """Return a BloomWatcher that allows the ensemble member's SOG run
+        to be stopped early once its bloom date can be determined, or
+        None if early stopping is not configured.
+
+        Runs are not stopped before the end of the day after the wind
+        data date so that the profiles and mixing layer depth graphs
+        have their data.
+        """
+        margin_days = self.config.SOG_early_stop_margin_days
+        if margin_days is None:
+            return None
+
+        def hours_after_start(date):
+            hours = (
+                datetime.datetime.combine(date, datetime.time())
+                - self.config.run_start_date)
+            return hours.total_seconds() / 3600
+        jan1 = datetime.date(self.config.run_start_date.year + 1, 1, 1)
+        return BloomWatcher(
+            self.config.std_bio_ts_outfiles[key],
+            jan1_hours=hours_after_start(jan1),
+            steps_per_day=86400 // self.config.SOG_timestep,
+            not_before_hours=hours_after_start(
+                self.config.data_date + datetime.timedelta(days=2)),
+            nitrate_threshold=self.NITRATE_HALF_SATURATION_CONCENTRATION,
+            peak_half_width=self.PHYTOPLANKTON_PEAK_WINDOW_HALF_WIDTH,
+            margin_days=margin_days)
+
+    def _bound_members(self):
+        """Return the list of the keys of the ensemble members with
+        results other than the central one.
+        """
+        return [key for key in self.members if key != self.central_member]
+
+    def _init_results(self):
+        """Create the empty dicts of results time series and profiles
+        objects keyed by ensemble member.
         """
         self.nitrate, self.diatoms = {}, {}
         self.temperature, self.salinity = {}, {}
         self.mixing_layer_depth = {}
-        for key in self.config.infiles['edits']:
-            std_bio_ts_outfile = self.config.std_bio_ts_outfiles[key]
-            std_phys_ts_outfile = self.config.std_phys_ts_outfiles[key]
-            self.nitrate[key] = SOG_Timeseries(std_bio_ts_outfile)
-            self.nitrate[key].read_data(
-                'time', '3 m avg nitrate concentration')
-            self.nitrate[key].calc_mpl_dates(self.config.run_start_date)
-            self.diatoms[key] = SOG_Timeseries(std_bio_ts_outfile)
-            self.diatoms[key].read_data(
-                'time', '3 m avg micro phytoplankton biomass')
-            self.diatoms[key].calc_mpl_dates(self.config.run_start_date)
-            self.temperature[key] = SOG_Timeseries(std_phys_ts_outfile)
-            self.temperature[key].read_data('time', '3 m avg temperature')
-            self.temperature[key].calc_mpl_dates(self.config.run_start_date)
-            self.salinity[key] = SOG_Timeseries(std_phys_ts_outfile)
-            self.salinity[key].read_data('time', '3 m avg salinity')
-            self.salinity[key].calc_mpl_dates(self.config.run_start_date)
-            self.mixing_layer_depth[key] = SOG_Timeseries(std_phys_ts_outfile)
-            self.mixing_layer_depth[key].read_data(
-                'time', 'mixing layer depth')
-            self.mixing_layer_depth[key].calc_mpl_dates(
-                self.config.run_start_date)
+        self.nitrate_profile, self.diatoms_profile = {}, {}
+        self.temperature_profile, self.salinity_profile = {}, {}
+
+    def _get_results_timeseries(self, key):
+        """Read SOG results time series of interest for the ensemble
+        member and create SOG_Timeseries objects from them.
+        """
+        bio = read_SOG_timeseries(
+            self.config.std_bio_ts_outfiles[key], 'time',
+            ['3 m avg nitrate concentration',
+             '3 m avg micro phytoplankton biomass'])
+        self.nitrate[key] = bio['3 m avg nitrate concentration']
+        self.diatoms[key] = bio['3 m avg micro phytoplankton biomass']
+        phys = read_SOG_timeseries(
+            self.config.std_phys_ts_outfiles[key], 'time',
+            ['3 m avg temperature', '3 m avg salinity',
+             'mixing layer depth'])
+        self.temperature[key] = phys['3 m avg temperature']
+        self.salinity[key] = phys['3 m avg salinity']
+        self.mixing_layer_depth[key] = phys['mixing layer depth']
+        for timeseries in (bio, phys):
+            # The time series from a file share their time values, so
+            # their matplotlib dates are only calculated once
+            first, *others = timeseries.values()
+            first.calc_mpl_dates(self.config.run_start_date)
+            for relation in others:
+                relation.mpl_dates = first.mpl_dates
 
     def _create_timeseries_graphs(self):
         """Create time series graph objects.
@@ -279,26 +367,30 @@ class Bloomcast(object):
         """Create a time series graph figure object with 2 time series
         plotted on the left and right y axes.
         """
+        from matplotlib.dates import date2num, DateFormatter, MonthLocator
+        from matplotlib.figure import Figure
         fig = Figure((8, 3), facecolor='white')
         ax_left = fig.add_subplot(1, 1, 1)
         ax_left.set_position((0.125, 0.1, 0.775, 0.75))
         fig.ax_left = ax_left
         ax_right = ax_left.twinx()
         ax_right.set_position(ax_left.get_position())
-        predicate = (left_ts['avg_forcing'].mpl_dates
-                     >= date2num(self.config.data_date))
-        for key in 'early_bloom_forcing late_bloom_forcing'.split():
-            ax_left.plot(left_ts[key].mpl_dates[predicate],
-                         left_ts[key].dep_data[predicate],
+        central = self.central_member
+        for key in self._bound_members():
+            # Members' runs may have been stopped at different times
+            window = left_ts[key].window_slice(
+                date2num(self.config.data_date), mpl_dates=True)
+            ax_left.plot(left_ts[key].mpl_dates[window],
+                         left_ts[key].dep_data[window],
                          color=colors[0]['bounds'])
-            ax_right.plot(right_ts[key].mpl_dates[predicate],
-                          right_ts[key].dep_data[predicate],
+            ax_right.plot(right_ts[key].mpl_dates[window],
+                          right_ts[key].dep_data[window],
                           color=colors[1]['bounds'])
-        ax_left.plot(left_ts['avg_forcing'].mpl_dates,
-                     left_ts['avg_forcing'].dep_data,
+        ax_left.plot(left_ts[central].mpl_dates,
+                     left_ts[central].dep_data,
                      color=colors[0]['avg'])
-        ax_right.plot(right_ts['avg_forcing'].mpl_dates,
-                      right_ts['avg_forcing'].dep_data,
+        ax_right.plot(right_ts[central].mpl_dates,
+                      right_ts[central].dep_data,
                       color=colors[1]['avg'])
         ax_left.set_ylabel(titles[0], color=colors[0]['avg'], size='x-small')
         ax_right.set_ylabel(titles[1], color=colors[1]['avg'], size='x-small')
@@ -312,8 +404,8 @@ class Bloomcast(object):
             for label in axis.get_xticklabels() + axis.get_yticklabels():
                 label.set_size('x-small')
         ax_left.set_xlim(
-            (int(left_ts['avg_forcing'].mpl_dates[0]),
-             math.ceil(left_ts['avg_forcing'].mpl_dates[-1])))
+            (int(left_ts[central].mpl_dates[0]),
+             math.ceil(left_ts[central].mpl_dates[-1])))
         ax_left.set_xlabel(
             'Year-days in {0} and {1}'
             .format(self.config.run_start_date.year,
@@ -325,16 +417,23 @@ class Bloomcast(object):
         """Create a time series graph figure object of the mixing
         layer depth on the wind data date and the 6 days preceding it.
         """
+        from matplotlib.dates import (
+            date2num,
+            DateFormatter,
+            DayLocator,
+            HourLocator,
+        )
+        from matplotlib.figure import Figure
         fig = Figure((8, 3), facecolor='white')
         ax = fig.add_subplot(1, 1, 1)
         ax.set_position((0.125, 0.1, 0.775, 0.75))
-        predicate = np.logical_and(
-            self.mixing_layer_depth['avg_forcing'].mpl_dates
-            > date2num(self.config.data_date - datetime.timedelta(days=6)),
-            self.mixing_layer_depth['avg_forcing'].mpl_dates
-            <= date2num(self.config.data_date + datetime.timedelta(days=1)))
-        mpl_dates = self.mixing_layer_depth['avg_forcing'].mpl_dates[predicate]
-        dep_data = self.mixing_layer_depth['avg_forcing'].dep_data[predicate]
+        mixing_layer_depth = self.mixing_layer_depth[self.central_member]
+        window = mixing_layer_depth.window_slice(
+            date2num(self.config.data_date - datetime.timedelta(days=6)),
+            date2num(self.config.data_date + datetime.timedelta(days=1)),
+            mpl_dates=True, exclusive_start=True)
+        mpl_dates = mixing_layer_depth.mpl_dates[window]
+        dep_data = mixing_layer_depth.dep_data[window]
         ax.plot(mpl_dates, dep_data, color='magenta')
         ax.set_ylabel(
             'Mixing Layer Depth [m]', color='magenta', size='x-small')
@@ -355,33 +454,21 @@ class Bloomcast(object):
             loc='upper right', prop={'size': 'xx-small'})
         return fig
 
-    def _get_results_profiles(self):
-        """Read SOG results profiles of interest and create
-        SOG_HoffmuellerProfile objects from them.
+    def _get_results_profiles(self, key):
+        """Read SOG results profiles of interest for the ensemble member
+        and create SOG_HoffmuellerProfile objects from them.
         """
-        self.nitrate_profile, self.diatoms_profile = {}, {}
-        self.temperature_profile, self.salinity_profile = {}, {}
-        for key in self.config.infiles['edits']:
-            Hoffmueller_outfile = (
-                self.config.Hoffmueller_profiles_outfiles[key])
-            profile_number = (
-                self.config.data_date - self.config.run_start_date.date()).days
-            self.nitrate_profile[key] = SOG_HoffmuellerProfile(
-                Hoffmueller_outfile)
-            self.nitrate_profile[key].read_data(
-                'depth', 'nitrate', profile_number)
-            self.diatoms_profile[key] = SOG_HoffmuellerProfile(
-                Hoffmueller_outfile)
-            self.diatoms_profile[key].read_data(
-                'depth', 'micro phytoplankton', profile_number)
-            self.temperature_profile[key] = SOG_HoffmuellerProfile(
-                Hoffmueller_outfile)
-            self.temperature_profile[key].read_data(
-                'depth', 'temperature', profile_number)
-            self.salinity_profile[key] = SOG_HoffmuellerProfile(
-                Hoffmueller_outfile)
-            self.salinity_profile[key].read_data(
-                'depth', 'salinity', profile_number)
+        Hoffmueller_outfile = self.config.Hoffmueller_profiles_outfiles[key]
+        profile_number = (
+            self.config.data_date - self.config.run_start_date.date()).days
+        profiles = read_SOG_Hoffmueller_profiles(
+            Hoffmueller_outfile, 'depth',
+            ['nitrate', 'micro phytoplankton', 'temperature', 'salinity'],
+            profile_number)
+        self.nitrate_profile[key] = profiles['nitrate']
+        self.diatoms_profile[key] = profiles['micro phytoplankton']
+        self.temperature_profile[key] = profiles['temperature']
+        self.salinity_profile[key] = profiles['salinity']
 
     def _create_profile_graphs(self):
         """Create profile graph objects.
@@ -390,19 +477,19 @@ class Bloomcast(object):
             self.config.data_date, datetime.time(12))
         profile_dt = profile_datetime - self.config.run_start_date
         profile_hour = profile_dt.days * 24 + profile_dt.seconds / 3600
-        self.mixing_layer_depth['avg_forcing'].boolean_slice(
-            self.mixing_layer_depth['avg_forcing'].indep_data >= profile_hour)
-        mixing_layer_depth = self.mixing_layer_depth['avg_forcing'].dep_data[0]
+        central = self.central_member
+        mixing_layer_depth = (
+            self.mixing_layer_depth[central].value_at(profile_hour))
         self.fig_temperature_salinity_profile = self._two_axis_profile(
-            self.temperature_profile['avg_forcing'],
-            self.salinity_profile['avg_forcing'],
+            self.temperature_profile[central],
+            self.salinity_profile[central],
             mixing_layer_depth,
             titles=('Temperature [deg C]', 'Salinity [-]'),
             colors=(self.temperature_colours, self.salinity_colours),
             limits=((4, 10), (20, 30)))
         self.fig_nitrate_diatoms_profile = self._two_axis_profile(
-            self.nitrate_profile['avg_forcing'],
-            self.diatoms_profile['avg_forcing'],
+            self.nitrate_profile[central],
+            self.diatoms_profile[central],
             mixing_layer_depth,
             titles=('Nitrate Concentration [uM N]', 'Diatom Biomass [uM N]'),
             colors=(self.nitrate_colours, self.diatoms_colours))
@@ -412,6 +499,7 @@ class Bloomcast(object):
         """Create a profile graph figure object with 2 profiles
         plotted on the top and bottom x axes.
         """
+        from matplotlib.figure import Figure
         fig = Figure((4, 8), facecolor='white')
         ax_bottom = fig.add_subplot(1, 1, 1)
         ax_bottom.set_position((0.19, 0.1, 0.5, 0.8))
@@ -461,29 +549,38 @@ class Bloomcast(object):
         going below 0.5 uM (the half-saturation concentration) for two
         consecutive days."
         """
-        NITRATE_HALF_SATURATION_CONCENTRATION = 0.5  # uM
-        PHYTOPLANKTON_PEAK_WINDOW_HALF_WIDTH = 4     # days
-        key = 'avg_forcing'
         self.bloom_date, self.bloom_biomass = {}, {}
-        for key in self.config.infiles['edits']:
+        for key in self.members:
             self._clip_results_to_jan1(key)
             self._reduce_results_to_daily(key)
             first_low_nitrate_days = self._find_low_nitrate_days(
-                key, NITRATE_HALF_SATURATION_CONCENTRATION)
+                key, self.NITRATE_HALF_SATURATION_CONCENTRATION)
             self._find_phytoplankton_peak(
                 key, first_low_nitrate_days,
-                PHYTOPLANKTON_PEAK_WINDOW_HALF_WIDTH)
+                self.PHYTOPLANKTON_PEAK_WINDOW_HALF_WIDTH)
         if self.config.get_forcing_data or self.config.run_SOG:
             line = ('  {0}      {1}  {2:.4f}'
                     .format(self.config.data_date,
-                            self.bloom_date['avg_forcing'],
-                            self.bloom_biomass['avg_forcing']))
-            for key in 'early_bloom_forcing late_bloom_forcing'.split():
+                            self.bloom_date[self.central_member],
+                            self.bloom_biomass[self.central_member]))
+            for key in self._bloom_date_bounds():
                 line += ('         {0}  {1:.4f}'
                          .format(self.bloom_date[key],
                                  self.bloom_biomass[key]))
             bloom_date_log.info(line)
 
+    def _bloom_date_bounds(self):
+        """Return a list of the keys of the bound ensemble members that
+        have the earliest and latest bloom dates.
+
+        The list is empty if there are no bound members.
+        """
+        bound_members = self._bound_members()
+        if not bound_members:
+            return []
+        return [min(bound_members, key=self.bloom_date.get),
+                max(bound_members, key=self.bloom_date.get)]
+
     def _clip_results_to_jan1(self, key):
         """Clip the nitrate concentration and diatom biomass results
         so that they start on 1-Jan of the bloom year.
@@ -491,9 +588,8 @@ class Bloomcast(object):
         jan1 = datetime.datetime(self.config.run_start_date.year + 1, 1, 1)
         discard_hours = jan1 - self.config.run_start_date
         discard_hours = discard_hours.days * 24 + discard_hours.seconds / 3600
-        predicate = self.nitrate[key].indep_data >= discard_hours
-        self.nitrate[key].boolean_slice(predicate)
-        self.diatoms[key].boolean_slice(predicate)
+        self.nitrate[key].window(discard_hours)
+        self.diatoms[key].window(discard_hours)
 
     def _reduce_results_to_daily(self, key):
         """Reduce the nitrate concentration and diatom biomass results
@@ -557,10 +653,7 @@ class Bloomcast(object):
         late_bloom_date = first_low_nitrate_days[1] + half_width_days
         log.debug('Bloom window for {0} is between {1} and {2}'
                   .format(key_string, early_bloom_date, late_bloom_date))
-        self.diatoms[key].boolean_slice(
-            self.diatoms[key].indep_data >= early_bloom_date)
-        self.diatoms[key].boolean_slice(
-            self.diatoms[key].indep_data <= late_bloom_date)
+        self.diatoms[key].window(early_bloom_date, late_bloom_date)
         log.debug('Dates in {0} bloom window:\n{1}'
                   .format(key_string, self.diatoms[key].indep_data))
         log.debug('Micro phytoplankton biomass values in '
@@ -578,6 +671,9 @@ class Bloomcast(object):
     def _render_results(self):
         """Render bloomcast results page and graphs to files.
         """
+        import mako.template
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.dates import date2num
         tmpl_path = os.path.abspath(
             os.path.join(self.config.html_results, 'results.mako'))
         tmpl = mako.template.Template(filename=tmpl_path)
@@ -585,10 +681,14 @@ class Bloomcast(object):
         with open(filename, 'rt') as file_obj:
             bloom_date_log = [line.split() for line in file_obj
                               if not line.startswith('#')]
+        bloom_date_bounds = self._bloom_date_bounds()
         context = {
             'run_start_date': self.config.run_start_date,
             'data_date': self.config.data_date,
+            'central_member': self.central_member,
+            'ensemble_size': len(self.members),
             'bloom_date': self.bloom_date,
+            'bloom_date_bounds': bloom_date_bounds,
             'bloom_date_log': bloom_date_log,
         }
         results_path = os.path.join(self.config.html_results, 'results.html')
@@ -606,14 +706,15 @@ class Bloomcast(object):
         ]
         for fig, filename in graphs:
             try:
-                for key in 'early_bloom_forcing late_bloom_forcing'.split():
+                for key in bloom_date_bounds:
                     fig.ax_left.axvline(
                         date2num(datetime.datetime.combine(
                             self.bloom_date[key], datetime.time(12))),
                         color=self.diatoms_colours['bounds'])
                 bloom_date_line = fig.ax_left.axvline(
                     date2num(datetime.datetime.combine(
-                        self.bloom_date['avg_forcing'], datetime.time(12))),
+                        self.bloom_date[self.central_member],
+                        datetime.time(12))),
                     color=self.diatoms_colours['avg'])
                 fig.legend(
                     [fig.data_date_line, bloom_date_line],
@@ -637,6 +738,17 @@ class Bloomcast(object):
                         self.config.results_dir).split())
 
 
+def _months_before(date, months):
+    """Return the date that is the specified number of months before
+    the date, clamped to the last day of the month if necessary.
+    """
+    month_index = date.year * 12 + date.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
 def main():
     try:
         config_file = sys.argv[1]
@@ -0,0 +1,810 @@
+# Copyright 2011-2014 Doug Latornell and The University of British Columbia
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""SOG ensemble run scheduling module for SoG-bloomcast project.
+"""
+import collections
+import datetime
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from .utils import read_merged_SOG_infile
+
+
+log = logging.getLogger('bloomcast.ensemble')
+
+
+class EnsembleScheduler(object):
+    """Run SOG for the members of an ensemble from a job queue with no
+    more than a maximum number of runs at a time.
+
+    :arg SOG_executable: Path of the SOG executable.
+    :type SOG_executable: string
+
+    :arg base_infile: Path of the SOG YAML infile that the edit files of
+                      the members are applied to.
+    :type base_infile: string
+
+    :arg max_concurrent: Maximum number of concurrent SOG runs;
+                         the number of CPU cores if None or 0.
+    :type max_concurrent: int
+
+    :arg metrics_file: Path of the file to append the resource usage
+                       metrics of each run to as a line of JSON.
+    :type metrics_file: string
+
+    :arg run_cache: Cache of SOG run results to restore members from
+                    instead of running SOG for them.
+    :type run_cache: :py:class:`SOG_RunCache`
+
+    :arg progress_interval: Seconds between log messages about the
+                            progress of the runs of members that have
+                            a :py:class:`RunProgress`.
+    :type progress_interval: number
+    """
+    def __init__(
+        self, SOG_executable, base_infile, max_concurrent=None,
+        metrics_file=None, run_cache=None, progress_interval=None,
+    ):
+        self.SOG_executable = SOG_executable
+        self.base_infile = base_infile
+        self.max_concurrent = max_concurrent or os.cpu_count() or 1
+        self.metrics_file = metrics_file
+        self.run_cache = run_cache
+        self.progress_interval = progress_interval
+        self.jobs = collections.deque()
+        self.running = {}
+        self.metrics = {}
+        self._run_digests = {}
+        self._watchers = {}
+        self._progress = {}
+        self._watchdogs = {}
+        self._stopped_early = set()
+        self.failed = {}
+        self._finished = queue.Queue()
+
+    def add_member(
+        self, key, edit_files, watcher=None, progress=None, watchdog=None,
+    ):
+        """Add a member to the end of the job queue.
+
+        If a :py:class:`BloomWatcher` is given the member's run is
+        stopped as soon as the watcher reports that the bloom date can
+        be determined from the results that the run has written.
+
+        If a :py:class:`RunProgress` is given the progress of the
+        member's run is logged, and its simulated hours and throughput
+        are included in its metrics.
+
+        If a :py:class:`RunWatchdog` is given the member's run is
+        terminated and marked as failed if it takes too long or its
+        results stop growing.
+        """
+        self.jobs.append((key, edit_files))
+        if watcher is not None:
+            self._watchers[key] = watcher
+        if progress is not None:
+            self._progress[key] = progress
+        if watchdog is not None:
+            self._watchdogs[key] = watchdog
+
+    def run(self):
+        """Start runs from the job queue whenever there is a free slot,
+        and generate the member keys in the order that their runs
+        finish.
+
+        The keys of members whose runs were terminated by their watchdog
+        are not generated; they are in the :py:attr:`failed` dict with
+        the reasons that their runs were terminated.
+        """
+        import SOGcommand
+        all_finished = threading.Event()
+        if self.progress_interval and self._progress:
+            monitor = threading.Thread(
+                target=self._monitor_progress, args=(all_finished,),
+                daemon=True)
+            monitor.start()
+        try:
+            while self.jobs or self.running:
+                while self.jobs and len(self.running) < self.max_concurrent:
+                    key, edit_files = self.jobs.popleft()
+                    if self._restore_cached_run(key, edit_files):
+                        yield key
+                        continue
+                    self._start_run(SOGcommand, key, edit_files)
+                if not self.running:
+                    continue
+                key, metrics = self._finished.get()
+                self.running.pop(key)
+                log.info('SOG {0} run finished at {1:%Y-%m-%d %H:%M:%S}'
+                         .format(key, datetime.datetime.now()))
+                self._add_throughput_metrics(key, metrics)
+                self._record_metrics(key, metrics)
+                if key in self.failed:
+                    continue
+                self._cache_run(key, metrics)
+                yield key
+        finally:
+            all_finished.set()
+        self._log_metrics_summary()
+
+    def _monitor_progress(self, all_finished):
+        """Log the progress of the running members and the ensemble at
+        the progress interval until all of the runs have finished.
+        """
+        while not all_finished.wait(self.progress_interval):
+            self._log_progress()
+
+    def _log_progress(self):
+        """Log the simulated time, throughput, and estimated time of
+        completion of each running member that has a RunProgress, and
+        for the ensemble.
+
+        The ensemble estimate is the simulated time that remains for the
+        running and queued members divided by the total throughput of
+        the running ones.
+        """
+        now = datetime.datetime.now()
+        total_throughput, remaining_hours = 0, 0
+        for key in list(self.running):
+            progress = self._progress.get(key)
+            if progress is None:
+                continue
+            progress.update()
+            throughput = progress.throughput()
+            if not throughput:
+                continue
+            total_throughput += throughput
+            remaining_hours += progress.remaining_hours
+            log.debug(
+                'SOG {0} run at {1:.0f} of {2:.0f} simulated hours, '
+                '{3:.1f} simulated hours/s, ETA {4:%Y-%m-%d %H:%M:%S}'
+                .format(
+                    key, progress.latest_hours, progress.run_hours,
+                    throughput, now + datetime.timedelta(
+                        seconds=progress.remaining_hours / throughput)))
+        if not total_throughput:
+            return
+        jobs = list(self.jobs)
+        remaining_hours += sum(
+            self._progress[key].run_hours for key, edit_files in jobs
+            if key in self._progress)
+        log.info(
+            'SOG ensemble has {0} runs in progress and {1} queued, '
+            '{2:.1f} simulated hours/s, ETA {3:%Y-%m-%d %H:%M:%S}'
+            .format(
+                len(self.running), len(jobs), total_throughput,
+                now + datetime.timedelta(
+                    seconds=remaining_hours / total_throughput)))
+
+    def _add_throughput_metrics(self, key, metrics):
+        """Add the simulated hours and the throughput in simulated hours
+        per second of a member's finished run to its metrics.
+        """
+        if key not in self._progress:
+            return
+        progress = self._progress[key]
+        progress.update()
+        metrics['simulated_hours'] = progress.latest_hours
+        metrics['throughput'] = (
+            progress.latest_hours / metrics['wall_time']
+            if metrics['wall_time'] else None)
+
+    def _restore_cached_run(self, key, edit_files):
+        """Restore the results of a member's run from the run cache and
+        return True if its inputs are the same as those of a cached run.
+        """
+        if self.run_cache is None:
+            return False
+        digest = self.run_cache.digest(
+            self.SOG_executable, self.base_infile, edit_files)
+        self._run_digests[key] = (digest, edit_files)
+        if not self.run_cache.restore(digest, self.base_infile, edit_files):
+            return False
+        log.info('SOG {0} run results restored from run cache {1}'
+                 .format(key, digest))
+        return True
+
+    def _cache_run(self, key, metrics):
+        """Store the results of a member's run in the run cache if the
+        run succeeded.
+
+        Runs that were stopped early have incomplete results and a
+        non-zero return code, so they are not stored.
+        """
+        if self.run_cache is None or metrics['returncode'] != 0:
+            return
+        digest, edit_files = self._run_digests[key]
+        self.run_cache.store(digest, self.base_infile, edit_files)
+        log.debug('SOG {0} run results stored in run cache {1}'
+                  .format(key, digest))
+
+    def _start_run(self, SOGcommand, key, edit_files):
+        """Start the SOG run for a member, and a thread that waits for
+        it to end.
+        """
+        started = datetime.datetime.now()
+        start_time = time.monotonic()
+        proc = SOGcommand.api.run(
+            self.SOG_executable, self.base_infile, edit_files,
+            key + '.stdout')
+        self.running[key] = proc
+        if key in self._progress:
+            self._progress[key].start()
+        log.info('SOG {0} run started at {1:%Y-%m-%d %H:%M:%S} as pid {2}'
+                 .format(key, started, proc.pid))
+        finished = threading.Event()
+        waiter = threading.Thread(
+            target=self._wait_for_run,
+            args=(key, proc, started, start_time, finished), daemon=True)
+        waiter.start()
+        if key in self._watchdogs:
+            self._watchdogs[key].start()
+        if key in self._watchers or key in self._watchdogs:
+            watcher = threading.Thread(
+                target=self._watch_run, args=(key, proc, finished),
+                daemon=True)
+            watcher.start()
+
+    def _watch_run(self, key, proc, finished):
+        """Check the SOG run at the shortest of its bloom watcher and
+        watchdog intervals, and terminate it when the bloom watcher
+        reports that the rest of the run is not needed, or when the
+        watchdog reports that the run is hung or too slow.
+        """
+        watcher = self._watchers.get(key)
+        watchdog = self._watchdogs.get(key)
+        interval = min(
+            monitor.interval for monitor in (watcher, watchdog)
+            if monitor is not None)
+        while not finished.wait(interval):
+            if watcher is not None and watcher.update():
+                self._stopped_early.add(key)
+                self._terminate(proc, finished)
+                log.info(
+                    'SOG {0} run stopped early at {1:.1f} hours of '
+                    'simulated time; first low nitrate days are day {2} '
+                    'and {3} after 1-Jan'
+                    .format(key, watcher.latest_hours,
+                            *watcher.first_low_nitrate_days))
+                return
+            reason = watchdog.check() if watchdog is not None else None
+            if reason is not None:
+                self.failed[key] = reason
+                self._terminate(proc, finished)
+                log.warning(
+                    'SOG {0} run (pid {1}) terminated by watchdog because '
+                    '{2}; continuing without its results'
+                    .format(key, proc.pid, reason))
+                return
+
+    def _terminate(self, proc, finished):
+        """Terminate the SOG run process, and kill it if it has not
+        ended after a grace period.
+        """
+        if finished.is_set():
+            return
+        proc.terminate()
+        if not finished.wait(RunWatchdog.KILL_GRACE_PERIOD):
+            proc.kill()
+
+    def _wait_for_run(self, key, proc, started, start_time, finished):
+        """Block until the SOG run process ends and reap it, then put
+        its member key and a dict of its resource usage metrics on the
+        finished queue.
+        """
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            # Already reaped elsewhere, so there is no resource usage
+            proc.wait()
+            rusage = None
+        else:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        finished.set()
+        metrics = {
+            'member': key,
+            'pid': proc.pid,
+            'started': started.isoformat(timespec='seconds'),
+            'finished': (
+                datetime.datetime.now().isoformat(timespec='seconds')),
+            'returncode': proc.returncode,
+            'wall_time': time.monotonic() - start_time,
+            'user_time': rusage.ru_utime if rusage else None,
+            'system_time': rusage.ru_stime if rusage else None,
+            # ru_maxrss is in kilobytes on Linux
+            'max_rss_kb': rusage.ru_maxrss if rusage else None,
+            'stopped_early': key in self._stopped_early,
+            'failed': self.failed.get(key),
+        }
+        self._finished.put((key, metrics))
+
+    def _record_metrics(self, key, metrics):
+        """Store the resource usage metrics of a member's run, log them,
+        and append them to the metrics file.
+        """
+        self.metrics[key] = metrics
+        if metrics['user_time'] is not None:
+            log.debug(
+                'SOG {member} run used {user_time:.1f} s user and '
+                '{system_time:.1f} s system CPU time, and {max_rss_kb} kB '
+                'max RSS in {wall_time:.1f} s'.format(**metrics))
+        if self.metrics_file is None:
+            return
+        with open(self.metrics_file, 'at') as file_obj:
+            file_obj.write(json.dumps(metrics, sort_keys=True) + '\n')
+
+    def _log_metrics_summary(self):
+        """Log a summary of the resource usage of the ensemble runs.
+        """
+        metrics = [
+            run_metrics for run_metrics in self.metrics.values()
+            if run_metrics['user_time'] is not None]
+        if not metrics:
+            return
+        log.debug(
+            'SOG ensemble of {0} runs used {1:.1f} s of CPU time; '
+            'longest run {2:.1f} s, largest max RSS {3} kB'
+            .format(
+                len(metrics),
+                sum(run_metrics['user_time'] + run_metrics['system_time']
+                    for run_metrics in metrics),
+                max(run_metrics['wall_time'] for run_metrics in metrics),
+                max(run_metrics['max_rss_kb'] for run_metrics in metrics)))
+
+
+class BloomWatcher(object):
+    """Evaluate the spring bloom criterion incrementally from the
+    biology time series results file of a running SOG member.
+
+    The bloom date is the day of the peak diatom biomass within
+    ``peak_half_width`` days of the first 2 consecutive days after
+    1-Jan on which the daily minimum nitrate concentration is no more
+    than ``nitrate_threshold``; see
+    :py:meth:`bloomcast.bloomcast.Bloomcast._calc_bloom_date`.
+    Once those days are found the rest of the run is only needed up to
+    the end of the peak window plus a safety margin of ``margin_days``,
+    and no earlier than ``not_before_hours``.
+
+    :arg timeseries_file: Path of the SOG biology time series results
+                          file.
+    :type timeseries_file: string
+
+    :arg jan1_hours: Hours from the start of the run to 1-Jan of the
+                     bloom year.
+    :type jan1_hours: float
+
+    :arg steps_per_day: Number of SOG time steps in a day.
+    :type steps_per_day: int
+
+    :arg not_before_hours: Hours from the start of the run before which
+                           the run must not be stopped.
+    :type not_before_hours: float
+    """
+    NITRATE_FIELD = '3 m avg nitrate concentration'
+    # Seconds between checks of the results file
+    interval = 10
+
+    def __init__(
+        self, timeseries_file, jan1_hours, steps_per_day, not_before_hours,
+        nitrate_threshold, peak_half_width, margin_days,
+    ):
+        self.timeseries_file = timeseries_file
+        self.jan1_hours = jan1_hours
+        self.steps_per_day = steps_per_day
+        self.not_before_hours = not_before_hours
+        self.nitrate_threshold = nitrate_threshold
+        self.peak_half_width = peak_half_width
+        self.margin_days = margin_days
+        self.latest_hours = None
+        self.first_low_nitrate_days = None
+        self.stop_hours = None
+        self._offset = 0
+        self._partial_line = ''
+        self._field_names = None
+        self._columns = None
+        self._day_count = 0
+        self._day_steps = 0
+        self._day_min_nitrate = math.inf
+        self._prev_day_low = False
+
+    def update(self):
+        """Process the lines that have been added to the results file
+        since the last update, and return True if the run can be
+        stopped.
+        """
+        try:
+            with open(self.timeseries_file, 'rt') as file_obj:
+                file_obj.seek(self._offset)
+                text = file_obj.read()
+                self._offset = file_obj.tell()
+        except FileNotFoundError:
+            return False
+        lines = (self._partial_line + text).split('\n')
+        # The last line is incomplete until SOG writes its newline
+        self._partial_line = lines.pop()
+        for line in lines:
+            self._process_line(line.strip())
+        return (
+            self.stop_hours is not None
+            and self.latest_hours is not None
+            and self.latest_hours >= self.stop_hours)
+
+    def _process_line(self, line):
+        """Process a header or data line from the results file.
+        """
+        if self._columns is None:
+            if line.startswith('*FieldNames:'):
+                self._field_names = line.split(': ', 1)[1].split(', ')
+            elif line.startswith('*EndOfHeader'):
+                self._columns = (
+                    self._field_names.index('time'),
+                    self._field_names.index(self.NITRATE_FIELD))
+            return
+        if not line:
+            return
+        fields = line.split()
+        hours = float(fields[self._columns[0]])
+        self.latest_hours = hours
+        if hours < self.jan1_hours or self.stop_hours is not None:
+            return
+        self._day_min_nitrate = min(
+            self._day_min_nitrate, float(fields[self._columns[1]]))
+        self._day_steps += 1
+        if self._day_steps < self.steps_per_day:
+            return
+        day_low = self._day_min_nitrate <= self.nitrate_threshold
+        if day_low and self._prev_day_low:
+            self.first_low_nitrate_days = (
+                self._day_count - 1, self._day_count)
+            window_end_day = self._day_count + 1 + self.peak_half_width
+            self.stop_hours = max(
+                self.jan1_hours + (window_end_day + self.margin_days) * 24,
+                self.not_before_hours)
+        self._prev_day_low = day_low
+        self._day_count += 1
+        self._day_steps = 0
+        self._day_min_nitrate = math.inf
+
+
+class RunProgress(object):
+    """Track the progress of a running SOG member from the latest time
+    value in one of its time series results files.
+
+    :arg timeseries_file: Path of a SOG time series results file.
+    :type timeseries_file: string
+
+    :arg run_hours: Simulated hours from the start to the end of the run.
+    :type run_hours: float
+    """
+    # Bytes at the end of the results file to search for the last line
+    TAIL_SIZE = 4096
+
+    def __init__(self, timeseries_file, run_hours):
+        self.timeseries_file = timeseries_file
+        self.run_hours = run_hours
+        self.latest_hours = 0.0
+        self._start_time = None
+        self._data_offset = None
+        self._time_col = None
+
+    def start(self):
+        """Mark the start of the run.
+        """
+        self._start_time = time.monotonic()
+
+    @property
+    def remaining_hours(self):
+        return max(self.run_hours - self.latest_hours, 0)
+
+    def throughput(self):
+        """Return the simulated hours per second of wall clock time since
+        the start of the run.
+        """
+        if self._start_time is None:
+            return 0
+        elapsed = time.monotonic() - self._start_time
+        return self.latest_hours / elapsed if elapsed else 0
+
+    def update(self):
+        """Update the latest simulated time from the last complete line
+        of the results file.
+        """
+        try:
+            with open(self.timeseries_file, 'rb') as file_obj:
+                if self._data_offset is None:
+                    self._read_header(file_obj)
+                    if self._data_offset is None:
+                        return
+                size = os.fstat(file_obj.fileno()).st_size
+                offset = max(self._data_offset, size - self.TAIL_SIZE)
+                file_obj.seek(offset)
+                lines = file_obj.read(size - offset).split(b'\n')
+        except FileNotFoundError:
+            return
+        # The last piece is incomplete until SOG writes its newline,
+        # and the first may have been cut by the seek
+        lines = lines[1:-1] if offset > self._data_offset else lines[:-1]
+        for line in reversed(lines):
+            if line.strip():
+                self.latest_hours = float(line.split()[self._time_col])
+                return
+
+    def _read_header(self, file_obj):
+        """Find the time column and the offset of the first data line.
+        """
+        for line in iter(file_obj.readline, b''):
+            if not line.endswith(b'\n'):
+                return
+            line = line.decode('ascii').strip()
+            if line.startswith('*FieldNames:'):
+                field_names = line.split(': ', 1)[1].split(', ')
+                self._time_col = field_names.index('time')
+            if line.startswith('*EndOfHeader'):
+                self._data_offset = file_obj.tell()
+                return
+
+
+class RunWatchdog(object):
+    """Detect a SOG run that is hung or pathologically slow.
+
+    A run is reported when it has taken longer than its wall time
+    budget, or when its results file has not grown for
+    ``stall_timeout`` seconds.
+
+    :arg output_file: Path of a SOG results file that the run writes to
+                      as it goes.
+    :type output_file: string
+
+    :arg wall_time_budget: Seconds that the run is allowed to take;
+                           None for no limit.
+    :type wall_time_budget: number
+
+    :arg stall_timeout: Seconds that the results file is allowed to
+                        stay the same size; None for no limit.
+    :type stall_timeout: number
+    """
+    # Seconds between checks
+    interval = 60
+    # Seconds to wait for a terminated run to end before killing it
+    KILL_GRACE_PERIOD = 30
+
+    def __init__(self, output_file, wall_time_budget, stall_timeout):
+        self.output_file = output_file
+        self.wall_time_budget = wall_time_budget
+        self.stall_timeout = stall_timeout
+        self._start_time = None
+        self._last_size = None
+        self._last_growth_time = None
+
+    def start(self):
+        """Mark the start of the run.
+        """
+        self._start_time = self._last_growth_time = time.monotonic()
+        self._last_size = None
+
+    def check(self):
+        """Return the reason that the run should be terminated, or None
+        if it is making progress within its budget.
+        """
+        now = time.monotonic()
+        elapsed = now - self._start_time
+        if self.wall_time_budget and elapsed > self.wall_time_budget:
+            return (
+                'it has run for {0:.0f} s, more than its wall time budget '
+                'of {1:.0f} s'.format(elapsed, self.wall_time_budget))
+        try:
+            size = os.path.getsize(self.output_file)
+        except OSError:
+            size = None
+        if size != self._last_size:
+            self._last_size = size
+            self._last_growth_time = now
+        elif (self.stall_timeout
+                and now - self._last_growth_time > self.stall_timeout):
+            return (
+                'its results file {0} has not grown in {1:.0f} s'
+                .format(self.output_file, now - self._last_growth_time))
+        return None
+
+
+def median_wall_times(metrics_file, history_size=10):
+    """Return a dict of the median wall times of the most recent
+    completed runs of each member in the run metrics file.
+
+    Runs that were stopped early, failed, or exited with an error are
+    excluded because their wall times don't reflect a full run.
+    """
+    wall_times = collections.defaultdict(
+        lambda: collections.deque(maxlen=history_size))
+    try:
+        with open(metrics_file, 'rt') as file_obj:
+            for line in file_obj:
+                try:
+                    metrics = json.loads(line)
+                except ValueError:
+                    continue
+                if (metrics.get('failed') or metrics.get('stopped_early')
+                        or metrics['returncode'] != 0):
+                    continue
+                wall_times[metrics['member']].append(metrics['wall_time'])
+    except FileNotFoundError:
+        return {}
+    return {
+        member: statistics.median(times)
+        for member, times in wall_times.items()}
+
+
+class SOG_RunCache(object):
+    """Persistent on-disk cache of the results of SOG runs keyed by a
+    hash of all of the inputs of each run.
+
+    The SHA-256 digest of a run covers the contents of the SOG
+    executable, the parameter values of the merged infile other than
+    the results file paths, and the contents of the files that the
+    initial conditions and forcing data sections of the infile refer
+    to. So runs with identical inputs share a cache entry even if
+    their results go to different files.
+
+    The time series and Hoffmueller profiles results files of a run are
+    stored in a directory named by its digest. Entries are evicted in
+    least recently used order when the total size of the cache exceeds
+    ``max_size`` bytes.
+    """
+    INPUT_SECTIONS = ('initial_conditions', 'forcing_data')
+    RESULTS_SECTIONS = ('timeseries_results', 'profiles_results')
+    HOFFMUELLER_KEYS = ('hoffmueller_file', 'user_hoffmueller_file')
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # File digests keyed by path, size and modification time so that
+        # forcing files shared by members are only hashed once
+        self._file_digests = {}
+
+    def digest(self, SOG_executable, base_infile, edit_files):
+        """Return the hex digest of the inputs of the SOG run for the
+        base infile with the edit files applied.
+        """
+        infile = read_merged_SOG_infile(base_infile, edit_files)
+        params = {
+            section: values for section, values in infile.items()
+            if section not in self.RESULTS_SECTIONS}
+        run_hash = hashlib.sha256()
+        run_hash.update(self._file_digest(SOG_executable))
+        run_hash.update(
+            json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        for section in self.INPUT_SECTIONS:
+            for infile_key, value in sorted(
+                    _infile_items(infile.get(section, {}), section)):
+                if isinstance(value, str) and os.path.isfile(value):
+                    run_hash.update(infile_key.encode('utf-8'))
+                    run_hash.update(self._file_digest(value))
+        return run_hash.hexdigest()
+
+    def _file_digest(self, path):
+        """Return the SHA-256 digest of the contents of the file.
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        try:
+            return self._file_digests[memo_key]
+        except KeyError:
+            pass
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as file_obj:
+            for chunk in iter(lambda: file_obj.read(self.CHUNK_SIZE), b''):
+                file_hash.update(chunk)
+        self._file_digests[memo_key] = file_hash.digest()
+        return self._file_digests[memo_key]
+
+    def _results_files(self, base_infile, edit_files):
+        """Return a dict of the time series and Hoffmueller profiles
+        results file paths of the SOG run keyed by their infile keys.
+        """
+        infile = read_merged_SOG_infile(base_infile, edit_files)
+        results_files = dict(_infile_items(
+            infile.get('timeseries_results', {}), 'timeseries_results'))
+        profiles = infile.get('profiles_results', {})
+        for key in self.HOFFMUELLER_KEYS:
+            if key in profiles:
+                results_files['profiles_results.' + key] = (
+                    profiles[key]['value'])
+        return results_files
+
+    def restore(self, digest, base_infile, edit_files):
+        """Copy the results files of the cached run with the digest to
+        the results file paths of the SOG run, and return True.
+
+        False is returned if there is no cached run with the digest.
+        """
+        entry_dir = os.path.join(self.cache_dir, digest)
+        results_files = self._results_files(base_infile, edit_files)
+        if not all(
+                os.path.exists(os.path.join(entry_dir, infile_key))
+                for infile_key in results_files):
+            return False
+        for infile_key, path in results_files.items():
+            os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+            shutil.copyfile(os.path.join(entry_dir, infile_key), path)
+        # Mark the entry as recently used
+        os.utime(entry_dir)
+        return True
+
+    def store(self, digest, base_infile, edit_files):
+        """Store copies of the results files of the SOG run as the cached
+        run with the digest.
+
+        If another run stores the same digest first, its entry is kept.
+        """
+        entry_dir = os.path.join(self.cache_dir, digest)
+        if os.path.exists(entry_dir):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(
+            prefix='{0}.tmp'.format(digest), dir=self.cache_dir)
+        try:
+            results_files = self._results_files(base_infile, edit_files)
+            for infile_key, path in results_files.items():
+                shutil.copyfile(path, os.path.join(tmp_dir, infile_key))
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                raise
+            return
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used entries from the cache until
+        its total size is no more than ``max_size``.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if '.tmp' in name or not os.path.isdir(entry_dir):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, filename))
+                for filename in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+        total_size = sum(size for mtime, size, entry_dir in entries)
+        for mtime, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+            log.debug('evicted {0} from SOG run cache'.format(entry_dir))
+
+
+def _infile_items(section, prefix):
+    """Generate ``(dotted key, value)`` pairs of the items in a section
+    of a SOG infile dict.
+    """
+    for key, item in section.items():
+        if not isinstance(item, dict):
+            continue
+        if 'value' in item:
+            yield '{0}.{1}'.format(prefix, key), item['value']
+        else:
+            yield from _infile_items(item, '{0}.{1}'.format(prefix, key))
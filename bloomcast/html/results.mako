@@ -9,7 +9,7 @@
 
 	<title>SoG Bloomcast for ${data_date}</title>
 	<meta name="description"
-          content="Strait of Georgia spring diatom bloom prediction for ${bloom_date['avg_forcing'].year}">
+          content="Strait of Georgia spring diatom bloom prediction for ${bloom_date[central_member].year}">
 	<meta name="author" content="Susan Allen and Doug Latornell">
 
 	<meta name="viewport" content="width=device-width,initial-scale=1">
@@ -32,7 +32,7 @@
         <p>
           The current best estimate of the first spring diatom bloom
           in the Strait of Georgia is
-          ${bloom_date['avg_forcing']}. That estimate is based on a
+          ${bloom_date[central_member]}. That estimate is based on a
           run of the
           <a href="http://www.eos.ubc.ca/~sallen/SOG-docs/">
             SOG biophysical model for deep estuaries
@@ -49,23 +49,24 @@
           </li>
         </ul>
 
+        %if bloom_date_bounds:
         <p>
-          Best estimate bounds on the bloom date are:
+          Best estimate bounds on the bloom date from the other
+          ${ensemble_size - 1} member(s) of the ensemble are:
         </p>
         <ul>
           <li>
-            No earlier than ${bloom_date['early_bloom_forcing']} based
-            on using actual forcing data to ${data_date}, and data
-            from 1992/1993 thereafter. 1993 had the earliest spring
-            diatom bloom hindcast since 1968 [1].
+            No earlier than ${bloom_date[bloom_date_bounds[0]]} based
+            on using actual forcing data to ${data_date}, and
+            ${forcing_description(bloom_date_bounds[0])}
           </li>
           <li>
-            No later than ${bloom_date['late_bloom_forcing']} based
-            on using actual forcing data to ${data_date}, and data
-            from 1998/1999 thereafter. 1999 had the latest spring
-            diatom bloom hindcast since 1968 [1].
+            No later than ${bloom_date[bloom_date_bounds[1]]} based
+            on using actual forcing data to ${data_date}, and
+            ${forcing_description(bloom_date_bounds[1])}
           </li>
         </ul>
+        %endif
 
         <p>
           [1] Allen, S. E. and M. A. Wolfe,
@@ -160,8 +161,8 @@
             <tr>
               <th rowspan="2">Wind Data Date</th>
               <th colspan="2">Average Forcing</th>
-              <th colspan="2">Early Bloom Forcing</th>
-              <th colspan="2">Late Bloom Forcing</th>
+              <th colspan="2">Earliest Bound</th>
+              <th colspan="2">Latest Bound</th>
             </tr>
             <tr>
               %for i in range(3):
@@ -196,3 +197,17 @@
   </div>
 </body>
 </html>
+<%!
+  forcing_descriptions = {
+      'early_bloom_forcing': (
+          'data from 1992/1993 thereafter. 1993 had the earliest spring '
+          'diatom bloom hindcast since 1968 [1].'),
+      'late_bloom_forcing': (
+          'data from 1998/1999 thereafter. 1999 had the latest spring '
+          'diatom bloom hindcast since 1968 [1].'),
+  }
+%>
+<%def name="forcing_description(member)">
+${forcing_descriptions.get(
+    member, '{0} data thereafter.'.format(member.replace('_', ' ')))}
+</%def>
@@ -18,9 +18,12 @@ import datetime
 import logging
 import sys
 import contextlib
+import numpy as np
+from .archive import ForcingArchive
 from .utils import (
     ClimateDataProcessor,
     Config,
+    timestamp_parts,
 )
 
 
@@ -30,11 +33,13 @@ log = logging.getLogger('bloomcast.meteo')
 class MeteoProcessor(ClimateDataProcessor):
     """Meteorological forcing data processor.
     """
+    record_fields = ('temp', 'relhum', 'weather')
+
     def __init__(self, config):
         data_readers = {
-            'air_temperature': self.read_temperature,
-            'relative_humidity': self.read_humidity,
-            'cloud_fraction': self.read_cloud_fraction,
+            'air_temperature': self.read_temperature_column,
+            'relative_humidity': self.read_humidity_column,
+            'cloud_fraction': self.read_cloud_fraction_column,
         }
         super(MeteoProcessor, self).__init__(config, data_readers)
 
@@ -44,77 +49,132 @@ class MeteoProcessor(ClimateDataProcessor):
         the XML download, trim incomplete days from the end, patch
         missing values, and write the data to files in the format that
         SOG expects.
+
+        If incremental updates are enabled and all of the forcing data
+        files exist only the data months from the one that contains the
+        earliest of their last days onward are obtained, and the new
+        data are appended to the files. Files that the new data do not
+        line up with are rebuilt from all of the data months.
+
+        The processed data, and the weather descriptions that the cloud
+        fractions are calculated from, are also stored in the forcing
+        data archive.
+        """
+        quantities = self.config.climate.meteo.quantities
+        output_files = self.config.climate.meteo.output_files
+        since_dates = [
+            self._incremental_start_date(
+                output_files[qty], self._line_timestamp)
+            for qty in quantities]
+        rebuild = quantities
+        if None not in since_dates:
+            since = min(since_dates)
+            self._process_meteo_data(self._get_data_months(since))
+            rebuild = [
+                qty for qty in quantities
+                if not self._update_forcing_file(
+                    output_files[qty], self.format_data_buffer(qty),
+                    self._line_timestamp)]
+            for qty in rebuild:
+                log.debug('{0} data changed before {1:%Y-%m-%d}; '
+                          'rebuilding {2}'
+                          .format(qty, since, output_files[qty]))
+        if rebuild:
+            self._process_meteo_data(self._get_data_months())
+            with contextlib.ExitStack() as stack:
+                files = dict(
+                    [(qty, stack.enter_context(open(output_files[qty], 'wt')))
+                     for qty in rebuild])
+                for qty in rebuild:
+                    files[qty].write(self.format_data_buffer(qty))
+        station_id = self.config.climate.meteo.station_id
+        for qty in quantities:
+            self.archive_data(qty, station_id)
+            log.debug('latest {0} {1}'.format(qty, self.data[qty][-1]))
+        self._archive_weather_descriptions()
+
+    def _archive_weather_descriptions(self):
+        """Store the weather descriptions that cloud fractions are
+        calculated from in the forcing data archive, if one is
+        configured.
+
+        Missing descriptions are stored as empty strings.
+        """
+        if not self.config.forcing_archive:
+            return
+        weather_descs = self.columns['weather']
+        missing = np.equal(weather_descs, None)
+        archive = ForcingArchive(self.config.forcing_archive)
+        archive.write(
+            self.config.climate.meteo.station_id, 'weather',
+            self.columns['timestamp'],
+            np.where(missing, '', weather_descs).astype(str),
+            np.zeros(weather_descs.size, dtype=bool))
+
+    def _process_meteo_data(self, data_months):
+        """Get and process the meteorological data for the data months.
         """
-        file_objs = {}
-        contexts = []
-        for qty in self.config.climate.meteo.quantities:
-            output_file = self.config.climate.meteo.output_files[qty]
-            file_objs[qty] = open(output_file, 'wt')
-            contexts.append(file_objs[qty])
         self.raw_data = []
-        for data_month in self._get_data_months():
-            self.get_climate_data('meteo', data_month)
-            log.debug('got meteo data for {0:%Y-%m}'.format(data_month))
-        with contextlib.ExitStack() as stack:
-            files = dict(
-                [(qty,
-                  stack.enter_context(open(
-                      self.config.climate.meteo.output_files[qty], 'wt')))
-                 for qty in self.config.climate.meteo.quantities])
-            for qty in self.config.climate.meteo.quantities:
-                self.process_data(qty, end_date=self.config.data_date)
-                log.debug('latest {0} {1}'.format(qty, self.data[qty][-1]))
-                files[qty].writelines(self.format_data(qty))
-
-    def read_temperature(self, record):
-        """Read air temperature from XML data object.
+        self.get_climate_data_months('meteo', data_months)
+        self.extract_columns()
+        for qty in self.config.climate.meteo.quantities:
+            self.process_data(qty, end_date=self.config.data_date)
+
+    def _line_timestamp(self, line):
+        """Return the date of a line of meteorological forcing data.
+        """
+        year, month, day = line.split()[1:4]
+        return datetime.date(int(year), int(month), int(day))
+
+    def read_temperature_column(self, columns):
+        """Return an array of air temperatures from the columns
+        extracted from the XML data objects.
 
         SOG expects air temperature to be in 10ths of degrees Celcius due
         to legacy data formating of files from Environment Canada.
         """
-        temperature = record.find('temp').text
-        try:
-            temperature = float(temperature) * 10
-        except TypeError:
-            # None indicates missing data
-            pass
-        return temperature
-
-    def read_humidity(self, record):
-        """Read relative humidity from XML data object.
+        return self._float_column(columns['temp']) * 10
+
+    def read_humidity_column(self, columns):
+        """Return an array of relative humidities from the columns
+        extracted from the XML data objects.
         """
-        humidity = record.find('relhum').text
-        try:
-            humidity = float(humidity)
-        except TypeError:
-            # None indicates missing data
-            pass
-        return humidity
-
-    def read_cloud_fraction(self, record):
-        """Read weather description from XML data object and transform
-        it to cloud fraction via Susan's heuristic mapping.
+        return self._float_column(columns['relhum'])
+
+    def read_cloud_fraction_column(self, columns):
+        """Return an array of cloud fractions transformed from the
+        weather description column extracted from the XML data objects
+        via Susan's heuristic mapping.
+
+        Each distinct weather description is looked up in the mapping
+        only once.
         """
-        weather_desc = record.find('weather').text
         mapping = self.config.climate.meteo.cloud_fraction_mapping
-        try:
-            cloud_fraction = mapping[weather_desc]
-        except KeyError:
-            if weather_desc is None or weather_desc == 'NA':
-                # None indicates missing data
-                cloud_fraction = [None]
+        weather_descs = columns['weather']
+        month_indices = (
+            columns['timestamp'].astype('datetime64[M]').astype(int) % 12)
+        cloud_fractions = np.empty(weather_descs.size)
+        for weather_desc in set(weather_descs):
+            records = weather_descs == weather_desc
+            try:
+                cloud_fraction = mapping[weather_desc]
+            except KeyError:
+                if weather_desc is None or weather_desc == 'NA':
+                    # NaN indicates missing data
+                    cloud_fraction = [np.nan]
+                else:
+                    log.warning(
+                        'Unrecognized weather description: {0} at {1}; '
+                        'cloud fraction set to 10'
+                        .format(weather_desc,
+                                columns['timestamp'][records][0].tolist()))
+                    cloud_fraction = [10]
+            if len(cloud_fraction) == 1:
+                cloud_fractions[records] = cloud_fraction[0]
             else:
-                log.warning(
-                    'Unrecognized weather description: {0} at {1}; '
-                    'cloud fraction set to 10'
-                    .format(weather_desc, self.read_timestamp(record)))
-                cloud_fraction = [10]
-        if len(cloud_fraction) == 1:
-            cloud_fraction = cloud_fraction[0]
-        else:
-            timestamp = self.read_timestamp(record)
-            cloud_fraction = cloud_fraction[timestamp.month - 1]
-        return cloud_fraction
+                cloud_fractions[records] = (
+                    np.array(cloud_fraction)[month_indices[records]])
+        return cloud_fractions
 
     def format_data(self, qty):
         """Generate lines of metorological forcing data in the format
@@ -141,6 +201,26 @@ class MeteoProcessor(ClimateDataProcessor):
             line += '\n'
             yield line
 
+    def format_data_buffer(self, qty):
+        """Return the lines of metorological forcing data in the format
+        expected by SOG as a single string.
+
+        The whole data array is formatted in one operation; the result
+        is identical to joining the lines from :meth:`format_data`.
+        """
+        day_count = len(self.data[qty]) // 24
+        data = self.data[qty][:day_count * 24]
+        years, months, days, hours = timestamp_parts(
+            [timestamp for timestamp, value in data[::24]])
+        values = np.array([value for timestamp, value in data], dtype=float)
+        columns = np.column_stack(
+            (years, months, days, values.reshape(day_count, 24)))
+        line_format = (
+            '{0} %04d %02d %02d 42'.format(
+                str(self.config.climate.meteo.station_id).replace('%', '%%'))
+            + ' %.2f' * 24 + '\n')
+        return (line_format * day_count) % tuple(columns.ravel().tolist())
+
 
 def run(config_file):
     """Process meteorological forcing data into SOG forcing data
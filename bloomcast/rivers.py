@@ -16,13 +16,15 @@
 """
 import datetime
 import logging
+import re
 import sys
 import time
-import requests
-import bs4
+import numpy as np
 from .utils import (
     Config,
     ForcingDataProcessor,
+    find_gaps,
+    timestamp_parts,
 )
 
 
@@ -32,6 +34,14 @@ log = logging.getLogger('bloomcast.rivers')
 class RiversProcessor(ForcingDataProcessor):
     """River flows forcing data processor.
     """
+    CHUNK_SIZE = 64 * 1024
+    TABLE_MARKER = b'id="dataTable"'
+    # Data table row of date/time and flow value cells
+    ROW_PATTERN = re.compile(
+        rb'<td[^>]*>\s*(\d{4}-\d{2}-\d{2}) \d{2}:\d{2}:\d{2}\s*</td>'
+        rb'\s*<td[^>]*>(.*?)</td>', re.DOTALL)
+    TAG_PATTERN = re.compile(rb'<[^>]*>')
+
     def __init__(self, config):
         super(RiversProcessor, self).__init__(config)
 
@@ -41,21 +51,53 @@ class RiversProcessor(ForcingDataProcessor):
         daily flow values from the HTML table, trim incomplete days
         from the end, patch missing values, and write the data to
         files in the format that SOG expects.
+
+        If incremental updates are enabled and a river's forcing data
+        file exists only the data from the 1st of the month that
+        contains the last day in the file onward are obtained, and the
+        new data are appended to the file. The file is rebuilt from all
+        of the data if the new data do not line up with it.
+
+        The processed data are also stored in the forcing data archive.
         """
         for river in 'major minor'.split():
-            self.get_river_data(river)
-            self.process_data(river, end_date=self.config.data_date)
             output_file = self.config.rivers.output_files[river]
-            with open(output_file, 'wt') as file_obj:
-                file_obj.writelines(self.format_data(river))
+            since = self._incremental_start_date(
+                output_file, self._line_timestamp)
+            updated = False
+            if since is not None:
+                self.get_river_data(river, since=since.replace(day=1))
+                self.process_data(river, end_date=self.config.data_date)
+                updated = self._update_forcing_file(
+                    output_file, self.format_data_buffer(river),
+                    self._line_timestamp)
+                if not updated:
+                    log.debug('{0} river data changed before {1:%Y-%m-%d}; '
+                              'rebuilding {2}'
+                              .format(river, since, output_file))
+            if not updated:
+                self.get_river_data(river)
+                self.process_data(river, end_date=self.config.data_date)
+                with open(output_file, 'wt') as file_obj:
+                    file_obj.write(self.format_data_buffer(river))
+            self.archive_data(
+                river, getattr(self.config.rivers, river).station_id)
             log.debug(
                 'latest {0} river flow {1}'
                 .format(river, self.data[river][-1]))
 
-    def get_river_data(self, river):
-        """Return a BeautifulSoup parser object containing the river
-        flow data table scraped from the Environment Canada
+    def get_river_data(self, river, since=None):
+        """Get the river flow data table from the Environment Canada
         WaterOffice page.
+
+        The table starts on the ``since`` date if it is given, otherwise
+        on Jan 1 of the run start date year.
+
+        With the :kbd:`fast` rivers parser config value the table rows
+        are parsed from the response in chunks as they arrive, and
+        raw_data is set to a pair of arrays of date strings and flows.
+        With the :kbd:`bs4` parser raw_data is set to a BeautifulSoup
+        parser object containing the data table.
         """
         params = self.config.rivers.params
         params['stn'] = getattr(self.config.rivers, river).station_id
@@ -63,20 +105,72 @@ class RiversProcessor(ForcingDataProcessor):
         start_year = (self.config.run_start_date.year
                       if self.config.run_start_date.year != today.year
                       else today.year)
-        params.update(self._date_params(start_year))
+        if since is None:
+            since = datetime.date(start_year, 1, 1)
+        params.update(
+            self._date_params(since.year, since.month, since.day))
+        import requests
         with requests.session() as s:
             s.post(self.config.rivers.disclaimer_url,
                    data=self.config.rivers.accept_disclaimer)
             time.sleep(5)
-            response = s.get(self.config.rivers.data_url, params=params)
-            log.debug('got {0} river data for {1}-01-01 to {2:%Y-%m-%d}'
-                      .format(river, start_year, self.config.data_date))
-        soup = bs4.BeautifulSoup(response.content)
-        self.raw_data = soup.find('table', id='dataTable')
+            response = s.get(
+                self.config.rivers.data_url, params=params, stream=True)
+            if self.config.rivers.parser == 'bs4':
+                import bs4
+                soup = bs4.BeautifulSoup(response.content)
+                self.raw_data = soup.find('table', id='dataTable')
+            else:
+                self.raw_data = self._parse_data_table(
+                    response.iter_content(self.CHUNK_SIZE))
+            log.debug('got {0} river data for {1:%Y-%m-%d} to {2:%Y-%m-%d}'
+                      .format(river, since, self.config.data_date))
+
+    def _parse_data_table(self, chunks):
+        """Parse the rows of the data table from chunks of the
+        WaterOffice page HTML bytes, and return a pair of arrays of the
+        row date strings and flow values strings.
+
+        Only complete rows are parsed from each chunk; the rest of the
+        chunk is carried over to the next one.
+        """
+        datestamps, flows = [], []
+        buffer = b''
+        in_table = False
+        for chunk in chunks:
+            buffer += chunk
+            if not in_table:
+                table_start = buffer.find(self.TABLE_MARKER)
+                if table_start == -1:
+                    buffer = buffer[-len(self.TABLE_MARKER):]
+                    continue
+                in_table = True
+                buffer = buffer[table_start:]
+            table_end = buffer.find(b'</table>')
+            if table_end != -1:
+                buffer = buffer[:table_end]
+                break
+            rows_end = buffer.rfind(b'</tr>')
+            if rows_end != -1:
+                self._parse_rows(buffer[:rows_end], datestamps, flows)
+                buffer = buffer[rows_end:]
+        if in_table:
+            self._parse_rows(buffer, datestamps, flows)
+        return (np.array(datestamps, dtype=bytes).astype(str),
+                np.array(flows, dtype=bytes).astype(str))
+
+    def _parse_rows(self, html, datestamps, flows):
+        """Append the date strings and flow value strings of the table
+        rows in the HTML bytes to the datestamps and flows lists.
+        """
+        for datestamp, flow in self.ROW_PATTERN.findall(html):
+            datestamps.append(datestamp)
+            flows.append(self.TAG_PATTERN.sub(b'', flow).strip())
 
-    def _date_params(self, start_year):
+    def _date_params(self, start_year, start_month=1, start_day=1):
         """Return a dict of the components of start and end dates for
-        river flow data based on the specified start year.
+        river flow data based on the specified start year, and
+        optionally start month and day.
 
         The keys are the component names in the format required for
         requests to the :kbd:`wateroffice.gc.ca` site.
@@ -86,85 +180,85 @@ class RiversProcessor(ForcingDataProcessor):
         end_date = self.config.data_date + datetime.timedelta(days=1)
         params = {
             'syr': start_year,
-            'smo': 1,
-            'sday': 1,
+            'smo': start_month,
+            'sday': start_day,
             'eyr': end_date.year,
             'emo': end_date.month,
             'eday': end_date.day,
         }
         return params
 
-    def process_data(self, qty, end_date=datetime.date.today()):
-        """Process data from BeautifulSoup parser object to a list of
-        hourly timestamps and data values.
+    def _line_timestamp(self, line):
+        """Return the date of a line of river flow forcing data.
         """
-        tds = self.raw_data.findAll('td')
-        timestamps = (td.string for td in tds[::2])
-        flows = (td.text for td in tds[1::2])
-        data_day = self.read_datestamp(tds[0].string)
-        flow_sum = count = 0
-        self.data[qty] = []
-        for timestamp, flow in zip(timestamps, flows):
-            datestamp = self.read_datestamp(timestamp)
-            if datestamp > end_date:
-                break
-            if datestamp == data_day:
-                flow_sum += self._convert_flow(flow)
-                count += 1
-            else:
-                self.data[qty].append((data_day, flow_sum / count))
-                data_day = datestamp
-                flow_sum = self._convert_flow(flow)
-                count = 1
-        self.data[qty].append((data_day, flow_sum / count))
-        self.patch_data(qty)
+        year, month, day = line.split()[:3]
+        return datetime.date(int(year), int(month), int(day))
 
-    def _convert_flow(self, flow_string):
-        """Convert a flow data value from a string to a float.
+    def process_data(self, qty, end_date=datetime.date.today()):
+        """Process data from the river flow data table to a list of
+        daily datestamps and average flow values.
 
-        Handles 'provisional values' which are marked with a `*` at
-        the end of the string.
+        The daily averages are calculated with a grouped reduction over
+        the date of each row.
         """
-        try:
-            return float(flow_string)
-        except ValueError:
-            # Ignore training `*`
-            return float(flow_string[:-1])
-
-    def read_datestamp(self, string):
-        """Read datestamp from BeautifulSoup parser object and return
-        it as a date instance.
+        if isinstance(self.raw_data, tuple):
+            datestamps, flows = self.raw_data
+        else:
+            datestamps, flows = self._read_table_cells(self.raw_data)
+        datestamps = datestamps.astype('datetime64[D]')
+        after_end = datestamps > np.datetime64(end_date)
+        count = after_end.argmax() if after_end.any() else datestamps.size
+        # Provisional values are marked with a `*` at the end
+        flows = np.char.rstrip(flows[:count], '*').astype(float)
+        days, day_indices = np.unique(
+            datestamps[:count], return_inverse=True)
+        flow_sums = np.bincount(day_indices, weights=flows)
+        counts = np.bincount(day_indices)
+        self.data[qty] = list(
+            zip(days.tolist(), (flow_sums / counts).tolist()))
+        self.patch_data(qty)
+
+    def _read_table_cells(self, table):
+        """Return a pair of arrays of the row date strings and flow
+        value strings read from the cells of the BeautifulSoup parser
+        object containing the data table.
         """
-        return datetime.datetime.strptime(string, '%Y-%m-%d %H:%M:%S').date()
+        tds = table.findAll('td')
+        datestamps = [td.string.strip()[:10] for td in tds[::2]]
+        flows = [td.text.strip() for td in tds[1::2]]
+        return np.array(datestamps), np.array(flows)
 
     def patch_data(self, qty):
-        """Patch missing data values by interpolation.
+        """Patch missing days of data by reindexing the data onto a
+        dense daily calendar and interpolating values for the missing
+        days.
         """
-        i = 0
-        data = self.data[qty]
-        gap_count = 0
-        while True:
-            try:
-                delta = (data[i + 1][0] - data[i][0]).days
-            except IndexError:
-                break
-            if delta > 1:
-                gap_start = i + 1
-                for j in range(1, delta):
-                    missing_date = data[i][0] + j * datetime.timedelta(days=1)
-                    data.insert(i + j, (missing_date, None))
-                    log.debug(
-                        '{qty} river data patched for {date}'
-                        .format(qty=qty, date=missing_date))
-                    gap_count += 1
-                gap_end = i + delta - 1
-                self.interpolate_values(qty, gap_start, gap_end)
-            i += delta
-        if gap_count:
+        datestamps = np.array(
+            [data[0] for data in self.data[qty]], dtype='datetime64[D]')
+        calendar = np.arange(datestamps[0], datestamps[-1] + 1)
+        present = np.zeros(calendar.size, dtype=bool)
+        present[(datestamps - calendar[0]).astype(int)] = True
+        values = iter([data[1] for data in self.data[qty]])
+        self.data[qty] = [
+            (datestamp, next(values) if is_present else None)
+            for datestamp, is_present in zip(calendar.tolist(), present)]
+        gaps = find_gaps(~present)
+        if not gaps:
+            self.gaps[qty] = []
+            return
+        self._interpolate_gaps(qty)
+        for gap_start, gap_end in gaps:
+            dates = '{0}'.format(calendar[gap_start])
+            if gap_end > gap_start:
+                dates += ' to {0}'.format(calendar[gap_end])
             log.debug(
-                '{count} {qty} river data values patched; '
-                'see debug log on disk for details'
-                .format(count=gap_count, qty=qty))
+                '{qty} river data patched for {dates}'
+                .format(qty=qty, dates=dates))
+        gap_count = sum(gap_end - gap_start + 1 for gap_start, gap_end in gaps)
+        log.debug(
+            '{count} {qty} river data values patched; '
+            'see debug log on disk for details'
+            .format(count=gap_count, qty=qty))
 
     def format_data(self, qty):
         """Generate lines of river flow forcing data in the format
@@ -186,6 +280,21 @@ class RiversProcessor(ForcingDataProcessor):
             line = '{0:%Y %m %d} {1:e}\n'.format(datestamp, flow)
             yield line
 
+    def format_data_buffer(self, qty):
+        """Return the lines of river flow forcing data in the format
+        expected by SOG as a single string.
+
+        The whole data array is formatted in one operation; the result
+        is identical to joining the lines from :meth:`format_data`.
+        """
+        years, months, days, hours = timestamp_parts(
+            [datestamp for datestamp, flow in self.data[qty]])
+        flows = np.array([flow for datestamp, flow in self.data[qty]])
+        columns = np.column_stack((years, months, days, flows))
+        line_format = '%04d %02d %02d %e\n'
+        return (
+            (line_format * len(columns)) % tuple(columns.ravel().tolist()))
+
 
 def run(config_file):
     """Process river flows forcing data into SOG forcing data files by
@@ -16,19 +16,28 @@
 
 A collection of classes that are used in other bloomcast modules.
 """
+import concurrent.futures
+import contextlib
 import datetime
+import fcntl
+import functools
+import json
 import logging
-import io
-from xml.etree import cElementTree as ElementTree
-import matplotlib.dates
+import math
+import os
+import re
+from xml.etree import ElementTree
 import numpy as np
-import requests
 import yaml
-import SOGcommand
+from .archive import ForcingArchive
 
 
 log = logging.getLogger('bloomcast.utils')
 
+# Merged SOG infile dicts keyed by the paths and modification times of
+# the base infile and its edit files
+_SOG_infile_cache = {}
+
 
 class _Container(object):
     pass
@@ -44,11 +53,19 @@ class Config(object):
         config_dict = self._read_yaml_file(config_file)
         self._load_logging_config(config_dict)
         self.get_forcing_data = config_dict['get_forcing_data']
+        self.incremental_forcing = config_dict['incremental_forcing']
+        self.forcing_archive = config_dict['forcing_archive']
         self.run_SOG = config_dict['run_SOG']
         self.SOG_executable = config_dict['SOG_executable']
+        self.max_concurrent_SOG_runs = config_dict['max_concurrent_SOG_runs']
+        self.SOG_run_cache = config_dict['SOG_run_cache']
+        self.SOG_early_stop_margin_days = config_dict[
+            'SOG_early_stop_margin_days']
+        self.SOG_watchdog = config_dict['SOG_watchdog']
         self.html_results = config_dict['html_results']
         self.infiles = config_dict['infiles']
         self.results_dir = config_dict['results_dir']
+        self.run_end_dates = {}
         self.std_bio_ts_outfiles = {}
         self.std_phys_ts_outfiles = {}
         self.Hoffmueller_profiles_outfiles = {}
@@ -60,6 +77,7 @@ class Config(object):
                     infile_dict['run_start_date']
                     .replace(hour=0, minute=0, second=0, microsecond=0))
                 self.SOG_timestep = int(infile_dict['SOG_timestep'])
+            self.run_end_dates[key] = infile_dict['run_end_date']
             self.std_bio_ts_outfiles[key] = infile_dict['std_bio_ts_outfile']
             self.std_phys_ts_outfiles[key] = infile_dict['std_phys_ts_outfile']
             self.Hoffmueller_profiles_outfiles[key] = infile_dict[
@@ -121,7 +139,7 @@ class Config(object):
         the specified config file as YAML.
         """
         with open(config_file, 'rt') as file_obj:
-            return yaml.load(file_obj.read())
+            return yaml.safe_load(file_obj.read())
 
     def _read_SOG_infile(self, yaml_file, edit_files):
         """Return a dict of selected values read from the SOG infile.
@@ -129,6 +147,7 @@ class Config(object):
         # Mappings between SOG YAML infile keys and Config object attributes
         infile_values = {
             'initial_conditions.init_datetime': 'run_start_date',
+            'end_datetime': 'run_end_date',
             'numerics.dt': 'SOG_timestep',
             'timeseries_results.std_biology': 'std_bio_ts_outfile',
             'timeseries_results.std_physics': 'std_phys_ts_outfile',
@@ -143,19 +162,217 @@ class Config(object):
             'forcing_data.major_river_forcing_file': 'major_river',
             'forcing_data.minor_river_forcing_file': 'minor_river',
         }
+        infile = self._read_merged_SOG_infile(yaml_file, edit_files)
         infile_dict = {'forcing_data_files': {}}
         for infile_key in infile_values:
-            value = SOGcommand.api.read_infile(
-                yaml_file, edit_files, infile_key)
+            value = self._get_SOG_infile_value(infile, infile_key)
             result_key = infile_values[infile_key]
             infile_dict[result_key] = value
         for infile_key in forcing_data_files:
-            value = SOGcommand.api.read_infile(
-                yaml_file, edit_files, infile_key)
+            value = self._get_SOG_infile_value(infile, infile_key)
             result_key = forcing_data_files[infile_key]
             infile_dict['forcing_data_files'][result_key] = value
         return infile_dict
 
+    def _read_merged_SOG_infile(self, yaml_file, edit_files):
+        """Return the dict that results from loading the SOG YAML
+        infile and merging the edit files into it in order.
+
+        See :func:`read_merged_SOG_infile`.
+        """
+        return read_merged_SOG_infile(yaml_file, edit_files)
+
+    def _get_SOG_infile_value(self, infile, infile_key):
+        """Return the value of the item in the merged SOG infile dict
+        at the dotted key; e.g. :kbd:`numerics.dt`.
+        """
+        item = infile
+        for key in infile_key.split('.'):
+            item = item[key]
+        return item['value']
+
+
+def read_merged_SOG_infile(yaml_file, edit_files):
+    """Return the dict that results from loading the SOG YAML infile and
+    merging the edit files into it in order.
+
+    The merged dict is cached by the paths and modification times of
+    the files so that each combination of infile and edit files is
+    only read once per process unless one of the files changes.
+    """
+    paths = [os.path.abspath(path) for path in [yaml_file] + edit_files]
+    cache_key = tuple((path, os.stat(path).st_mtime) for path in paths)
+    try:
+        return _SOG_infile_cache[cache_key]
+    except KeyError:
+        pass
+    infile = {}
+    for path in paths:
+        with open(path, 'rt') as file_obj:
+            _merge_SOG_infile_dicts(infile, yaml.safe_load(file_obj))
+    _SOG_infile_cache[cache_key] = infile
+    log.debug('read SOG infile {0} with edits {1}'
+              .format(yaml_file, edit_files))
+    return infile
+
+
+def _merge_SOG_infile_dicts(infile, edits):
+    """Recursively merge the SOG infile edits dict into the infile dict
+    in place.
+    """
+    for key, value in edits.items():
+        if isinstance(value, dict) and isinstance(infile.get(key), dict):
+            _merge_SOG_infile_dicts(infile[key], value)
+        else:
+            infile[key] = value
+
+
+class ClimateDataCache(object):
+    """Persistent on-disk cache of monthly climate data downloads.
+
+    Climate data for a month never changes once the month is closed,
+    so downloads for months before the previous one are stored in
+    files keyed by station id, year and month, and served from disk
+    on later requests. The current and previous months are always
+    downloaded afresh.
+
+    Cache files are locked while they are checked and downloaded so
+    that processes sharing the cache do not both download the same
+    month. When the total size of the cache files exceeds ``max_size``
+    bytes the least recently used files are evicted.
+
+    :arg cache_dir: Path of the directory in which to store the cache
+                    files.
+    :type cache_dir: string
+
+    :arg max_size: Maximum total size of the cache files in bytes.
+    :type max_size: int
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def get(self, station_id, data_month, fetch, parse):
+        """Return the parsed climate data for the station and data month.
+
+        ``fetch`` is a callable that downloads the data and returns an
+        iterable of byte chunks; it is called when the data month is
+        not closed, or when the closed month is not yet in the cache.
+
+        ``parse`` is a callable that consumes an iterable of byte chunks
+        and returns the parsed data, raising an exception if the data
+        are invalid.
+
+        Chunks from a download are written to a temporary file as they
+        are parsed, and the file only replaces the cache file once
+        ``parse`` has returned a non-empty result. So failed, empty, and
+        unparseable downloads are never cached. A cache file that cannot
+        be parsed is deleted and the month is downloaded again.
+        """
+        if not self._is_closed(data_month):
+            return parse(fetch())
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = os.path.join(
+            self.cache_dir,
+            '{0}_{1:%Y_%m}.xml'.format(station_id, data_month))
+        with self._lock(cache_file):
+            if os.path.exists(cache_file):
+                try:
+                    with open(cache_file, 'rb') as file_obj:
+                        result = parse(iter(
+                            functools.partial(file_obj.read, self.CHUNK_SIZE),
+                            b''))
+                except ElementTree.ParseError as e:
+                    log.warning('deleted unparseable climate data cache '
+                                'file {0}: {1}'.format(cache_file, e))
+                    os.remove(cache_file)
+                else:
+                    os.utime(cache_file)
+                    return result
+            tmp_file = cache_file + '.tmp'
+
+            def tee(file_obj):
+                for chunk in fetch():
+                    file_obj.write(chunk)
+                    yield chunk
+            try:
+                with open(tmp_file, 'wb') as file_obj:
+                    result = parse(tee(file_obj))
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+            if not result:
+                # Don't let an empty response stand in for a closed month
+                os.remove(tmp_file)
+                log.warning('no climate data for station {0} {1:%Y-%m}; '
+                            'not cached'.format(station_id, data_month))
+                return result
+            os.replace(tmp_file, cache_file)
+        self._evict()
+        return result
+
+    def _is_closed(self, data_month):
+        """Return True if the data month is before the previous month.
+        """
+        today = datetime.date.today()
+        prev_month = (today.replace(day=1) - datetime.timedelta(days=1))
+        return data_month < prev_month.replace(day=1)
+
+    @contextlib.contextmanager
+    def _lock(self, cache_file):
+        """Hold an exclusive lock on the cache file's lock file.
+
+        The lock file is deleted on release if the cache file does not
+        exist, so lock files don't outlive evicted or uncached months.
+        A lock acquired on a lock file that another process deleted
+        meanwhile is retried on a new lock file.
+        """
+        lock_path = cache_file + '.lock'
+        while True:
+            lock_file = open(lock_path, 'ab')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(
+                        os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+        try:
+            yield
+        finally:
+            if not os.path.exists(cache_file):
+                os.remove(lock_path)
+            lock_file.close()
+
+    def _evict(self):
+        """Delete least recently used cache files until the total size
+        of the cache is no more than max_size.
+        """
+        cache_files = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.xml'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cache_files.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for mtime, size, path in cache_files)
+        for mtime, size, path in sorted(cache_files):
+            if total_size <= self.max_size:
+                break
+            with self._lock(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= size
+            log.debug('evicted {0} from climate data cache'.format(path))
+
 
 class ForcingDataProcessor(object):
     """Base class for forcing data processors.
@@ -163,6 +380,110 @@ class ForcingDataProcessor(object):
     def __init__(self, config):
         self.config = config
         self.data = {}
+        self.gaps = {}
+
+    def _incremental_start_date(self, output_file, line_timestamp):
+        """Return the date of the last day in the existing forcing data
+        file if incremental updates of forcing data files are enabled.
+
+        ``line_timestamp`` is a callable that returns the timestamp of a
+        line of the file.
+
+        None is returned if incremental updates are disabled, or if the
+        file does not exist or is empty.
+        """
+        if not self.config.incremental_forcing:
+            return None
+        try:
+            with open(output_file, 'rb') as file_obj:
+                file_obj.seek(0, os.SEEK_END)
+                file_obj.seek(max(file_obj.tell() - 4096, 0))
+                lines = file_obj.read().decode('ascii').splitlines()
+        except IOError:
+            return None
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return None
+        timestamp = line_timestamp(lines[-1])
+        return datetime.date(timestamp.year, timestamp.month, timestamp.day)
+
+    def _update_forcing_file(self, output_file, buffer, line_timestamp):
+        """Update the existing forcing data file with the lines of
+        forcing data in the buffer, which starts at or before the last
+        line in the file, and return True.
+
+        ``line_timestamp`` is a callable that returns the timestamp of a
+        line of forcing data.
+
+        If the lines that overlap the end of the file are unchanged the
+        new lines are appended to the file. If some of the overlapping
+        lines have been revised the file is truncated at the first
+        revised line and the new lines are spliced in from there.
+
+        False is returned without changing the file if the buffer does
+        not start on a line in the file, or if its first line differs
+        from the one in the file; i.e. earlier data may have changed so
+        the file has to be rebuilt.
+        """
+        new_lines = buffer.splitlines(True)
+        with open(output_file, 'rt') as file_obj:
+            old_lines = file_obj.readlines()
+        if not new_lines or not old_lines:
+            return False
+        first_timestamp = line_timestamp(new_lines[0])
+        i = len(old_lines)
+        while i > 0 and line_timestamp(old_lines[i - 1]) >= first_timestamp:
+            i -= 1
+        if i == len(old_lines) or old_lines[i] != new_lines[0]:
+            return False
+        overlap = old_lines[i:]
+        j = 0
+        while j < min(len(overlap), len(new_lines)) and (
+                overlap[j] == new_lines[j]):
+            j += 1
+        if j == len(overlap):
+            with open(output_file, 'at') as file_obj:
+                file_obj.writelines(new_lines[j:])
+            log.debug('appended {0} lines to {1}'
+                      .format(len(new_lines) - j, output_file))
+        else:
+            with open(output_file, 'r+t') as file_obj:
+                file_obj.seek(sum(len(line) for line in old_lines[:i + j]))
+                file_obj.truncate()
+                file_obj.writelines(new_lines[j:])
+            log.debug('spliced {0} lines into {1} from line {2}'
+                      .format(len(new_lines) - j, output_file, i + j + 1))
+        return True
+
+    def archive_data(self, qty, station_id):
+        """Store the processed data for the quantity from the station in
+        the forcing data archive, if one is configured.
+        """
+        if not self.config.forcing_archive:
+            return
+        timestamps = [data[0] for data in self.data[qty]]
+        unit = 'h' if isinstance(timestamps[0], datetime.datetime) else 'D'
+        patched = np.zeros(len(timestamps), dtype=bool)
+        for gap_start, gap_end in self.gaps.get(qty, []):
+            patched[gap_start:gap_end + 1] = True
+        archive = ForcingArchive(self.config.forcing_archive)
+        archive.write(
+            station_id, qty,
+            np.array(timestamps, dtype='datetime64[{0}]'.format(unit)),
+            np.array([data[1] for data in self.data[qty]], dtype=float),
+            patched)
+
+    def load_archived_data(self, qty, station_id):
+        """Load the data for the quantity from the station from the
+        forcing data archive.
+        """
+        archive = ForcingArchive(self.config.forcing_archive)
+        timestamps, values, patched = archive.read(station_id, qty)
+        values = values.tolist()
+        if values and isinstance(values[0], list):
+            values = [tuple(value) for value in values]
+        self.data[qty] = list(zip(timestamps.astype(object).tolist(), values))
+        self.gaps[qty] = find_gaps(patched)
 
     def _valuegetter(self, data_item):
         """Return a data value.
@@ -199,78 +520,210 @@ class ForcingDataProcessor(object):
     def patch_data(self, qty):
         """Patch missing data values by interpolation.
         """
-        gap_start = gap_end = None
-        gap_count = 0
-        for i, data in enumerate(self.data[qty]):
-            if self._valuegetter(data[1]) is None:
-                gap_start = i if gap_start is None else gap_start
-                gap_end = i
-                log.debug(
-                    '{qty} data patched for {date}'
-                    .format(qty=qty, date=data[0]))
-                gap_count += 1
-            elif gap_start is not None:
-                self.interpolate_values(qty, gap_start, gap_end)
-                gap_start = gap_end = None
+        gaps = self._interpolate_gaps(qty)
+        for gap_start, gap_end in gaps:
+            log.debug(
+                '{qty} data patched for {start} to {end}'
+                .format(qty=qty, start=self.data[qty][gap_start][0],
+                        end=self.data[qty][gap_end][0]))
+        gap_count = sum(gap_end - gap_start + 1 for gap_start, gap_end in gaps)
         if gap_count:
             log.debug(
                 '{count} {qty} data values patched; '
                 'see debug log on disk for details'
                 .format(count=gap_count, qty=qty))
 
-    def interpolate_values(self, qty, gap_start, gap_end):
-        """Calculate values for missing data via linear interpolation.
-
-        Override this method if:
-
-        * Data is stored in data list in a type or data structure
-          other than a simple value; e.g. wind data is stored as a
-          tuple of components.
-
-        * Data requires special handling for interpolation; e.g. wind
-          data gaps that exceed 11 hours are to be patched but also
-          reported via email.
-        """
-        gap_hours = gap_end - gap_start + 1
-        if gap_hours > 11:
-            log.warning(
-                'A {qty} forcing data gap > 11 hr starting at '
-                '{gap_start:%Y-%m-%d %H:00} has been patched '
-                'by linear interpolation'
-                .format(
-                    qty=qty,
-                    gap_start=self.data[qty][gap_start][0])
-            )
-        last_value = self.data[qty][gap_start - 1][1]
-        next_value = self.data[qty][gap_end + 1][1]
-        delta = (next_value - last_value) / (gap_end - gap_start + 2)
-        for i in range(gap_end - gap_start + 1):
-            timestamp = self.data[qty][gap_start + i][0]
-            value = last_value + delta * (i + 1)
-            self.data[qty][gap_start + i] = (timestamp, value)
+    def _interpolate_gaps(self, qty):
+        """Calculate values for missing data via linear interpolation
+        with :func:`interpolate_gaps`, and return the list of
+        ``(gap_start, gap_end)`` data list index pairs of the gaps.
+
+        Data values may be simple values or tuples of components;
+        e.g. wind data is stored as a tuple of components.
+
+        Data gaps that exceed 11 hours are patched but also reported
+        via email.
+        """
+        values = np.array([data[1] for data in self.data[qty]], dtype=float)
+        gaps = interpolate_gaps(values)
+        for gap_start, gap_end in gaps:
+            if gap_end - gap_start + 1 > 11:
+                log.warning(
+                    'A {qty} forcing data gap > 11 hr starting at '
+                    '{gap_start:%Y-%m-%d %H:00} has been patched '
+                    'by linear interpolation'
+                    .format(
+                        qty=qty,
+                        gap_start=self.data[qty][gap_start][0])
+                )
+            for i in range(gap_start, gap_end + 1):
+                value = values[i].tolist()
+                if values.ndim > 1:
+                    value = tuple(value)
+                self.data[qty][i] = (self.data[qty][i][0], value)
+        self.gaps[qty] = gaps
+        return gaps
+
+
+def timestamp_parts(timestamps):
+    """Return a tuple of integer arrays of the years, months, days and
+    hours of a sequence of datetime or date objects.
+    """
+    timestamps = np.array(timestamps, dtype='datetime64[h]')
+    months = timestamps.astype('datetime64[M]')
+    days = timestamps.astype('datetime64[D]')
+    return (
+        timestamps.astype('datetime64[Y]').astype(int) + 1970,
+        months.astype(int) % 12 + 1,
+        (days - months).astype(int) + 1,
+        (timestamps - days).astype(int),
+    )
+
+
+def find_gaps(missing):
+    """Return a list of ``(gap_start, gap_end)`` index pairs of the runs
+    of true values in the Boolean ``missing`` array.
+
+    The gap ends are inclusive.
+    """
+    edges = np.diff(np.concatenate(([0], missing.astype(np.int8), [0])))
+    gap_starts = np.flatnonzero(edges == 1)
+    gap_ends = np.flatnonzero(edges == -1) - 1
+    return list(zip(gap_starts.tolist(), gap_ends.tolist()))
+
+
+def interpolate_gaps(values):
+    """Fill the gaps in the ``values`` array in place by linear
+    interpolation, and return the list of ``(gap_start, gap_end)`` index
+    pairs of the gaps.
+
+    ``values`` is a 1-D array, or a 2-D array with a column for each
+    component of an N-component series. A row is a gap if any of its
+    components is NaN. Gaps at the start or end of the array are filled
+    with the nearest valid value.
+    """
+    components = values.reshape(values.shape[0], -1)
+    missing = np.isnan(components).any(axis=1)
+    gaps = find_gaps(missing)
+    if gaps:
+        indices = np.arange(values.shape[0])
+        valid = ~missing
+        for component in components.T:
+            component[missing] = np.interp(
+                indices[missing], indices[valid], component[valid])
+    return gaps
 
 
 class ClimateDataProcessor(ForcingDataProcessor):
     """Climate forcing data processor base class.
+
+    Subclasses set :attr:`record_fields` to the names of the XML
+    elements in each hourly record that their data readers need.
     """
+    record_fields = ()
+
     def __init__(self, config, data_readers):
         self.data_readers = data_readers
+        self.columns = None
         super(ClimateDataProcessor, self).__init__(config)
 
     def get_climate_data(self, data_type, data_month):
-        """Return a list of XML objects containing the specified type of
-        climate data.
+        """Get the specified type of climate data for the data month
+        and append its XML objects to the raw_data list.
 
         The XML objects are :class:`ElementTree` subelement instances.
         """
-        params = self.config.climate.params
-        params['stationID'] = getattr(
-            self.config.climate, data_type).station_id
+        self.raw_data.extend(self._request_climate_data(data_type, data_month))
+
+    def get_climate_data_months(self, data_type, data_months):
+        """Get the specified type of climate data for each of the data
+        months and append their XML objects to the raw_data list in
+        data month order.
+
+        If the :kbd:`max_concurrent_requests` climate config value is
+        greater than 1 the requests are made concurrently by a pool of
+        that many worker threads.
+        """
+        request = functools.partial(self._request_climate_data, data_type)
+        max_workers = self.config.climate.max_concurrent_requests
+        if max_workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+                self._extend_raw_data(
+                    data_type, data_months, pool.map(request, data_months))
+        else:
+            self._extend_raw_data(
+                data_type, data_months, map(request, data_months))
+
+    def _extend_raw_data(self, data_type, data_months, results):
+        """Append the XML objects in the results for each of the data
+        months to the raw_data list.
+        """
+        for data_month, records in zip(data_months, results):
+            self.raw_data.extend(records)
+            log.debug('got {0} data for {1:%Y-%m}'
+                      .format(data_type, data_month))
+
+    def _request_climate_data(self, data_type, data_month):
+        """Return a list of XML objects containing the specified type
+        of climate data for the data month.
+
+        The request parameters are built in a new dict so that requests
+        for several months can safely be in flight at the same time.
+        """
+        station_id = getattr(self.config.climate, data_type).station_id
+        params = dict(self.config.climate.params)
+        params['stationID'] = station_id
         params.update(self._date_params(data_month))
-        response = requests.get(self.config.climate.url, params=params)
-        tree = ElementTree.parse(io.StringIO(response.text))
-        root = tree.getroot()
-        self.raw_data.extend(root.findall('stationdata'))
+
+        def fetch():
+            import requests
+            with requests.get(
+                    self.config.climate.url, params=params,
+                    stream=True) as response:
+                response.raise_for_status()
+                yield from response.iter_content(ClimateDataCache.CHUNK_SIZE)
+        cache = ClimateDataCache(
+            self.config.climate.cache['dir'],
+            self.config.climate.cache['max_size_mb'] * 1024 * 1024)
+        return cache.get(
+            station_id, data_month, fetch, self._parse_climate_data)
+
+    def _parse_climate_data(self, chunks):
+        """Parse chunks of climate data XML bytes as they arrive, and
+        return a list of compact XML objects containing only the
+        timestamp attributes and the :attr:`record_fields` elements of
+        each hourly record.
+
+        The parsed hourly record elements are released as soon as
+        their compact copies have been made, so the full XML tree is
+        never held in memory.
+        """
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        root = None
+        records = []
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    root = elem if root is None else root
+                elif elem.tag == 'stationdata':
+                    records.append(self._compact_record(elem))
+                    root.remove(elem)
+        parser.close()
+        return records
+
+    def _compact_record(self, elem):
+        """Return a copy of the stationdata XML object containing only
+        its timestamp attributes and its :attr:`record_fields`
+        elements.
+        """
+        record = ElementTree.Element('stationdata', {
+            part: elem.get(part) for part in 'year month day hour'.split()})
+        for field in self.record_fields:
+            child = elem.find(field)
+            ElementTree.SubElement(record, field).text = (
+                None if child is None else child.text)
+        return record
 
     def _date_params(self, data_month=None):
         """Return a dict of the components of the specified data month
@@ -293,13 +746,16 @@ class ClimateDataProcessor(ForcingDataProcessor):
         }
         return params
 
-    def _get_data_months(self):
+    def _get_data_months(self, since=None):
         """Return a list of date objects that are the 1st day of the
         months for which we want to get data from Environment Canada.
 
         The list starts with January of the SOG run start date year,
         and ends with the current month, wrapping through the end of
         the run start date year if necessary.
+
+        If the ``since`` date is given the list starts with the month
+        that contains it instead.
         """
         today = datetime.date.today()
         this_year = today.year
@@ -309,26 +765,85 @@ class ClimateDataProcessor(ForcingDataProcessor):
             last_year = self.config.run_start_date.year
             data_months = [datetime.date(last_year, month, 1)
                            for month in range(1, 13)] + data_months
+        if since is not None:
+            data_months = [
+                data_month for data_month in data_months
+                if data_month >= since.replace(day=1)]
         return data_months
 
-    def process_data(self, qty, end_date=datetime.date.today()):
-        """Process data from XML data records to a list of hourly
-        timestamps and data values.
+    def extract_columns(self):
+        """Extract the timestamps and the :attr:`record_fields` values
+        from all of the XML data records in the raw_data list in a
+        single pass, and store them as NumPy arrays in the columns
+        dict.
+
+        The :kbd:`timestamp` column is an array of hourly
+        :class:`numpy.datetime64` values that is shared by all of the
+        quantities.
+        Each record field column is an object array of the XML text
+        values of the field, with None indicating missing data.
         """
-        YVR_STN_CHG_DATE = datetime.date(2013, 6, 13)
-        reader = self.data_readers[qty]
-        self.data[qty] = []
+        parts = {part: [] for part in 'year month day hour'.split()}
+        fields = {field: [] for field in self.record_fields}
         for record in self.raw_data:
-            timestamp = self.read_timestamp(record)
-            if timestamp.date() > end_date:
-                break
-            if qty != 'wind' and (timestamp.date() < YVR_STN_CHG_DATE):
-                self.data[qty].append((timestamp, 0))
-            else:
-                self.data[qty].append((timestamp, reader(record)))
+            for part, values in parts.items():
+                values.append(record.get(part))
+            # Compact XML records contain only the record fields, in order
+            for child, values in zip(record, fields.values()):
+                values.append(child.text)
+        parts = {
+            part: np.array(values, dtype=int)
+            for part, values in parts.items()}
+        timestamps = (
+            (parts['year'] - 1970).astype('datetime64[Y]')
+            .astype('datetime64[M]') + (parts['month'] - 1))
+        timestamps = (
+            timestamps.astype('datetime64[D]') + (parts['day'] - 1))
+        timestamps = timestamps.astype('datetime64[h]') + parts['hour']
+        self.columns = {'timestamp': timestamps}
+        for field, values in fields.items():
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            self.columns[field] = column
+
+    def _float_column(self, column):
+        """Return a float array of the values in the text column, with
+        NaN for missing data.
+        """
+        return np.where(np.equal(column, None), 'nan', column).astype(float)
+
+    def process_data(self, qty, end_date=datetime.date.today()):
+        """Process data from the columns extracted from the XML data
+        records to a list of hourly timestamps and data values.
+        """
+        self._read_data(qty, end_date)
         self._trim_data(qty)
         self.patch_data(qty)
 
+    def _read_data(self, qty, end_date):
+        """Read the quantity values to the end date from the columns
+        extracted from the XML data records into a list of hourly
+        timestamps and data values, with None indicating missing data.
+        """
+        YVR_STN_CHG_DATE = np.datetime64(datetime.date(2013, 6, 13))
+        reader = self.data_readers[qty]
+        dates = self.columns['timestamp'].astype('datetime64[D]')
+        after_end = dates > np.datetime64(end_date)
+        count = after_end.argmax() if after_end.any() else dates.size
+        values = reader(self.columns)[:count]
+        if qty != 'wind':
+            values[dates[:count] < YVR_STN_CHG_DATE] = 0
+        timestamps = self.columns['timestamp'][:count].tolist()
+        if values.ndim == 1:
+            self.data[qty] = [
+                (timestamp, None if math.isnan(value) else value)
+                for timestamp, value in zip(timestamps, values.tolist())]
+        else:
+            self.data[qty] = [
+                (timestamp,
+                 tuple(None if math.isnan(v) else v for v in components))
+                for timestamp, components in zip(timestamps, values.tolist())]
+
     def read_timestamp(self, record):
         """Read timestamp from XML data object and return it as a
         datetime instance.
@@ -393,12 +908,9 @@ class SOG_Relation(object):
             dep_col = field_names.index(dep_field)
             self.indep_units = field_units[indep_col]
             self.dep_units = field_units[dep_col]
-            self.indep_data, self.dep_data = [], []
-            for line in file_obj:
-                self.indep_data.append(float(line.split()[indep_col]))
-                self.dep_data.append(float(line.split()[dep_col]))
-        self.indep_data = np.array(self.indep_data)
-        self.dep_data = np.array(self.dep_data)
+            data = _read_data_columns(file_obj, len(field_names))
+        self.indep_data = data[:, indep_col].copy()
+        self.dep_data = data[:, dep_col].copy()
 
 
 class SOG_Timeseries(SOG_Relation):
@@ -419,13 +931,107 @@ class SOG_Timeseries(SOG_Relation):
         else:
             return indep_slice, dep_slice
 
+    def window_slice(
+        self, start=None, end=None, mpl_dates=False, exclusive_start=False,
+    ):
+        """Return a slice object that selects the data from ``start`` up
+        to and including ``end``.
+
+        The slice is found by binary search of the independent data
+        array, or of the matplotlib dates array if ``mpl_dates`` is
+        true; either must be sorted. If ``exclusive_start`` is true the
+        data at ``start`` is excluded.
+        """
+        times = self.mpl_dates if mpl_dates else self.indep_data
+        i, j = 0, len(times)
+        if start is not None:
+            side = 'right' if exclusive_start else 'left'
+            i = np.searchsorted(times, start, side=side)
+        if end is not None:
+            j = np.searchsorted(times, end, side='right')
+        return slice(i, j)
+
+    def window(self, start=None, end=None, in_place=True):
+        """Slice the independent and dependent data arrays to the
+        independent data values from ``start`` up to and including
+        ``end``.
+
+        The slices are views of the arrays, not copies.
+        If ``in_place`` is true, replace the independent and dependent
+        data arrays with the slices, otherwise, return the slices.
+        """
+        window = self.window_slice(start, end)
+        indep_slice = self.indep_data[window]
+        dep_slice = self.dep_data[window]
+        if in_place:
+            self.indep_data = indep_slice
+            self.dep_data = dep_slice
+        else:
+            return indep_slice, dep_slice
+
+    def value_at(self, time):
+        """Return the dependent data value at the first independent data
+        value at or after ``time``.
+        """
+        return self.dep_data[np.searchsorted(self.indep_data, time)]
+
     def calc_mpl_dates(self, run_start_date):
         """Calculate matplotlib dates from the independent data array
         and the ``run_start_date``.
         """
-        self.mpl_dates = np.array(matplotlib.dates.date2num(
-            [run_start_date + datetime.timedelta(hours=hours)
-             for hours in self.indep_data]))
+        import matplotlib.dates
+        # matplotlib dates are in days
+        self.mpl_dates = (
+            matplotlib.dates.date2num(run_start_date) + self.indep_data / 24)
+
+
+def read_SOG_timeseries(datafile, indep_field, dep_fields):
+    """Read the independent field and several dependent fields from a
+    SOG time series results file in a single pass.
+
+    Returns a dict of :py:class:`SOG_Timeseries` objects keyed by
+    dependent field name. The objects share the independent data
+    array, and their dependent data arrays are views of the columns of
+    the data read from the file.
+    """
+    relation = SOG_Relation(datafile)
+    with open(datafile, 'rt') as file_obj:
+        field_names, field_units = relation.read_header(file_obj)
+        data = _read_data_columns(file_obj, len(field_names))
+    indep_col = field_names.index(indep_field)
+    # Transposed so that each column is contiguous
+    columns = data.T.copy()
+    indep_data = columns[indep_col]
+    timeseries = {}
+    for dep_field in dep_fields:
+        dep_col = field_names.index(dep_field)
+        timeseries[dep_field] = SOG_Timeseries(datafile)
+        timeseries[dep_field].indep_units = field_units[indep_col]
+        timeseries[dep_field].dep_units = field_units[dep_col]
+        timeseries[dep_field].indep_data = indep_data
+        timeseries[dep_field].dep_data = columns[dep_col]
+    return timeseries
+
+
+def _read_data_columns(file_obj, n_fields):
+    """Read the data lines that follow the header of a SOG results file
+    into a 2D NumPy array with a column for each field.
+
+    The numbers are parsed by NumPy in a single call. A partial last
+    line, as a run that is stopped while it is writing leaves, is
+    dropped.
+    """
+    text = file_obj.read()
+    return _parse_data_columns(text[:text.rfind('\n') + 1], n_fields)
+
+
+def _parse_data_columns(text, n_fields):
+    """Parse lines of whitespace separated numbers into a 2D NumPy array
+    with a column for each field.
+    """
+    values = np.fromstring(text, sep=' ')
+    n_rows = values.size // n_fields
+    return values[:n_rows * n_fields].reshape(n_rows, n_fields)
 
 
 class SOG_HoffmuellerProfile(SOG_Relation):
@@ -440,24 +1046,278 @@ class SOG_HoffmuellerProfile(SOG_Relation):
         and the indep_units and dep_units attributes to units strings
         for the data fields.
         """
-        with open(self.datafile, 'rt') as file_obj:
-            (field_names, field_units) = self.read_header(file_obj)
-            indep_col = field_names.index(indep_field)
-            dep_col = field_names.index(dep_field)
-            self.indep_units = field_units[indep_col]
-            self.dep_units = field_units[dep_col]
-            self.indep_data, self.dep_data = [], []
-            profile_count = 1
-            for line in file_obj:
-                if line == '\n':
-                    profile_count += 1
-                    if profile_count < profile_number:
-                        continue
-                    if profile_count > profile_number:
-                        break
-                else:
-                    if profile_count == profile_number:
-                        self.indep_data.append(float(line.split()[indep_col]))
-                        self.dep_data.append(float(line.split()[dep_col]))
-        self.indep_data = np.array(self.indep_data)
-        self.dep_data = np.array(self.dep_data)
+        profiles = read_SOG_Hoffmueller_profiles(
+            self.datafile, indep_field, [dep_field], profile_number)
+        self.__dict__.update(profiles[dep_field].__dict__)
+
+    def read_all_data(self, indep_field, dep_field):
+        """Read the data for the specified independent and dependent
+        fields from all of the profiles in the data file.
+
+        Sets the indep_data attribute to a NumPy array of the
+        independent field values of the first profile, the dep_data
+        attribute to a 2D depth by profile NumPy array, and the
+        indep_units and dep_units attributes to units strings for the
+        data fields.
+        """
+        profiles = read_SOG_Hoffmueller_arrays(
+            self.datafile, indep_field, [dep_field])
+        self.__dict__.update(profiles[dep_field].__dict__)
+
+
+def read_SOG_Hoffmueller_profiles(
+    datafile, indep_field, dep_fields, profile_number,
+):
+    """Read the independent field and several dependent fields of a
+    profile from a SOG Hoffmueller results file.
+
+    Profiles are numbered from 1. The profile is found by seeking to
+    its offset in the file's :py:class:`HoffmuellerIndex`.
+
+    Returns a dict of :py:class:`SOG_HoffmuellerProfile` objects keyed
+    by dependent field name that share the independent data array.
+    """
+    relation = SOG_Relation(datafile)
+    with open(datafile, 'rb') as file_obj:
+        field_names, field_units = relation.read_header(
+            line.decode('ascii') for line in iter(file_obj.readline, b''))
+        block = HoffmuellerIndex(datafile).read_profile(
+            file_obj, profile_number)
+    data = _parse_data_columns(block.decode('ascii'), len(field_names))
+    indep_col = field_names.index(indep_field)
+    columns = data.T.copy()
+    indep_data = columns[indep_col]
+    profiles = {}
+    for dep_field in dep_fields:
+        dep_col = field_names.index(dep_field)
+        profiles[dep_field] = SOG_HoffmuellerProfile(datafile)
+        profiles[dep_field].indep_units = field_units[indep_col]
+        profiles[dep_field].dep_units = field_units[dep_col]
+        profiles[dep_field].indep_data = indep_data
+        profiles[dep_field].dep_data = columns[dep_col]
+    return profiles
+
+
+def read_SOG_Hoffmueller_arrays(datafile, indep_field, dep_fields):
+    """Read the independent field and several dependent fields of all of
+    the profiles in a SOG Hoffmueller results file.
+
+    Returns a dict of :py:class:`SOG_HoffmuellerProfile` objects keyed
+    by dependent field name. Their indep_data arrays are the independent
+    field values of the first profile, and their dep_data arrays are 2D
+    depth by profile arrays, memory mapped from the
+    :py:class:`HoffmuellerArrays` cache of the file.
+    """
+    arrays = HoffmuellerArrays(datafile)
+    field_names, field_units = arrays.load()
+    indep_col = field_names.index(indep_field)
+    indep_data = arrays.read(indep_field)[:, 0]
+    profiles = {}
+    for dep_field in dep_fields:
+        dep_col = field_names.index(dep_field)
+        profiles[dep_field] = SOG_HoffmuellerProfile(datafile)
+        profiles[dep_field].indep_units = field_units[indep_col]
+        profiles[dep_field].dep_units = field_units[dep_col]
+        profiles[dep_field].indep_data = indep_data
+        profiles[dep_field].dep_data = arrays.read(dep_field)
+    return profiles
+
+
+class HoffmuellerArrays(object):
+    """Cache of the fields of all of the profiles in a SOG Hoffmueller
+    results file as 2D depth by profile arrays in NumPy binary files.
+
+    The arrays are stored in the :file:`{datafile}.arrays/` directory,
+    1 :file:`.npy` file per field, with a :file:`source.json` file that
+    records the size and modification time of the results file that
+    they were parsed from, and its field names and units. The cache is
+    rebuilt when the results file's size or modification time change.
+
+    All profiles are assumed to have the same number of depths.
+    A partial last profile, as a running SOG writes, is left out.
+    """
+    def __init__(self, datafile):
+        self.datafile = datafile
+        self.cache_dir = datafile + '.arrays'
+
+    def _path(self, field):
+        return os.path.join(
+            self.cache_dir,
+            '{0}.npy'.format(re.sub(r'\W+', '_', field)))
+
+    def load(self):
+        """Make sure that the cache is up to date with the results file,
+        and return its field names and units lists.
+        """
+        stat = os.stat(self.datafile)
+        source_path = os.path.join(self.cache_dir, 'source.json')
+        try:
+            with open(source_path, 'rt') as file_obj:
+                source = json.load(file_obj)
+        except (OSError, ValueError):
+            source = {}
+        if (source.get('size') == stat.st_size
+                and source.get('mtime_ns') == stat.st_mtime_ns
+                and all(os.path.exists(self._path(field))
+                        for field in source['field_names'])):
+            return source['field_names'], source['field_units']
+        source = self._build(stat)
+        with open(source_path + '.tmp', 'wt') as file_obj:
+            json.dump(source, file_obj)
+        os.replace(source_path + '.tmp', source_path)
+        return source['field_names'], source['field_units']
+
+    def read(self, field):
+        """Return the memory mapped 2D depth by profile array of the
+        field.
+        """
+        return np.load(self._path(field), mmap_mode='r')
+
+    def _build(self, stat):
+        """Parse all of the profiles in the results file in a single
+        pass, save an array for each field, and return the dict of
+        source information.
+        """
+        relation = SOG_Relation(self.datafile)
+        with open(self.datafile, 'rb') as file_obj:
+            field_names, field_units = relation.read_header(
+                line.decode('ascii') for line in iter(file_obj.readline, b''))
+            offsets, scanned_to = (
+                HoffmuellerIndex(self.datafile).update(file_obj))
+            file_obj.seek(offsets[0])
+            text = file_obj.read(scanned_to - offsets[0]).decode('ascii')
+        n_fields = len(field_names)
+        data = _parse_data_columns(text, n_fields)
+        n_depths = (
+            text[:offsets[1] - offsets[0]].count('\n') - 1
+            if offsets.size > 1 else data.shape[0])
+        n_profiles = data.shape[0] // n_depths if n_depths else 0
+        data = data[:n_profiles * n_depths].reshape(
+            n_profiles, n_depths, n_fields)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for col, field in enumerate(field_names):
+            path = self._path(field)
+            with open(path + '.tmp', 'wb') as file_obj:
+                np.save(file_obj, np.ascontiguousarray(data[:, :, col].T))
+            os.replace(path + '.tmp', path)
+        log.debug('cached {0} profiles from {1} in {2}'
+                  .format(n_profiles, self.datafile, self.cache_dir))
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'field_names': field_names,
+            'field_units': field_units,
+        }
+
+
+class HoffmuellerIndex(object):
+    """Index of the byte offsets of the starts of the profiles in a SOG
+    Hoffmueller results file.
+
+    Profiles follow the header and are separated by blank lines. The
+    index is saved in a :file:`{datafile}.index.npz` sidecar file, and
+    extended from where its last scan ended as SOG appends profiles to
+    the results file. It is rebuilt if the results file has been
+    replaced or truncated since the last scan.
+    """
+    # Bytes before the end of the last scan that are saved to detect
+    # a results file that has been rewritten
+    SIGNATURE_SIZE = 64
+
+    def __init__(self, datafile):
+        self.datafile = datafile
+        self.sidecar = datafile + '.index.npz'
+
+    def read_profile(self, file_obj, profile_number):
+        """Return the bytes of the data lines of the profile from the
+        results file open in binary mode.
+
+        The bytes are empty if there is no such profile.
+        """
+        offsets, scanned_to = self.update(file_obj)
+        if not 1 <= profile_number <= offsets.size:
+            return b''
+        start = offsets[profile_number - 1]
+        if profile_number < offsets.size:
+            # Exclude the blank line that separates the profiles
+            end = offsets[profile_number] - 1
+        else:
+            end = scanned_to
+        file_obj.seek(start)
+        return file_obj.read(end - start)
+
+    def update(self, file_obj):
+        """Bring the index up to date with the results file open in
+        binary mode, save it if it has changed, and return a tuple of
+        the profile start offsets array, and the offset that the scan
+        ended at.
+        """
+        stat = os.fstat(file_obj.fileno())
+        offsets, scanned_to = self._load(file_obj, stat)
+        if offsets is None:
+            file_obj.seek(0)
+            for line in iter(file_obj.readline, b''):
+                if line.startswith(b'*EndOfHeader'):
+                    break
+            scanned_to = file_obj.tell()
+            offsets = np.array([scanned_to], dtype=np.int64)
+        file_obj.seek(scanned_to)
+        chunk = file_obj.read(stat.st_size - scanned_to)
+        # Only scan complete lines
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+        if not chunk:
+            return offsets, scanned_to
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        newlines = np.flatnonzero(data == ord('\n'))
+        # A blank line is a newline at the start of a line; the scan
+        # always starts at the start of a line
+        blank = newlines[
+            (newlines == 0) | (data[newlines - 1] == ord('\n'))]
+        offsets = np.concatenate((offsets, scanned_to + blank + 1))
+        scanned_to += len(chunk)
+        self._save(file_obj, stat, offsets, scanned_to)
+        return offsets, scanned_to
+
+    def _signature(self, file_obj, scanned_to):
+        """Return the bytes before the scan end offset as an array.
+        """
+        start = max(scanned_to - self.SIGNATURE_SIZE, 0)
+        file_obj.seek(start)
+        return np.frombuffer(
+            file_obj.read(scanned_to - start), dtype=np.uint8)
+
+    def _load(self, file_obj, stat):
+        """Return the offsets and scan end offset from the sidecar file,
+        or a tuple of Nones if there is no valid saved index for the
+        results file.
+        """
+        try:
+            with np.load(self.sidecar) as sidecar:
+                offsets = sidecar['offsets']
+                scanned_to = int(sidecar['scanned_to'])
+                inode = int(sidecar['inode'])
+                signature = sidecar['signature']
+        except (OSError, KeyError, ValueError):
+            return None, None
+        if (inode != stat.st_ino or scanned_to > stat.st_size
+                or not np.array_equal(
+                    signature, self._signature(file_obj, scanned_to))):
+            return None, None
+        return offsets, scanned_to
+
+    def _save(self, file_obj, stat, offsets, scanned_to):
+        """Save the index to the sidecar file.
+
+        The index is only kept in memory if the sidecar file cannot be
+        written.
+        """
+        tmp_path = self.sidecar + '.tmp.npz'
+        try:
+            np.savez(
+                tmp_path, offsets=offsets, scanned_to=scanned_to,
+                inode=stat.st_ino,
+                signature=self._signature(file_obj, scanned_to))
+            os.replace(tmp_path, self.sidecar)
+        except OSError as e:
+            log.debug('Hoffmueller index not saved to {0}: {1}'
+                      .format(self.sidecar, e))
@@ -14,12 +14,15 @@
 
 """Wind forcing data processing module for SoG-bloomcast project.
 """
+import datetime
 import logging
 import math
 import sys
+import numpy as np
 from .utils import (
     ClimateDataProcessor,
     Config,
+    timestamp_parts,
 )
 
 
@@ -29,8 +32,10 @@ log = logging.getLogger('bloomcast.wind')
 class WindProcessor(ClimateDataProcessor):
     """Wind forcing data processor.
     """
+    record_fields = ('windspd', 'winddir')
+
     def __init__(self, config):
-        data_readers = {'wind': self.read_wind_velocity}
+        data_readers = {'wind': self.read_wind_velocity_columns}
         super(WindProcessor, self).__init__(config, data_readers)
 
     def make_forcing_data_file(self):
@@ -39,87 +44,156 @@ class WindProcessor(ClimateDataProcessor):
         incomplete days from the end, patch missing values, and write
         the data to a file in the format that SOG expects.
 
+        If incremental updates are enabled and the forcing data file
+        exists only the data months from the one that contains the last
+        day in the file onward are obtained, and the new data are
+        appended to the file. The file is rebuilt from all of the data
+        months if the new data do not line up with the file.
+
+        The processed data are also stored in the forcing data archive.
+
         Return the date of the last day for which data was obtained.
         """
-        self.raw_data = []
-        for data_month in self._get_data_months():
-            self.get_climate_data('wind', data_month)
-            log.debug('got wind data for {0:%Y-%m}'.format(data_month))
-        self.process_data('wind')
+        output_file = self.config.climate.wind.output_files['wind']
+        since = self._incremental_start_date(
+            output_file, self._line_timestamp)
+        updated = False
+        if since is not None:
+            self._process_wind_data(self._get_data_months(since))
+            updated = self._update_forcing_file(
+                output_file, self.format_data_buffer(), self._line_timestamp)
+            if not updated:
+                log.debug('wind data changed before {0:%Y-%m-%d}; '
+                          'rebuilding {1}'.format(since, output_file))
+        if not updated:
+            self._process_wind_data(self._get_data_months())
+            with open(output_file, 'wt') as file_obj:
+                file_obj.write(self.format_data_buffer())
+        self.archive_data('wind', self.config.climate.wind.station_id)
         log.debug('latest wind {0}'.format(self.data['wind'][-1]))
         data_date = self.data['wind'][-1][0].date()
-        output_file = self.config.climate.wind.output_files['wind']
-        with open(output_file, 'wt') as file_obj:
-            file_obj.writelines(self.format_data())
         return data_date
 
+    def _process_wind_data(self, data_months):
+        """Get and process the wind data for the data months.
+        """
+        self.raw_data = []
+        self.get_climate_data_months('wind', data_months)
+        self.extract_columns()
+        self.process_data('wind')
+
+    def probe_data_date(self):
+        """Get the wind data for only the latest data month from the
+        Environment Canada web service, and return the date of the last
+        complete day in it.
+
+        The previous data month is used instead if the latest one does
+        not yet contain a complete day.
+        """
+        for data_month in reversed(self._get_data_months()[-2:]):
+            self.raw_data = []
+            self.get_climate_data('wind', data_month)
+            self.extract_columns()
+            self._read_data('wind', end_date=datetime.date.today())
+            try:
+                self._trim_data('wind')
+            except ValueError:
+                continue
+            data_date = self.data['wind'][-1][0].date()
+            log.debug('wind data probe found data to {0:%Y-%m-%d}'
+                      .format(data_date))
+            return data_date
+        raise ValueError('No complete days in latest wind data months')
+
     def read_wind_velocity(self, record):
         """Read wind velocity from XML data object and transform it to
         along- and cross-strait components.
         """
-        speed = record.find('windspd').text
-        direction = record.find('winddir').text
-        try:
-            # Convert from km/hr to m/s
-            speed = float(speed) * 1000 / (60 * 60)
-            # Convert from 10s of degrees to degrees
-            direction = float(direction) * 10
-        except TypeError:
+        columns = {
+            field: np.array([record.find(field).text], dtype=object)
+            for field in self.record_fields}
+        cross_wind, along_wind = (
+            self.read_wind_velocity_columns(columns)[0].tolist())
+        if math.isnan(cross_wind):
             # None indicates missing data
             return None, None
+        return cross_wind, along_wind
+
+    def read_wind_velocity_columns(self, columns):
+        """Return an array of cross- and along-strait wind components
+        transformed from the wind speed and direction columns extracted
+        from the XML data objects.
+
+        Missing data values are NaN.
+        """
+        # Convert from km/hr to m/s
+        speeds = self._float_column(columns['windspd']) * 1000 / (60 * 60)
+        try:
+            # Convert from 10s of degrees to degrees
+            directions = self._float_column(columns['winddir']) * 10
+            calm = np.zeros(speeds.size, dtype=bool)
         except ValueError:
-            if speed == 0:
-                return 0, 0
-            else:
-                raise
+            directions, calm = self._read_calm_directions(
+                columns['winddir'], speeds)
+        cross_winds, along_winds = self.rotate_wind(speeds, directions)
+        cross_winds[calm] = along_winds[calm] = 0
+        return np.column_stack((cross_winds, along_winds))
+
+    def _read_calm_directions(self, column, speeds):
+        """Return an array of wind directions in degrees from a wind
+        direction column that contains values that are not numbers,
+        and a Boolean array that is true for the calm records.
+
+        A wind direction that is not a number is only valid in a calm
+        record; i.e. one in which the wind speed is 0.
+        """
+        directions = np.full(speeds.size, np.nan)
+        calm = np.zeros(speeds.size, dtype=bool)
+        for i, (direction, speed) in enumerate(zip(column, speeds)):
+            try:
+                directions[i] = float(direction) * 10
+            except TypeError:
+                # None indicates missing data
+                pass
+            except ValueError:
+                if speed == 0:
+                    calm[i] = True
+                elif not math.isnan(speed):
+                    raise
+        return directions, calm
+
+    def rotate_wind(self, speeds, directions):
+        """Transform arrays of wind speeds in m/s and directions in
+        degrees to arrays of cross- and along-strait components.
+        """
         # Convert speed and direction to u and v components
-        radian_direction = math.radians(direction)
-        u_wind = speed * math.sin(radian_direction)
-        v_wind = speed * math.cos(radian_direction)
+        radian_directions = np.radians(directions)
+        u_winds = speeds * np.sin(radian_directions)
+        v_winds = speeds * np.cos(radian_directions)
         # Rotate components to align u direction with Strait
         strait_heading = math.radians(305)
-        cross_wind = (
-            u_wind * math.cos(strait_heading)
-            - v_wind * math.sin(strait_heading))
-        along_wind = (
-            u_wind * math.sin(strait_heading)
-            + v_wind * math.cos(strait_heading))
+        cross_winds = (
+            u_winds * math.cos(strait_heading)
+            - v_winds * math.sin(strait_heading))
+        along_winds = (
+            u_winds * math.sin(strait_heading)
+            + v_winds * math.cos(strait_heading))
         # Resolve atmosphere/ocean direction difference in favour of
         # oceanography
-        cross_wind = -cross_wind
-        along_wind = -along_wind
-        return cross_wind, along_wind
+        return -cross_winds, -along_winds
+
+    def _line_timestamp(self, line):
+        """Return the date and hour of a line of wind forcing data.
+        """
+        day, month, year, hour = line.split()[:4]
+        return datetime.datetime(
+            int(year), int(month), int(day), int(float(hour)))
 
     def _valuegetter(self, data_item):
         """Return the along-strait wind velocity component.
         """
         return data_item[0]
 
-    def interpolate_values(self, qty, gap_start, gap_end):
-        """Calculate values for missing data via linear interpolation.
-
-        Data gaps that exceed 11 hours are to be patched but also
-        reported via email.
-        """
-        gap_hours = gap_end - gap_start + 1
-        if gap_hours > 11:
-            log.warning(
-                'A wind forcing data gap > 11 hr starting at '
-                '{0:%Y-%m-%d %H:00} has been patched by linear interpolation'
-                .format(self.data[qty][gap_start][0]))
-        last_cross_wind, last_along_wind = self.data[qty][gap_start - 1][1]
-        next_cross_wind, next_along_wind = self.data[qty][gap_end + 1][1]
-        delta_cross_wind = (
-            (next_cross_wind - last_cross_wind) / (gap_hours + 1))
-        delta_along_wind = (
-            (next_along_wind - last_along_wind) / (gap_hours + 1))
-        for i in range(gap_end - gap_start + 1):
-            timestamp = self.data[qty][gap_start + i][0]
-            cross_wind = last_cross_wind + delta_cross_wind * (i + 1)
-            along_wind = last_along_wind + delta_along_wind * (i + 1)
-            self.data[qty][gap_start + i] = (
-                timestamp, (cross_wind, along_wind))
-
     def format_data(self):
         """Generate lines of wind forcing data in the format expected
         by SOG.
@@ -143,6 +217,23 @@ class WindProcessor(ClimateDataProcessor):
                 timestamp, timestamp.hour, wind[0], wind[1])
             yield line
 
+    def format_data_buffer(self):
+        """Return the lines of wind forcing data in the format expected
+        by SOG as a single string.
+
+        The whole data array is formatted in one operation; the result
+        is identical to joining the lines from :meth:`format_data`.
+        """
+        years, months, days, hours = timestamp_parts(
+            [timestamp for timestamp, wind in self.data['wind']])
+        winds = np.array(
+            [wind for timestamp, wind in self.data['wind']],
+            dtype=float).reshape(-1, 2)
+        columns = np.column_stack((days, months, years, hours, winds))
+        line_format = '%02d %02d %04d %.1f %f %f\n'
+        return (
+            (line_format * len(columns)) % tuple(columns.ravel().tolist()))
+
 
 def run(config_file):
     """Process meteorological forcing data into SOG forcing data
@@ -32,7 +32,6 @@ other_classifiers = [
 ]
 
 install_requires = [
-    'arrow',
     'BeautifulSoup4',
     'mako',
     'matplotlib',
@@ -2,8 +2,16 @@
 """
 import bs4
 import datetime
+import json
+import os
+import subprocess
+import sys
+import time
 import unittest.mock as mock
+from xml.etree import ElementTree
+import numpy as np
 import pytest
+import yaml
 
 
 @pytest.fixture
@@ -16,8 +24,14 @@ def make_config():
 def config_dict():
     config_dict = {
         'get_forcing_data': None,
+        'incremental_forcing': None,
+        'forcing_archive': None,
         'run_SOG': None,
         'SOG_executable': None,
+        'max_concurrent_SOG_runs': None,
+        'SOG_run_cache': None,
+        'SOG_early_stop_margin_days': None,
+        'SOG_watchdog': None,
         'html_results': None,
         'infiles': {
             'base': None,
@@ -70,6 +84,7 @@ def config_dict():
 def infile_dict():
     infile_dict = {
         'run_start_date': datetime.datetime(2011, 11, 11, 12, 33, 42),
+        'run_end_date': datetime.datetime(2012, 5, 1, 0, 33, 42),
         'SOG_timestep': '900',
         'std_phys_ts_outfile': None,
         'std_bio_ts_outfile': None,
@@ -127,6 +142,26 @@ def make_RiversProcessor():
     return RiversProcessor(mock_config_)
 
 
+@pytest.fixture
+def make_Bloomcast():
+    from bloomcast.bloomcast import Bloomcast
+    bloomcast = Bloomcast.__new__(Bloomcast)
+    bloomcast.config = mock_config()
+    return bloomcast
+
+
+def make_climate_record(timestamp, **fields):
+    """Return a compact climate data XML record with the timestamp and
+    field values.
+    """
+    record = ElementTree.Element('stationdata', {
+        part: str(getattr(timestamp, part))
+        for part in 'year month day hour'.split()})
+    for field, text in fields.items():
+        ElementTree.SubElement(record, field).text = text
+    return record
+
+
 class TestConfig():
     """Unit tests for Config object.
     """
@@ -205,12 +240,68 @@ class TestConfig():
         config._load_wind_config(mock_config_dict, infile_dict())
         assert config.climate.wind.station_id == test_station_id
 
+    def _write_SOG_infiles(self, tmpdir):
+        base = tmpdir.join('infile.yaml')
+        base.write(
+            'initial_conditions:\n'
+            '  init_datetime:\n'
+            '    value: 2013-09-19 18:49:00\n'
+            'numerics:\n'
+            '  dt:\n'
+            '    value: 900\n'
+            'timeseries_results:\n'
+            '  std_physics:\n'
+            '    value: std_phys.out\n')
+        edit = tmpdir.join('edit_infile.yaml')
+        edit.write(
+            'timeseries_results:\n'
+            '  std_physics:\n'
+            '    value: std_phys_early.out\n')
+        return str(base), str(edit)
+
+    def test_read_merged_SOG_infile_applies_edits(self, tmpdir):
+        """_read_merged_SOG_infile merges edit files into base infile
+        """
+        base, edit = self._write_SOG_infiles(tmpdir)
+        config = make_config()
+        infile = config._read_merged_SOG_infile(base, [edit])
+        value = config._get_SOG_infile_value
+        assert value(infile, 'numerics.dt') == 900
+        assert value(infile, 'initial_conditions.init_datetime') == (
+            datetime.datetime(2013, 9, 19, 18, 49))
+        assert value(infile, 'timeseries_results.std_physics') == (
+            'std_phys_early.out')
+
+    def test_read_merged_SOG_infile_cached(self, tmpdir):
+        """_read_merged_SOG_infile reads each file combination only once
+        """
+        base, edit = self._write_SOG_infiles(tmpdir)
+        config = make_config()
+        infile = config._read_merged_SOG_infile(base, [edit])
+        with mock.patch('bloomcast.utils.yaml') as mock_yaml:
+            assert make_config()._read_merged_SOG_infile(
+                base, [edit]) is infile
+        assert not mock_yaml.safe_load.called
+
+    def test_read_merged_SOG_infile_rereads_changed_file(self, tmpdir):
+        """_read_merged_SOG_infile rereads infile when its mtime changes
+        """
+        base, edit = self._write_SOG_infiles(tmpdir)
+        config = make_config()
+        config._read_merged_SOG_infile(base, [edit])
+        with open(edit, 'at') as file_obj:
+            file_obj.write('numerics:\n  dt:\n    value: 600\n')
+        stat = os.stat(edit)
+        os.utime(edit, (stat.st_atime, stat.st_mtime + 10))
+        infile = config._read_merged_SOG_infile(base, [edit])
+        assert config._get_SOG_infile_value(infile, 'numerics.dt') == 600
+
 
 class TestForcingDataProcessor():
     """Unit tests for ForcingDataProcessor object.
     """
     def test_patch_data_1_hour_gap(self):
-        """patch_data correctly flags 1 hour gap in data for interpolation
+        """patch_data interpolates value for 1 hour gap in data
         """
         processor = make_ForcingDataProcessor()
         processor.data['air_temperature'] = [
@@ -218,20 +309,21 @@ class TestForcingDataProcessor():
             (datetime.datetime(2011, 9, 25, 10, 0, 0), None),
             (datetime.datetime(2011, 9, 25, 11, 0, 0), 235.0),
         ]
-        processor.interpolate_values = mock.Mock(name='interpolate_values')
         with mock.patch('bloomcast.utils.log') as mock_log:
             processor.patch_data('air_temperature')
         expected = [
-            (('air_temperature data patched for 2011-09-25 10:00:00',),),
+            (('air_temperature data patched for 2011-09-25 10:00:00 '
+              'to 2011-09-25 10:00:00',),),
             (('1 air_temperature data values patched; '
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        processor.interpolate_values.assert_called_once_with(
-            'air_temperature', 1, 1)
+        expected = (datetime.datetime(2011, 9, 25, 10, 0, 0), 225.0)
+        assert processor.data['air_temperature'][1] == expected
+        assert processor.gaps['air_temperature'] == [(1, 1)]
 
     def test_patch_data_2_hour_gap(self):
-        """patch_data correctly flags 2 hour gap in data for interpolation
+        """patch_data interpolates values for 2 hour gap in data
         """
         processor = make_ForcingDataProcessor()
         processor.data = {}
@@ -241,21 +333,23 @@ class TestForcingDataProcessor():
             (datetime.datetime(2011, 9, 25, 11, 0, 0), None),
             (datetime.datetime(2011, 9, 25, 12, 0, 0), 230.0),
         ]
-        processor.interpolate_values = mock.Mock()
         with mock.patch('bloomcast.utils.log') as mock_log:
             processor.patch_data('air_temperature')
         expected = [
-            (('air_temperature data patched for 2011-09-25 10:00:00',),),
-            (('air_temperature data patched for 2011-09-25 11:00:00',),),
+            (('air_temperature data patched for 2011-09-25 10:00:00 '
+              'to 2011-09-25 11:00:00',),),
             (('2 air_temperature data values patched; '
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        processor.interpolate_values.assert_called_once_with(
-            'air_temperature', 1, 2)
+        expected = [
+            (datetime.datetime(2011, 9, 25, 10, 0, 0), 220.0),
+            (datetime.datetime(2011, 9, 25, 11, 0, 0), 225.0),
+        ]
+        assert processor.data['air_temperature'][1:3] == expected
 
     def test_patch_data_2_gaps(self):
-        """patch_data correctly flags 2 gaps in data for interpolation
+        """patch_data interpolates values for 2 gaps in data
         """
         processor = make_ForcingDataProcessor()
         processor.data['air_temperature'] = [
@@ -266,52 +360,22 @@ class TestForcingDataProcessor():
             (datetime.datetime(2011, 9, 25, 13, 0, 0), None),
             (datetime.datetime(2011, 9, 25, 14, 0, 0), 250.0),
         ]
-        processor.interpolate_values = mock.Mock()
         with mock.patch('bloomcast.utils.log') as mock_log:
             processor.patch_data('air_temperature')
         expected = [
-            (('air_temperature data patched for 2011-09-25 10:00:00',),),
-            (('air_temperature data patched for 2011-09-25 11:00:00',),),
-            (('air_temperature data patched for 2011-09-25 13:00:00',),),
+            (('air_temperature data patched for 2011-09-25 10:00:00 '
+              'to 2011-09-25 11:00:00',),),
+            (('air_temperature data patched for 2011-09-25 13:00:00 '
+              'to 2011-09-25 13:00:00',),),
             (('3 air_temperature data values patched; '
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        expected = [(('air_temperature', 1, 2),), (('air_temperature', 4, 4),)]
-        assert processor.interpolate_values.call_args_list == expected
-
-    def test_interpolate_values_1_hour_gap(self):
-        """interpolate_values interpolates value for 1 hour gap in data
-        """
-        processor = make_ForcingDataProcessor()
-        processor.data = {}
-        processor.data['air_temperature'] = [
-            (datetime.datetime(2011, 9, 25, 9, 0, 0), 215.0),
-            (datetime.datetime(2011, 9, 25, 10, 0, 0), None),
-            (datetime.datetime(2011, 9, 25, 11, 0, 0), 235.0),
-        ]
-        processor.interpolate_values('air_temperature', 1, 1)
-        expected = (datetime.datetime(2011, 9, 25, 10, 0, 0), 225.0)
-        assert processor.data['air_temperature'][1] == expected
-
-    def test_interpolate_values_2_hour_gap(self):
-        """interpolate_values interpolates value for 2 hour gap in data
-        """
-        processor = make_ForcingDataProcessor()
-        processor.data = {}
-        processor.data['air_temperature'] = [
-            (datetime.datetime(2011, 9, 25, 9, 0, 0), 215.0),
-            (datetime.datetime(2011, 9, 25, 10, 0, 0), None),
-            (datetime.datetime(2011, 9, 25, 11, 0, 0), None),
-            (datetime.datetime(2011, 9, 25, 12, 0, 0), 230.0),
-        ]
-        processor.interpolate_values('air_temperature', 1, 2)
-        expected = (datetime.datetime(2011, 9, 25, 10, 0, 0), 220.0)
-        assert processor.data['air_temperature'][1] == expected
-        expected = (datetime.datetime(2011, 9, 25, 11, 0, 0), 225.0)
-        assert processor.data['air_temperature'][2] == expected
+        values = [data[1] for data in processor.data['air_temperature']]
+        assert values == [215.0, 220.0, 225.0, 230.0, 240.0, 250.0]
+        assert processor.gaps['air_temperature'] == [(1, 2), (4, 4)]
 
-    def test_interpolate_values_gap_gt_11_hr_logs_warning(self):
+    def test_patch_data_gap_gt_11_hr_logs_warning(self):
         """data gap >11 hr generates warning log message
         """
         processor = make_ForcingDataProcessor()
@@ -324,13 +388,55 @@ class TestForcingDataProcessor():
         processor.data['air_temperature'].append(
             (datetime.datetime(2014, 2, 11, 16, 0, 0), 30.0))
         with mock.patch('bloomcast.utils.log', mock.Mock()) as mock_log:
-            processor.interpolate_values(
-                'air_temperature', gap_start=1, gap_end=15)
+            processor.patch_data('air_temperature')
             mock_log.warning.assert_called_once_with(
                 'A air_temperature forcing data gap > 11 hr starting at '
                 '2014-02-11 01:00 has been patched by linear interpolation')
 
 
+class TestInterpolateGaps():
+    """Unit tests for find_gaps and interpolate_gaps functions.
+    """
+    def test_find_gaps(self):
+        """find_gaps returns inclusive index pairs of runs of missing values
+        """
+        from bloomcast.utils import find_gaps
+        missing = np.array([True, False, True, True, False, True])
+        assert find_gaps(missing) == [(0, 0), (2, 3), (5, 5)]
+
+    def test_find_gaps_no_gaps(self):
+        """find_gaps returns empty list when there are no missing values
+        """
+        from bloomcast.utils import find_gaps
+        assert find_gaps(np.zeros(4, dtype=bool)) == []
+
+    def test_interpolate_gaps_1_component(self):
+        """interpolate_gaps fills 1-D array gaps by linear interpolation
+        """
+        from bloomcast.utils import interpolate_gaps
+        values = np.array([4300.0, np.nan, np.nan, 4600.0, np.nan, 4800.0])
+        gaps = interpolate_gaps(values)
+        assert gaps == [(1, 2), (4, 4)]
+        assert values.tolist() == [4300, 4400, 4500, 4600, 4700, 4800]
+
+    def test_interpolate_gaps_2_components(self):
+        """interpolate_gaps fills rows with any missing component
+        """
+        from bloomcast.utils import interpolate_gaps
+        values = np.array([[1.0, -2.0], [np.nan, np.nan], [2.0, -1.0]])
+        gaps = interpolate_gaps(values)
+        assert gaps == [(1, 1)]
+        assert values[1].tolist() == [1.5, -1.5]
+
+    def test_interpolate_gaps_at_ends(self):
+        """interpolate_gaps fills gaps at ends with nearest valid value
+        """
+        from bloomcast.utils import interpolate_gaps
+        values = np.array([np.nan, 2.0, 3.0, np.nan])
+        interpolate_gaps(values)
+        assert values.tolist() == [2.0, 2.0, 3.0, 3.0]
+
+
 class TestClimateDataProcessor():
     """Unit tests for ClimateDataProcessor object.
     """
@@ -357,12 +463,318 @@ class TestClimateDataProcessor():
         assert data_months[11] == datetime.date(2011, 12, 1)
         assert data_months[-1] == datetime.date(2012, 2, 1)
 
+    def test_get_data_months_since(self):
+        """_get_data_months starts at the month that contains since date
+        """
+        processor = make_ClimateDataProcessor()
+        with mock.patch('bloomcast.utils.datetime') as mock_datetime:
+            mock_datetime.date.today.return_value = datetime.date(2012, 2, 1)
+            mock_datetime.date.side_effect = datetime.date
+            data_months = processor._get_data_months(
+                since=datetime.date(2011, 12, 17))
+        expected = [datetime.date(2011, 12, 1), datetime.date(2012, 1, 1),
+                    datetime.date(2012, 2, 1)]
+        assert data_months == expected
+
+    def test_request_climate_data_leaves_config_params_unchanged(
+            self, tmpdir):
+        """_request_climate_data does not mutate config.climate.params
+        """
+        processor = make_ClimateDataProcessor()
+        processor.config.climate.params = {'timeframe': 1, 'format': 'xml'}
+        processor.config.climate.cache = {
+            'dir': str(tmpdir), 'max_size_mb': 1}
+        processor.config.climate.wind.station_id = 6831
+        response = mock.MagicMock(name='response')
+        response.__enter__().iter_content.return_value = [
+            b'<climatedata></climatedata>']
+        with mock.patch('requests.get') as mock_get:
+            mock_get.return_value = response
+            processor._request_climate_data(
+                'wind', datetime.date(2011, 9, 1))
+        assert processor.config.climate.params == {
+            'timeframe': 1, 'format': 'xml'}
+        params = mock_get.call_args[1]['params']
+        assert params['stationID'] == 6831
+        assert params['Month'] == 9
+
+    def test_request_climate_data_error_response_not_cached(self, tmpdir):
+        """_request_climate_data raises on an HTTP error and caches nothing
+        """
+        processor = make_ClimateDataProcessor()
+        processor.config.climate.params = {'timeframe': 1, 'format': 'xml'}
+        processor.config.climate.cache = {
+            'dir': str(tmpdir), 'max_size_mb': 1}
+        processor.config.climate.wind.station_id = 6831
+        response = mock.MagicMock(name='response')
+        response.__enter__().raise_for_status.side_effect = IOError('503')
+        response.__enter__().iter_content.return_value = [
+            b'<html>Service Unavailable</html>']
+        with mock.patch('requests.get', return_value=response):
+            with pytest.raises(IOError):
+                processor._request_climate_data(
+                    'wind', datetime.date(2011, 9, 1))
+        assert not tmpdir.join('6831_2011_09.xml').check()
+
+    def test_parse_climate_data_keeps_only_record_fields(self):
+        """_parse_climate_data returns compact records across chunks
+        """
+        processor = make_ClimateDataProcessor()
+        processor.record_fields = ('temp', 'weather')
+        xml = (
+            b'<climatedata><stationinformation><name>YVR</name>'
+            b'</stationinformation>'
+            b'<stationdata day="25" hour="9" minute="0" month="9" '
+            b'year="2011"><temp>21.5</temp><relhum>60</relhum>'
+            b'<weather>Clear</weather></stationdata>'
+            b'<stationdata day="25" hour="10" minute="0" month="9" '
+            b'year="2011"><temp></temp><relhum>62</relhum>'
+            b'<weather>NA</weather></stationdata>'
+            b'</climatedata>')
+        chunks = [xml[i:i + 50] for i in range(0, len(xml), 50)]
+        records = processor._parse_climate_data(chunks)
+        assert len(records) == 2
+        assert processor.read_timestamp(records[1]) == datetime.datetime(
+            2011, 9, 25, 10)
+        assert records[0].find('temp').text == '21.5'
+        assert records[1].find('temp').text is None
+        assert records[1].find('weather').text == 'NA'
+        assert records[0].find('relhum') is None
+
+    def test_extract_columns(self):
+        """extract_columns makes timestamp and record field columns
+        """
+        processor = make_ClimateDataProcessor()
+        processor.record_fields = ('temp', 'weather')
+        processor.raw_data = [
+            make_climate_record(
+                datetime.datetime(2011, 12, 31, 23), temp='1.5',
+                weather='Clear'),
+            make_climate_record(
+                datetime.datetime(2012, 1, 1, 0), temp=None, weather=None),
+        ]
+        processor.extract_columns()
+        assert processor.columns['timestamp'].tolist() == [
+            datetime.datetime(2011, 12, 31, 23),
+            datetime.datetime(2012, 1, 1, 0),
+        ]
+        assert processor.columns['temp'].tolist() == ['1.5', None]
+        assert processor.columns['weather'].tolist() == ['Clear', None]
+
+    def test_read_data_stops_at_end_date(self):
+        """_read_data reads values to end date with None for missing data
+        """
+        processor = make_ClimateDataProcessor()
+        processor.record_fields = ('temp',)
+        processor.raw_data = [
+            make_climate_record(
+                datetime.datetime(2014, 2, 10 + i // 24, i % 24),
+                temp=None if i == 1 else '2')
+            for i in range(48)]
+        processor.extract_columns()
+        processor.data_readers = {
+            'air_temperature': lambda columns: processor._float_column(
+                columns['temp'])}
+        processor._read_data('air_temperature', datetime.date(2014, 2, 10))
+        data = processor.data['air_temperature']
+        assert len(data) == 24
+        assert data[0] == (datetime.datetime(2014, 2, 10, 0), 2.0)
+        assert data[1] == (datetime.datetime(2014, 2, 10, 1), None)
+
+    def test_get_climate_data_months_concurrent_keeps_month_order(self):
+        """concurrent get_climate_data_months keeps raw_data in month order
+        """
+        processor = make_ClimateDataProcessor()
+        processor.config.climate.max_concurrent_requests = 4
+        processor.raw_data = []
+        data_months = [datetime.date(2011, month, 1) for month in range(1, 7)]
+
+        def mock_request(data_type, data_month):
+            return [data_month.month, data_month.month]
+        processor._request_climate_data = mock_request
+        processor.get_climate_data_months('wind', data_months)
+        assert processor.raw_data == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6]
+
+
+class TestClimateDataCache():
+    """Unit tests for ClimateDataCache object.
+    """
+    def test_get_closed_month_served_from_cache(self, tmpdir):
+        """get fetches a closed month once and then serves it from disk
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+        fetch = mock.Mock(return_value=[b'<climate', b'data/>'])
+        for i in range(2):
+            content = cache.get(
+                6831, datetime.date(2011, 9, 1), fetch, b''.join)
+            assert content == b'<climatedata/>'
+        assert fetch.call_count == 1
+        assert tmpdir.join('6831_2011_09.xml').check()
+
+    def test_get_previous_month_always_fetched(self, tmpdir):
+        """get always fetches the previous month
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+        fetch = mock.Mock(return_value=[b'<climatedata/>'])
+        prev_month = (datetime.date.today().replace(day=1)
+                      - datetime.timedelta(days=1)).replace(day=1)
+        for i in range(2):
+            cache.get(6831, prev_month, fetch, b''.join)
+        assert fetch.call_count == 2
+        assert not tmpdir.listdir()
+
+    def test_get_evicts_least_recently_used(self, tmpdir):
+        """get evicts least recently used months when cache is too big
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 20)
+        fetch = mock.Mock(return_value=[b'0123456789'])
+        for month in range(8, 11):
+            cache.get(
+                6831, datetime.date(2011, month, 1), fetch, b''.join)
+            if month == 8:
+                tmpdir.join('6831_2011_08.xml').setmtime(0)
+        assert sorted(path.basename for path in tmpdir.listdir()) == [
+            '6831_2011_09.xml', '6831_2011_09.xml.lock',
+            '6831_2011_10.xml', '6831_2011_10.xml.lock']
+
+    def test_get_failed_fetch_not_cached(self, tmpdir):
+        """get does not cache a closed month whose download fails
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+
+        def fetch():
+            yield b'<climate'
+            raise IOError('connection reset')
+        with pytest.raises(IOError):
+            cache.get(6831, datetime.date(2011, 9, 1), fetch, b''.join)
+        assert not tmpdir.listdir()
+
+    def test_get_empty_fetch_not_cached(self, tmpdir):
+        """get does not cache a closed month with an empty download
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+        fetch = mock.Mock(return_value=[])
+        cache.get(6831, datetime.date(2011, 9, 1), fetch, b''.join)
+        assert not tmpdir.listdir()
+
+    def test_get_unparseable_fetch_not_cached(self, tmpdir):
+        """get does not cache a closed month whose download won't parse
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+        fetch = mock.Mock(return_value=[b'<climatedata><stationdata>'])
+
+        def parse(chunks):
+            parser = ElementTree.XMLPullParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            parser.close()
+            return [parser]
+        with pytest.raises(ElementTree.ParseError):
+            cache.get(6831, datetime.date(2011, 9, 1), fetch, parse)
+        assert not tmpdir.listdir()
+
+    def test_get_unparseable_cache_file_fetched_again(self, tmpdir):
+        """get replaces a cache file that won't parse with a new download
+        """
+        from bloomcast.utils import ClimateDataCache
+        cache = ClimateDataCache(str(tmpdir), 1024)
+        tmpdir.join('6831_2011_09.xml').write(b'<climatedata>', 'wb')
+        fetch = mock.Mock(return_value=[b'<climatedata/>'])
+
+        def parse(chunks):
+            return [ElementTree.fromstring(b''.join(chunks))]
+        cache.get(6831, datetime.date(2011, 9, 1), fetch, parse)
+        assert fetch.call_count == 1
+        assert tmpdir.join('6831_2011_09.xml').read() == '<climatedata/>'
+
+
+class TestForcingArchive():
+    """Unit tests for ForcingArchive object.
+    """
+    def _write_series(self, archive, start, count):
+        timestamps = np.arange(
+            np.datetime64(start, 'h'), np.datetime64(start, 'h') + count)
+        values = np.arange(count, dtype=float)
+        archive.write(6831, 'wind', timestamps, values,
+                      np.zeros(count, dtype=bool))
+        return timestamps, values
+
+    def test_write_read_round_trip(self, tmpdir):
+        """read returns memory mapped arrays of written series
+        """
+        from bloomcast.archive import ForcingArchive
+        archive = ForcingArchive(str(tmpdir))
+        timestamps, values = self._write_series(archive, '2011-12-31', 48)
+        archived = archive.read(6831, 'wind')
+        assert all(isinstance(array, np.memmap) for array in archived)
+        np.testing.assert_array_equal(archived[0], timestamps)
+        np.testing.assert_array_equal(archived[1], values)
+        assert not archived[2].any()
+
+    def test_read_window(self, tmpdir):
+        """read slices series to timestamps from start up to end
+        """
+        from bloomcast.archive import ForcingArchive
+        archive = ForcingArchive(str(tmpdir))
+        self._write_series(archive, '2011-12-31', 48)
+        timestamps, values, patched = archive.read(
+            6831, 'wind', start=datetime.date(2012, 1, 1),
+            end=datetime.datetime(2012, 1, 1, 6))
+        assert timestamps[0] == np.datetime64('2012-01-01T00', 'h')
+        assert values.tolist() == [24.0, 25.0, 26.0, 27.0, 28.0, 29.0]
+
+    def test_write_replaces_overlap(self, tmpdir):
+        """write replaces archived values from first new timestamp on
+        """
+        from bloomcast.archive import ForcingArchive
+        archive = ForcingArchive(str(tmpdir))
+        self._write_series(archive, '2011-12-31', 48)
+        self._write_series(archive, '2012-01-01', 48)
+        timestamps, values, patched = archive.read(6831, 'wind')
+        assert timestamps.size == 72
+        assert values[23] == 23.0
+        assert values[24] == 0.0
+        assert timestamps[-1] == np.datetime64('2012-01-02T23', 'h')
+
+    def test_has_series(self, tmpdir):
+        """has_series is True only for archived series
+        """
+        from bloomcast.archive import ForcingArchive
+        archive = ForcingArchive(str(tmpdir))
+        self._write_series(archive, '2011-12-31', 24)
+        assert archive.has_series(6831, 'wind')
+        assert not archive.has_series(6831, 'air_temperature')
+
+    def test_processor_archive_round_trip(self, tmpdir):
+        """load_archived_data restores archived processor data and gaps
+        """
+        from bloomcast.wind import WindProcessor
+        config = mock_config()
+        config.forcing_archive = str(tmpdir)
+        wind = WindProcessor(config)
+        data = [
+            (datetime.datetime(2011, 12, 31, hour), (hour * 0.5, -1.0))
+            for hour in range(24)]
+        wind.data['wind'] = list(data)
+        wind.gaps['wind'] = [(3, 5)]
+        wind.archive_data('wind', 6831)
+        wind = WindProcessor(config)
+        wind.load_archived_data('wind', 6831)
+        assert wind.data['wind'] == data
+        assert wind.gaps['wind'] == [(3, 5)]
+
 
 class TestWindProcessor():
     """Unit tests for WindProcessor object.
     """
-    def test_interpolate_values_1_hour_gap(self):
-        """interpolate_values interpolates value for 1 hour gap in data
+    def test_patch_data_1_hour_gap(self):
+        """patch_data interpolates components for 1 hour gap in data
         """
         wind = make_WindProcessor()
         wind.data['wind'] = [
@@ -370,12 +782,12 @@ class TestWindProcessor():
             (datetime.datetime(2011, 9, 25, 10, 0, 0), (None, None)),
             (datetime.datetime(2011, 9, 25, 11, 0, 0), (2.0, -1.0)),
         ]
-        wind.interpolate_values('wind', 1, 1)
+        wind.patch_data('wind')
         expected = (datetime.datetime(2011, 9, 25, 10, 0, 0), (1.5, -1.5))
         assert wind.data['wind'][1] == expected
 
-    def test_interpolate_values_2_hour_gap(self):
-        """interpolate_values interpolates value for 2 hour gap in data
+    def test_patch_data_2_hour_gap(self):
+        """patch_data interpolates components for 2 hour gap in data
         """
         wind = make_WindProcessor()
         wind.data['wind'] = [
@@ -384,13 +796,13 @@ class TestWindProcessor():
             (datetime.datetime(2011, 9, 25, 11, 0, 0), (None, None)),
             (datetime.datetime(2011, 9, 25, 12, 0, 0), (2.5, -0.5)),
         ]
-        wind.interpolate_values('wind', 1, 2)
+        wind.patch_data('wind')
         expected = (datetime.datetime(2011, 9, 25, 10, 0, 0), (1.5, -1.5))
         assert wind.data['wind'][1] == expected
         expected = (datetime.datetime(2011, 9, 25, 11, 0, 0), (2.0, -1.0))
         assert wind.data['wind'][2] == expected
 
-    def test_interpolate_values_gap_gt_11_hr_logs_warning(self):
+    def test_patch_data_gap_gt_11_hr_logs_warning(self):
         """wind data gap >11 hr generates warning log message
         """
         wind = make_WindProcessor()
@@ -402,12 +814,109 @@ class TestWindProcessor():
             for i in range(15)])
         wind.data['wind'].append(
             (datetime.datetime(2011, 9, 25, 16, 0, 0), (1.0, -2.0)))
-        with mock.patch('bloomcast.wind.log', mock.Mock()) as mock_log:
-            wind.interpolate_values('wind', gap_start=1, gap_end=15)
+        with mock.patch('bloomcast.utils.log', mock.Mock()) as mock_log:
+            wind.patch_data('wind')
             mock_log.warning.assert_called_once_with(
                 'A wind forcing data gap > 11 hr starting at 2011-09-25 01:00 '
                 'has been patched by linear interpolation')
 
+    def test_probe_data_date_latest_month(self):
+        """probe_data_date returns last complete day in latest data month
+        """
+        wind = make_WindProcessor()
+        wind._get_data_months = mock.Mock(return_value=[
+            datetime.date(2012, 2, 1), datetime.date(2012, 3, 1)])
+
+        def mock_get_climate_data(data_type, data_month):
+            wind.raw_data = [
+                make_climate_record(
+                    datetime.datetime(2012, 3, 1 + i // 24, i % 24),
+                    windspd='10' if i < 36 else None, winddir='30')
+                for i in range(48)]
+        wind.get_climate_data = mock_get_climate_data
+        assert wind.probe_data_date() == datetime.date(2012, 3, 1)
+
+    def test_probe_data_date_falls_back_to_previous_month(self):
+        """probe_data_date uses previous month if latest has no complete day
+        """
+        wind = make_WindProcessor()
+        wind._get_data_months = mock.Mock(return_value=[
+            datetime.date(2012, 2, 1), datetime.date(2012, 3, 1)])
+
+        def mock_get_climate_data(data_type, data_month):
+            if data_month.month == 3:
+                wind.raw_data = [
+                    make_climate_record(
+                        datetime.datetime(2012, 3, 1, i),
+                        windspd=None, winddir=None)
+                    for i in range(24)]
+            else:
+                wind.raw_data = [
+                    make_climate_record(
+                        datetime.datetime(2012, 2, 28, i),
+                        windspd='10', winddir='30')
+                    for i in range(24)]
+        wind.get_climate_data = mock_get_climate_data
+        assert wind.probe_data_date() == datetime.date(2012, 2, 28)
+
+    def test_read_wind_velocity_columns(self):
+        """read_wind_velocity_columns returns components with NaN for missing
+        """
+        wind = make_WindProcessor()
+        wind.raw_data = [
+            make_climate_record(
+                datetime.datetime(2011, 9, 25, 9), windspd='36',
+                winddir='12.5'),
+            make_climate_record(
+                datetime.datetime(2011, 9, 25, 10), windspd=None,
+                winddir='9'),
+            make_climate_record(
+                datetime.datetime(2011, 9, 25, 11), windspd='18',
+                winddir=None),
+        ]
+        wind.extract_columns()
+        components = wind.read_wind_velocity_columns(wind.columns)
+        # 10 m/s from 125 deg is along the strait axis
+        assert components[0, 0] == pytest.approx(0)
+        assert components[0, 1] == pytest.approx(10)
+        assert np.isnan(components[1:]).all()
+
+    def test_read_wind_velocity_columns_calm(self):
+        """read_wind_velocity_columns gives 0 components for calm records
+        """
+        wind = make_WindProcessor()
+        columns = {
+            'windspd': np.array(['0', None, '10'], dtype=object),
+            'winddir': np.array(['', '', '9'], dtype=object),
+        }
+        components = wind.read_wind_velocity_columns(columns)
+        assert components[0].tolist() == [0, 0]
+        assert np.isnan(components[1]).all()
+
+    def test_read_wind_velocity_columns_bad_direction(self):
+        """read_wind_velocity_columns raises ValueError for bad direction
+        """
+        wind = make_WindProcessor()
+        columns = {
+            'windspd': np.array(['10'], dtype=object),
+            'winddir': np.array(['NNW'], dtype=object),
+        }
+        with pytest.raises(ValueError):
+            wind.read_wind_velocity_columns(columns)
+
+    def test_read_wind_velocity_wrapper(self):
+        """read_wind_velocity returns tuple of components or Nones
+        """
+        wind = make_WindProcessor()
+        record = make_climate_record(
+            datetime.datetime(2011, 9, 25, 9), windspd='36', winddir='12.5')
+        cross_wind, along_wind = wind.read_wind_velocity(record)
+        assert cross_wind == pytest.approx(0)
+        assert along_wind == pytest.approx(10)
+        record = make_climate_record(
+            datetime.datetime(2011, 9, 25, 9), windspd=None, winddir='12')
+        assert wind.read_wind_velocity(record) == (None, None)
+
     def test_format_data(self):
         """format_data generator returns formatted forcing data file line
         """
@@ -419,41 +928,64 @@ class TestWindProcessor():
         assert line == '25 09 2011 9.0 1.000000 2.000000\n'
 
 
+    def test_format_data_buffer_matches_format_data(self):
+        """format_data_buffer is identical to joined format_data lines
+        """
+        wind = make_WindProcessor()
+        start = datetime.datetime(2011, 12, 30, 0, 0, 0)
+        values = [0, -0.0, 1e-7, 12.3456785, -3.5]
+        wind.data['wind'] = [
+            (start + datetime.timedelta(hours=i),
+             (values[i % 5], values[(i + 2) % 5]))
+            for i in range(72)]
+        expected = ''.join(wind.format_data())
+        assert wind.format_data_buffer() == expected
+
+
 class TestMeteoProcessor():
     """Unit tests for MeteoProcessor object.
     """
-    def test_read_cloud_fraction_single_avg(self):
-        """read_cloud_fraction returns expected value for single avg CF list
+    def test_read_cloud_fraction_column(self):
+        """read_cloud_fraction_column maps weather descriptions by month
         """
         meteo = make_MeteoProcessor()
         meteo.config.climate.meteo.cloud_fraction_mapping = {
             'Drizzle': [9.9675925925925934],
+            'Fog': [float(month) for month in range(1, 13)],
         }
-        record = mock.Mock(name='record')
-        record.find().text = 'Drizzle'
-        cloud_faction = meteo.read_cloud_fraction(record)
-        assert cloud_faction == 9.9675925925925934
+        meteo.raw_data = [
+            make_climate_record(datetime.datetime(2012, 4, 1, 12),
+                                weather='Fog'),
+            make_climate_record(datetime.datetime(2012, 5, 1, 12),
+                                weather='Fog'),
+            make_climate_record(datetime.datetime(2012, 5, 1, 13),
+                                weather='Drizzle'),
+            make_climate_record(datetime.datetime(2012, 5, 1, 14),
+                                weather='NA'),
+        ]
+        meteo.record_fields = ('weather',)
+        meteo.extract_columns()
+        cloud_fractions = meteo.read_cloud_fraction_column(meteo.columns)
+        assert cloud_fractions[:3].tolist() == [4.0, 5.0, 9.9675925925925934]
+        assert np.isnan(cloud_fractions[3])
 
-    def test_read_cloud_fraction_monthly_avg(self):
-        """read_cloud_fraction returns expected value for monthly avg CF list
+    def test_read_cloud_fraction_column_unrecognized(self):
+        """read_cloud_fraction_column warns once per unrecognized description
         """
         meteo = make_MeteoProcessor()
-        meteo.config.climate.meteo.cloud_fraction_mapping = {
-            'Fog': [
-                9.6210045662100452, 9.3069767441860467, 9.5945945945945947,
-                9.5, 9.931034482758621, 10.0, 9.7777777777777786,
-                9.6999999999999993, 7.8518518518518521, 8.9701492537313428,
-                9.2686980609418281, 9.0742358078602621]
-        }
-        record = mock.Mock(name='record')
-        record.find().text = 'Fog'
-
-        def mock_timestamp_data(part):
-            parts = {'year': 2012, 'month': 4, 'day': 1, 'hour': 12}
-            return parts[part]
-        record.get = mock_timestamp_data
-        cloud_faction = meteo.read_cloud_fraction(record)
-        assert cloud_faction == 9.5
+        meteo.config.climate.meteo.cloud_fraction_mapping = {}
+        meteo.raw_data = [
+            make_climate_record(datetime.datetime(2012, 4, 1, 12 + i),
+                                weather='Frogs')
+            for i in range(2)]
+        meteo.record_fields = ('weather',)
+        meteo.extract_columns()
+        with mock.patch('bloomcast.meteo.log') as mock_log:
+            cloud_fractions = meteo.read_cloud_fraction_column(meteo.columns)
+        assert cloud_fractions.tolist() == [10, 10]
+        mock_log.warning.assert_called_once_with(
+            'Unrecognized weather description: Frogs at 2012-04-01 12:00:00; '
+            'cloud fraction set to 10')
 
     def test_format_data(self):
         """format_data generator returns formatted forcing data file line
@@ -467,9 +999,35 @@ class TestMeteoProcessor():
         assert line == '889 2011 09 25 42' + ' 215.00' * 24 + '\n'
 
 
+    def test_format_data_buffer_matches_format_data(self):
+        """format_data_buffer is identical to joined format_data lines
+        """
+        meteo = make_MeteoProcessor()
+        meteo.config.climate.meteo.station_id = 51442
+        start = datetime.datetime(2012, 2, 28, 0, 0, 0)
+        values = [0, -0.0, 0.005, 215.125, -3.456, 99.995]
+        meteo.data['air_temperature'] = [
+            (start + datetime.timedelta(hours=i), values[i % 6])
+            for i in range(24 * 3 + 5)]
+        expected = ''.join(meteo.format_data('air_temperature'))
+        assert meteo.format_data_buffer('air_temperature') == expected
+
+
 class TestRiverProcessor():
     """Uni tests for RiverProcessor object.
     """
+    def test_format_data_buffer_matches_format_data(self):
+        """format_data_buffer is identical to joined format_data lines
+        """
+        rivers = make_RiversProcessor()
+        values = [4200.0, 0.123456789, 1234567.5, 8.25e-3]
+        rivers.data['major'] = [
+            (datetime.date(2011, 12, 29) + datetime.timedelta(days=i),
+             values[i % 4])
+            for i in range(10)]
+        expected = ''.join(rivers.format_data('major'))
+        assert rivers.format_data_buffer('major') == expected
+
     def test_date_params(self):
         """_date_params handles month-end rollover correctly
         """
@@ -485,6 +1043,105 @@ class TestRiverProcessor():
         }
         assert rivers._date_params(2011) == expected
 
+    def test_incremental_start_date(self, tmpdir):
+        """_incremental_start_date returns date of last line in file
+        """
+        rivers = make_RiversProcessor()
+        rivers.config.incremental_forcing = True
+        output_file = tmpdir.join('major_river')
+        output_file.write(
+            '2011 12 30 4.200000e+03\n2011 12 31 4.300000e+03\n')
+        since = rivers._incremental_start_date(
+            str(output_file), rivers._line_timestamp)
+        assert since == datetime.date(2011, 12, 31)
+
+    def test_incremental_start_date_disabled(self, tmpdir):
+        """_incremental_start_date returns None if incremental disabled
+        """
+        rivers = make_RiversProcessor()
+        rivers.config.incremental_forcing = False
+        output_file = tmpdir.join('major_river')
+        output_file.write('2011 12 31 4.300000e+03\n')
+        assert rivers._incremental_start_date(
+            str(output_file), rivers._line_timestamp) is None
+
+    def test_incremental_start_date_no_file(self, tmpdir):
+        """_incremental_start_date returns None if file does not exist
+        """
+        rivers = make_RiversProcessor()
+        rivers.config.incremental_forcing = True
+        output_file = tmpdir.join('major_river')
+        assert rivers._incremental_start_date(
+            str(output_file), rivers._line_timestamp) is None
+
+    def test_update_forcing_file_appends(self, tmpdir):
+        """_update_forcing_file appends new lines after unchanged overlap
+        """
+        rivers = make_RiversProcessor()
+        output_file = tmpdir.join('major_river')
+        output_file.write(
+            '2011 12 29 4.100000e+03\n'
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.300000e+03\n')
+        buffer = (
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.300000e+03\n'
+            '2012 01 01 4.400000e+03\n')
+        assert rivers._update_forcing_file(
+            str(output_file), buffer, rivers._line_timestamp)
+        assert output_file.read() == (
+            '2011 12 29 4.100000e+03\n'
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.300000e+03\n'
+            '2012 01 01 4.400000e+03\n')
+
+    def test_update_forcing_file_splices_revised_lines(self, tmpdir):
+        """_update_forcing_file replaces lines from first revised one
+        """
+        rivers = make_RiversProcessor()
+        output_file = tmpdir.join('major_river')
+        output_file.write(
+            '2011 12 29 4.100000e+03\n'
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.300000e+03\n')
+        buffer = (
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.350000e+03\n'
+            '2012 01 01 4.400000e+03\n')
+        assert rivers._update_forcing_file(
+            str(output_file), buffer, rivers._line_timestamp)
+        assert output_file.read() == (
+            '2011 12 29 4.100000e+03\n'
+            '2011 12 30 4.200000e+03\n'
+            '2011 12 31 4.350000e+03\n'
+            '2012 01 01 4.400000e+03\n')
+
+    def test_update_forcing_file_first_line_changed(self, tmpdir):
+        """_update_forcing_file returns False if first new line changed
+        """
+        rivers = make_RiversProcessor()
+        output_file = tmpdir.join('major_river')
+        contents = (
+            '2011 12 29 4.100000e+03\n'
+            '2011 12 30 4.200000e+03\n')
+        output_file.write(contents)
+        buffer = (
+            '2011 12 30 4.250000e+03\n'
+            '2011 12 31 4.300000e+03\n')
+        assert not rivers._update_forcing_file(
+            str(output_file), buffer, rivers._line_timestamp)
+        assert output_file.read() == contents
+
+    def test_update_forcing_file_no_overlap(self, tmpdir):
+        """_update_forcing_file returns False if new lines don't overlap
+        """
+        rivers = make_RiversProcessor()
+        output_file = tmpdir.join('major_river')
+        output_file.write('2011 12 29 4.100000e+03\n')
+        buffer = '2011 12 31 4.300000e+03\n'
+        assert not rivers._update_forcing_file(
+            str(output_file), buffer, rivers._line_timestamp)
+
     def test_process_data_1_row(self):
         """process_data produces expected result for 1 row of data
         """
@@ -576,6 +1233,36 @@ class TestRiverProcessor():
         ]
         assert rivers.data['major'] == expected
 
+    def test_parse_data_table_across_chunks(self):
+        """_parse_data_table parses table rows split across chunks
+        """
+        rivers = make_RiversProcessor()
+        html = (
+            b'<html><table id="other"><tr><td>2011-01-01 00:00:00</td>'
+            b'<td>1.0</td></tr></table>'
+            b'<table class="data" id="dataTable">'
+            b'<tr><th>Date</th><th>Discharge</th></tr>'
+            b'<tr><td>2011-09-27 21:11:00</td><td>4200.0</td></tr>'
+            b'<tr><td>2011-09-27 21:35:00</td><td>4400.0*</td></tr>'
+            b'<tr><td>2011-09-28 21:11:00</td><td><b>3200.0</b></td></tr>'
+            b'</table></html>')
+        chunks = [html[i:i + 17] for i in range(0, len(html), 17)]
+        datestamps, flows = rivers._parse_data_table(chunks)
+        assert datestamps.tolist() == [
+            '2011-09-27', '2011-09-27', '2011-09-28']
+        assert flows.tolist() == ['4200.0', '4400.0*', '3200.0']
+
+    def test_process_data_fast_parser_rows(self):
+        """process_data averages rows from fast parser by day
+        """
+        rivers = make_RiversProcessor()
+        rivers.raw_data = (
+            np.array(['2011-09-27', '2011-09-27', '2011-09-28']),
+            np.array(['4200.0', '4400.0*', '3200.0']),
+        )
+        rivers.process_data('major', end_date=datetime.date(2011, 9, 27))
+        assert rivers.data['major'] == [(datetime.date(2011, 9, 27), 4300.0)]
+
     def test_format_data(self):
         """format_data generator returns formatted forcing data file line
         """
@@ -594,7 +1281,7 @@ class TestRiverProcessor():
             (datetime.date(2011, 10, 23), 4300.0),
             (datetime.date(2011, 10, 25), 4500.0),
         ]
-        processor.interpolate_values = mock.Mock(name='interpolate_values')
+        processor._interpolate_gaps = mock.Mock(name='_interpolate_gaps')
         with mock.patch('bloomcast.rivers.log') as mock_log:
             processor.patch_data('major')
         expected = (datetime.date(2011, 10, 24), None)
@@ -605,8 +1292,7 @@ class TestRiverProcessor():
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        processor.interpolate_values.assert_called_once_with(
-            'major', 1, 1)
+        processor._interpolate_gaps.assert_called_once_with('major')
 
     def test_patch_data_2_day_gap(self):
         """patch_data correctly flags 2 day gap in data for interpolation
@@ -616,7 +1302,7 @@ class TestRiverProcessor():
             (datetime.date(2011, 10, 23), 4300.0),
             (datetime.date(2011, 10, 26), 4600.0),
         ]
-        processor.interpolate_values = mock.Mock(name='interpolate_values')
+        processor._interpolate_gaps = mock.Mock(name='_interpolate_gaps')
         with mock.patch('bloomcast.rivers.log') as mock_log:
             processor.patch_data('major')
         expected = [
@@ -625,14 +1311,12 @@ class TestRiverProcessor():
         ]
         assert processor.data['major'][1:3] == expected
         expected = [
-            (('major river data patched for 2011-10-24',),),
-            (('major river data patched for 2011-10-25',),),
+            (('major river data patched for 2011-10-24 to 2011-10-25',),),
             (('2 major river data values patched; '
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        processor.interpolate_values.assert_called_once_with(
-            'major', 1, 2)
+        processor._interpolate_gaps.assert_called_once_with('major')
 
     def test_patch_data_2_gaps(self):
         """patch_data correctly flags 2 gaps in data for interpolation
@@ -644,7 +1328,7 @@ class TestRiverProcessor():
             (datetime.date(2011, 10, 26), 4500.0),
             (datetime.date(2011, 10, 29), 4200.0),
         ]
-        processor.interpolate_values = mock.Mock(name='interpolate_values')
+        processor._interpolate_gaps = mock.Mock(name='_interpolate_gaps')
         with mock.patch('bloomcast.rivers.log') as mock_log:
             processor.patch_data('major')
         expected = (datetime.date(2011, 10, 24), None)
@@ -656,43 +1340,756 @@ class TestRiverProcessor():
         assert processor.data['major'][4:6] == expected
         expected = [
             (('major river data patched for 2011-10-24',),),
-            (('major river data patched for 2011-10-27',),),
-            (('major river data patched for 2011-10-28',),),
+            (('major river data patched for 2011-10-27 to 2011-10-28',),),
             (('3 major river data values patched; '
               'see debug log on disk for details',),),
         ]
         assert mock_log.debug.call_args_list == expected
-        expected = [(('major', 1, 1),), (('major', 4, 5),)]
-        assert processor.interpolate_values.call_args_list == expected
+        processor._interpolate_gaps.assert_called_once_with('major')
 
-    def test_interpolate_values_1_day_gap(self):
-        """interpolate_values interpolates value for 1 day gap in data
+    def test_patch_data_interpolates_1_day_gap(self):
+        """patch_data interpolates value for 1 day gap in data
         """
         processor = make_RiversProcessor()
         processor.data = {}
         processor.data['major'] = [
             (datetime.date(2011, 10, 23), 4300.0),
-            (datetime.date(2011, 10, 24), None),
             (datetime.date(2011, 10, 25), 4500.0),
         ]
-        processor.interpolate_values('major', 1, 1)
+        processor.patch_data('major')
         expected = (datetime.date(2011, 10, 24), 4400.0)
         assert processor.data['major'][1] == expected
 
-    def test_interpolate_values_2_day_gap(self):
-        """interpolate_values interpolates value for 2 day gap in data
+    def test_patch_data_interpolates_2_day_gap(self):
+        """patch_data interpolates values for 2 day gap in data
         """
         processor = make_RiversProcessor()
         processor.data = {}
         processor.data['major'] = [
             (datetime.date(2011, 10, 23), 4300.0),
-            (datetime.date(2011, 10, 24), None),
-            (datetime.date(2011, 10, 25), None),
             (datetime.date(2011, 10, 26), 4600.0),
         ]
-        processor.interpolate_values('major', 1, 2)
+        processor.patch_data('major')
         expected = [
             (datetime.date(2011, 10, 24), 4400.0),
             (datetime.date(2011, 10, 25), 4500.0),
         ]
         assert processor.data['major'][1:3] == expected
+
+    def test_patch_data_no_gaps(self):
+        """patch_data leaves data without gaps unchanged and does not log
+        """
+        processor = make_RiversProcessor()
+        processor.data['major'] = [
+            (datetime.date(2011, 10, 23), 4300.0),
+            (datetime.date(2011, 10, 24), 4500.0),
+        ]
+        with mock.patch('bloomcast.rivers.log') as mock_log:
+            processor.patch_data('major')
+        assert processor.data['major'] == [
+            (datetime.date(2011, 10, 23), 4300.0),
+            (datetime.date(2011, 10, 24), 4500.0),
+        ]
+        assert not mock_log.debug.called
+
+
+class TestSOG_Timeseries():
+    """Unit tests for SOG_Timeseries object and read_SOG_timeseries
+    function.
+    """
+    RESULTS = (
+        '*FromCode: SOG\n'
+        '*FieldNames: time, 3 m avg temperature, 3 m avg salinity\n'
+        '*FieldUnits: hr since 2013-09-19 18:49:00 LST, deg C, None\n'
+        '*EndOfHeader\n'
+        '  0.25  9.5  29.1\n'
+        '  0.50  9.4  29.2\n'
+        '  0.75  9.3  2'
+    )
+
+    def test_read_SOG_timeseries(self, tmpdir):
+        """read_SOG_timeseries reads all requested columns in 1 pass
+        """
+        from bloomcast.utils import read_SOG_timeseries
+        tmpdir.join('std_phys.out').write(self.RESULTS)
+        timeseries = read_SOG_timeseries(
+            str(tmpdir.join('std_phys.out')), 'time',
+            ['3 m avg temperature', '3 m avg salinity'])
+        temperature = timeseries['3 m avg temperature']
+        salinity = timeseries['3 m avg salinity']
+        np.testing.assert_array_equal(temperature.indep_data, [0.25, 0.5])
+        np.testing.assert_array_equal(temperature.dep_data, [9.5, 9.4])
+        np.testing.assert_array_equal(salinity.dep_data, [29.1, 29.2])
+        assert salinity.indep_data is temperature.indep_data
+        assert temperature.dep_units == 'deg C'
+        assert salinity.indep_units == 'hr since 2013-09-19 18:49:00 LST'
+
+    def test_read_data(self, tmpdir):
+        """read_data reads the independent and dependent columns
+        """
+        from bloomcast.utils import SOG_Timeseries
+        tmpdir.join('std_phys.out').write(self.RESULTS)
+        salinity = SOG_Timeseries(str(tmpdir.join('std_phys.out')))
+        salinity.read_data('time', '3 m avg salinity')
+        np.testing.assert_array_equal(salinity.indep_data, [0.25, 0.5])
+        np.testing.assert_array_equal(salinity.dep_data, [29.1, 29.2])
+        assert salinity.dep_units == 'None'
+
+    def test_calc_mpl_dates(self):
+        """calc_mpl_dates converts hours after run start to mpl dates
+        """
+        from matplotlib.dates import date2num
+        from bloomcast.utils import SOG_Timeseries
+        timeseries = SOG_Timeseries('std_phys.out')
+        timeseries.indep_data = np.array([0.25, 36])
+        run_start_date = datetime.datetime(2013, 9, 19)
+        timeseries.calc_mpl_dates(run_start_date)
+        np.testing.assert_allclose(
+            timeseries.mpl_dates,
+            date2num([datetime.datetime(2013, 9, 19, 0, 15),
+                      datetime.datetime(2013, 9, 20, 12)]))
+
+    def make_timeseries(self):
+        from bloomcast.utils import SOG_Timeseries
+        timeseries = SOG_Timeseries('std_phys.out')
+        timeseries.indep_data = np.arange(0, 5, 0.5)
+        timeseries.dep_data = np.arange(10, 20, 1.0)
+        return timeseries
+
+    def test_window(self):
+        """window slices data to times between start and end inclusive
+        """
+        timeseries = self.make_timeseries()
+        dep_data = timeseries.dep_data
+        timeseries.window(1, 2)
+        np.testing.assert_array_equal(timeseries.indep_data, [1, 1.5, 2])
+        np.testing.assert_array_equal(timeseries.dep_data, [12, 13, 14])
+        assert np.shares_memory(timeseries.dep_data, dep_data)
+
+    def test_window_not_in_place(self):
+        """window returns the slices when in_place is false
+        """
+        timeseries = self.make_timeseries()
+        indep_slice, dep_slice = timeseries.window(3.25, in_place=False)
+        np.testing.assert_array_equal(indep_slice, [3.5, 4, 4.5])
+        np.testing.assert_array_equal(dep_slice, [17, 18, 19])
+        assert timeseries.dep_data.size == 10
+
+    def test_window_dates(self):
+        """window slices daily data by dates
+        """
+        timeseries = self.make_timeseries()
+        timeseries.indep_data = np.array(
+            [datetime.date(2014, 3, day) for day in range(1, 11)])
+        timeseries.window(datetime.date(2014, 3, 8))
+        np.testing.assert_array_equal(timeseries.dep_data, [17, 18, 19])
+
+    def test_window_slice_mpl_dates_exclusive_start(self):
+        """window_slice searches mpl_dates and can exclude start
+        """
+        timeseries = self.make_timeseries()
+        timeseries.mpl_dates = timeseries.indep_data + 735000
+        window = timeseries.window_slice(
+            735001, 735002, mpl_dates=True, exclusive_start=True)
+        assert window == slice(3, 5)
+
+    def test_value_at(self):
+        """value_at returns value at first time at or after time
+        """
+        timeseries = self.make_timeseries()
+        assert timeseries.value_at(1.5) == 13
+        assert timeseries.value_at(1.6) == 14
+
+
+class TestSOG_HoffmuellerProfile():
+    """Unit tests for SOG_HoffmuellerProfile object, and
+    read_SOG_Hoffmueller_profiles function and HoffmuellerIndex object.
+    """
+    HEADER = (
+        '*FieldNames: depth, temperature, salinity\n'
+        '*FieldUnits: m, deg C, None\n'
+        '*EndOfHeader\n'
+    )
+
+    def profile(self, number):
+        return ''.join(
+            '{0} {1} {2}\n'.format(depth, number, 29 + depth)
+            for depth in range(3))
+
+    def test_read_SOG_Hoffmueller_profiles(self, tmpdir):
+        """read_SOG_Hoffmueller_profiles reads all fields of a profile
+        """
+        from bloomcast.utils import read_SOG_Hoffmueller_profiles
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + '\n'.join(
+            self.profile(number) for number in range(1, 4)))
+        profiles = read_SOG_Hoffmueller_profiles(
+            str(hoff), 'depth', ['temperature', 'salinity'], 2)
+        np.testing.assert_array_equal(
+            profiles['temperature'].indep_data, [0, 1, 2])
+        np.testing.assert_array_equal(
+            profiles['temperature'].dep_data, [2, 2, 2])
+        np.testing.assert_array_equal(
+            profiles['salinity'].dep_data, [29, 30, 31])
+        assert profiles['salinity'].dep_units == 'None'
+        assert tmpdir.join('hoff.out.index.npz').check()
+
+    def test_read_data_no_such_profile(self, tmpdir):
+        """read_data reads empty arrays for a profile not in the file
+        """
+        from bloomcast.utils import SOG_HoffmuellerProfile
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + self.profile(1))
+        profile = SOG_HoffmuellerProfile(str(hoff))
+        profile.read_data('depth', 'temperature', 2)
+        assert profile.indep_data.size == 0
+        assert profile.dep_data.size == 0
+        assert profile.dep_units == 'deg C'
+
+    def test_index_extended_as_file_grows(self, tmpdir):
+        """HoffmuellerIndex scans only the data appended since last scan
+        """
+        from bloomcast.utils import (
+            HoffmuellerIndex,
+            SOG_HoffmuellerProfile,
+        )
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + self.profile(1) + '\n' + self.profile(2))
+        profile = SOG_HoffmuellerProfile(str(hoff))
+        profile.read_data('depth', 'temperature', 2)
+        hoff.write('\n' + self.profile(3) + '\n' + '0 4', mode='a')
+        index = HoffmuellerIndex(str(hoff))
+        with open(str(hoff), 'rb') as file_obj:
+            offsets, scanned_to = index.update(file_obj)
+        assert offsets.size == 4
+        assert scanned_to == hoff.size() - len('0 4')
+        profile.read_data('depth', 'temperature', 3)
+        np.testing.assert_array_equal(profile.dep_data, [3, 3, 3])
+        profile.read_data('depth', 'temperature', 4)
+        assert profile.dep_data.size == 0
+
+    def test_index_rebuilt_for_rewritten_file(self, tmpdir):
+        """HoffmuellerIndex is rebuilt when the results file is rewritten
+        """
+        from bloomcast.utils import SOG_HoffmuellerProfile
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + self.profile(1) + '\n' + self.profile(2))
+        profile = SOG_HoffmuellerProfile(str(hoff))
+        profile.read_data('depth', 'temperature', 2)
+        hoff.remove()
+        hoff.write(
+            self.HEADER + self.profile(15) + '\n' + self.profile(16)
+            + '\n' + self.profile(17))
+        profile.read_data('depth', 'temperature', 2)
+        np.testing.assert_array_equal(profile.dep_data, [16, 16, 16])
+
+    def test_read_all_data(self, tmpdir):
+        """read_all_data reads a depth by profile array of a field
+        """
+        from bloomcast.utils import SOG_HoffmuellerProfile
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + '\n'.join(
+            self.profile(number) for number in range(1, 4)) + '\n0 4 ')
+        profile = SOG_HoffmuellerProfile(str(hoff))
+        profile.read_all_data('depth', 'temperature')
+        np.testing.assert_array_equal(profile.indep_data, [0, 1, 2])
+        np.testing.assert_array_equal(
+            profile.dep_data, [[1, 2, 3], [1, 2, 3], [1, 2, 3]])
+        assert profile.dep_units == 'deg C'
+        assert tmpdir.join('hoff.out.arrays', 'temperature.npy').check()
+
+    def test_Hoffmueller_arrays_cache_reused(self, tmpdir):
+        """HoffmuellerArrays only parses the results file when it changes
+        """
+        from bloomcast.utils import (
+            HoffmuellerArrays,
+            read_SOG_Hoffmueller_arrays,
+        )
+        hoff = tmpdir.join('hoff.out')
+        hoff.write(self.HEADER + self.profile(1) + '\n' + self.profile(2))
+        read_SOG_Hoffmueller_arrays(str(hoff), 'depth', ['salinity'])
+        with mock.patch.object(HoffmuellerArrays, '_build') as mock_build:
+            profiles = read_SOG_Hoffmueller_arrays(
+                str(hoff), 'depth', ['salinity'])
+        assert not mock_build.called
+        assert isinstance(profiles['salinity'].dep_data, np.memmap)
+        hoff.write('\n' + self.profile(3), mode='a')
+        profiles = read_SOG_Hoffmueller_arrays(
+            str(hoff), 'depth', ['temperature', 'salinity'])
+        assert profiles['temperature'].dep_data.shape == (3, 3)
+        np.testing.assert_array_equal(
+            profiles['salinity'].dep_data[:, 2], [29, 30, 31])
+
+
+class TestBloomcast():
+    """Unit tests for Bloomcast object.
+    """
+    def _mock_SOGcommand(self, sleeps):
+        """Return a mock SOGcommand module whose run function starts a
+        Python process that sleeps for the time given for the edits.
+        """
+        def run(SOG_exec, infile, edit_files, outfile):
+            return subprocess.Popen([
+                sys.executable, '-c',
+                'import time; time.sleep({0})'.format(sleeps[edit_files])])
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = run
+        return mock_SOGcommand
+
+    def test_run_SOG_yields_keys_as_runs_finish(self):
+        """_run_SOG generates member keys in the order runs finish
+        """
+        bloomcast = make_Bloomcast()
+        bloomcast.config.run_SOG = True
+        bloomcast.config.max_concurrent_SOG_runs = 2
+        bloomcast.config.logging.run_metrics_log_filename = None
+        bloomcast.config.SOG_run_cache = None
+        bloomcast.config.SOG_early_stop_margin_days = None
+        bloomcast.config.SOG_watchdog = None
+        bloomcast.config.logging.SOG_progress_log_interval = None
+        bloomcast.config.run_start_date = datetime.datetime(2013, 9, 19)
+        bloomcast.config.run_end_dates = {
+            'slow': datetime.datetime(2014, 5, 1),
+            'fast': datetime.datetime(2014, 5, 1),
+        }
+        bloomcast.config.std_bio_ts_outfiles = {
+            'slow': 'std_bio_slow.out', 'fast': 'std_bio_fast.out'}
+        bloomcast.config.infiles = {
+            'base': 'infile.yaml',
+            'edits': {'slow': 'slow', 'fast': 'fast'},
+        }
+        mock_SOGcommand = self._mock_SOGcommand({'slow': 1, 'fast': 0})
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            keys = list(bloomcast._run_SOG())
+        assert keys == ['fast', 'slow']
+
+    def test_run_SOG_skipped(self):
+        """_run_SOG generates all member keys when SOG is not run
+        """
+        bloomcast = make_Bloomcast()
+        bloomcast.config.run_SOG = False
+        bloomcast.config.infiles = {
+            'base': 'infile.yaml',
+            'edits': {'avg_forcing': [], 'early_bloom_forcing': []},
+        }
+        keys = list(bloomcast._run_SOG())
+        assert keys == ['avg_forcing', 'early_bloom_forcing']
+
+    def test_bloom_date_bounds(self):
+        """_bloom_date_bounds returns earliest and latest bound members
+        """
+        bloomcast = make_Bloomcast()
+        bloomcast.members = ['avg_forcing', '1993', '1999', '2005']
+        bloomcast.bloom_date = {
+            'avg_forcing': datetime.date(2014, 3, 28),
+            '1993': datetime.date(2014, 3, 20),
+            '1999': datetime.date(2014, 4, 12),
+            '2005': datetime.date(2014, 3, 30),
+        }
+        assert bloomcast._bloom_date_bounds() == ['1993', '1999']
+
+    def test_bloom_date_bounds_no_bound_members(self):
+        """_bloom_date_bounds is empty for central member only ensemble
+        """
+        bloomcast = make_Bloomcast()
+        bloomcast.members = ['avg_forcing']
+        bloomcast.bloom_date = {'avg_forcing': datetime.date(2014, 3, 28)}
+        assert bloomcast._bloom_date_bounds() == []
+
+
+class TestEnsembleScheduler():
+    """Unit tests for EnsembleScheduler object.
+    """
+    def test_run_limits_concurrent_runs(self):
+        """run never has more than max_concurrent SOG runs at a time
+        """
+        from bloomcast.ensemble import EnsembleScheduler
+        scheduler = EnsembleScheduler('SOG', 'infile.yaml', max_concurrent=2)
+        concurrent = []
+
+        def run(SOG_exec, infile, edit_files, outfile):
+            concurrent.append(len(scheduler.running) + 1)
+            return subprocess.Popen(
+                [sys.executable, '-c', 'import time; time.sleep(0.1)'])
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = run
+        for year in range(1990, 1995):
+            scheduler.add_member(str(year), [])
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            keys = list(scheduler.run())
+        assert sorted(keys) == ['1990', '1991', '1992', '1993', '1994']
+        assert max(concurrent) == 2
+        assert not scheduler.running
+
+    def test_run_records_resource_usage_metrics(self, tmpdir):
+        """run appends a line of JSON resource usage metrics per member
+        """
+        from bloomcast.ensemble import EnsembleScheduler
+        metrics_file = tmpdir.join('SOG_run_metrics.log')
+        scheduler = EnsembleScheduler(
+            'SOG', 'infile.yaml', max_concurrent=2,
+            metrics_file=str(metrics_file))
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = (
+            lambda *args: subprocess.Popen(
+                [sys.executable, '-c', 'import sys; sys.exit(3)']))
+        for key in ('avg_forcing', 'early_bloom_forcing'):
+            scheduler.add_member(key, [])
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            list(scheduler.run())
+        lines = [json.loads(line) for line in metrics_file.readlines()]
+        assert sorted(line['member'] for line in lines) == [
+            'avg_forcing', 'early_bloom_forcing']
+        for line in lines:
+            assert line['returncode'] == 3
+            assert line['user_time'] >= 0
+            assert line['max_rss_kb'] > 0
+            assert line['wall_time'] > 0
+
+    def test_max_concurrent_defaults_to_cpu_count(self):
+        """max_concurrent defaults to number of CPU cores
+        """
+        from bloomcast.ensemble import EnsembleScheduler
+        with mock.patch('bloomcast.ensemble.os.cpu_count', return_value=8):
+            scheduler = EnsembleScheduler('SOG', 'infile.yaml', None)
+        assert scheduler.max_concurrent == 8
+
+    def test_run_stops_member_when_watcher_allows(self):
+        """run terminates a member's SOG run when its watcher allows it
+        """
+        from bloomcast.ensemble import EnsembleScheduler
+        scheduler = EnsembleScheduler('SOG', 'infile.yaml', max_concurrent=1)
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = (
+            lambda *args: subprocess.Popen(
+                [sys.executable, '-c', 'import time; time.sleep(30)']))
+        watcher = mock.Mock(
+            interval=0.01, latest_hours=2424.0,
+            first_low_nitrate_days=(60, 61))
+        watcher.update.return_value = True
+        scheduler.add_member('avg_forcing', [], watcher)
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            keys = list(scheduler.run())
+        assert keys == ['avg_forcing']
+        assert scheduler.metrics['avg_forcing']['stopped_early']
+        assert scheduler.metrics['avg_forcing']['returncode'] != 0
+        assert scheduler.metrics['avg_forcing']['wall_time'] < 30
+
+    def test_run_records_throughput_metrics(self, tmpdir):
+        """run adds simulated hours and throughput to a member's metrics
+        """
+        from bloomcast.ensemble import (
+            EnsembleScheduler,
+            RunProgress,
+        )
+        tmpdir.join('std_bio.out').write(
+            '*FieldNames: time, 3 m avg nitrate concentration\n'
+            '*EndOfHeader\n'
+            '0.25 30.1\n12.0 29.8\n')
+        scheduler = EnsembleScheduler('SOG', 'infile.yaml')
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = (
+            lambda *args: subprocess.Popen(
+                [sys.executable, '-c', 'import time; time.sleep(0.05)']))
+        scheduler.add_member(
+            'avg_forcing', [],
+            progress=RunProgress(str(tmpdir.join('std_bio.out')), 5400))
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            list(scheduler.run())
+        metrics = scheduler.metrics['avg_forcing']
+        assert metrics['simulated_hours'] == 12.0
+        assert metrics['throughput'] == 12.0 / metrics['wall_time']
+
+    def test_run_skips_member_terminated_by_watchdog(self):
+        """run does not generate the key of a member killed by watchdog
+        """
+        from bloomcast.ensemble import EnsembleScheduler
+        scheduler = EnsembleScheduler('SOG', 'infile.yaml', max_concurrent=2)
+        sleeps = {'hung': 30, 'ok': 0}
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        mock_SOGcommand.api.run.side_effect = (
+            lambda SOG_exec, infile, edit_files, outfile: subprocess.Popen(
+                [sys.executable, '-c',
+                 'import time; time.sleep({0})'.format(sleeps[outfile[:-7]])]))
+        watchdog = mock.Mock(interval=0.01)
+        watchdog.check.return_value = 'it is hung'
+        scheduler.add_member('hung', [], watchdog=watchdog)
+        scheduler.add_member('ok', [])
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            keys = list(scheduler.run())
+        assert keys == ['ok']
+        assert scheduler.failed == {'hung': 'it is hung'}
+        assert scheduler.metrics['hung']['failed'] == 'it is hung'
+        assert scheduler.metrics['hung']['wall_time'] < 30
+
+
+class TestBloomWatcher():
+    """Unit tests for BloomWatcher object.
+    """
+    HEADER = (
+        '*FieldNames: time, 3 m avg nitrate concentration\n'
+        '*FieldUnits: hr since 2013-09-19 18:49:00 LST, uM N\n'
+        '*EndOfHeader\n'
+    )
+
+    def make_watcher(self, tmpdir):
+        from bloomcast.ensemble import BloomWatcher
+        return BloomWatcher(
+            str(tmpdir.join('std_bio.out')), jan1_hours=24,
+            steps_per_day=2, not_before_hours=0, nitrate_threshold=0.5,
+            peak_half_width=4, margin_days=1)
+
+    def test_update_finds_first_low_nitrate_days(self, tmpdir):
+        """update finds 1st 2 days after Jan 1 with low daily min nitrate
+        """
+        watcher = self.make_watcher(tmpdir)
+        tmpdir.join('std_bio.out').write(
+            self.HEADER
+            + '0.0 0.1\n12.0 0.1\n'
+            + '24.0 5.0\n36.0 5.0\n'
+            + '48.0 0.4\n60.0 5.0\n'
+            + '72.0 0.6\n84.')
+        assert not watcher.update()
+        assert watcher.first_low_nitrate_days is None
+        assert watcher.latest_hours == 72.0
+        tmpdir.join('std_bio.out').write('0 0.3\n', mode='a')
+        assert not watcher.update()
+        assert watcher.first_low_nitrate_days == (1, 2)
+        assert watcher.stop_hours == 24 + (2 + 1 + 4 + 1) * 24
+
+    def test_update_allows_stop_after_peak_window_and_margin(self, tmpdir):
+        """update returns True once the run has passed the stop time
+        """
+        watcher = self.make_watcher(tmpdir)
+        lines = ['{0} 0.1'.format(hours) for hours in range(24, 192, 12)]
+        tmpdir.join('std_bio.out').write(
+            self.HEADER + '\n'.join(lines) + '\n')
+        assert not watcher.update()
+        tmpdir.join('std_bio.out').write('192.0 0.1\n', mode='a')
+        assert watcher.update()
+
+    def test_update_no_results_file(self, tmpdir):
+        """update returns False before SOG creates the results file
+        """
+        watcher = self.make_watcher(tmpdir)
+        assert not watcher.update()
+
+
+class TestRunWatchdog():
+    """Unit tests for RunWatchdog object and median_wall_times function.
+    """
+    def test_check_wall_time_budget(self, tmpdir):
+        """check reports a run that exceeds its wall time budget
+        """
+        from bloomcast.ensemble import RunWatchdog
+        watchdog = RunWatchdog(str(tmpdir.join('std_bio.out')), 0.01, None)
+        watchdog.start()
+        assert watchdog.check() is None
+        time.sleep(0.02)
+        assert 'wall time budget' in watchdog.check()
+
+    def test_check_stalled_output(self, tmpdir):
+        """check reports a run whose results file stops growing
+        """
+        from bloomcast.ensemble import RunWatchdog
+        results = tmpdir.join('std_bio.out')
+        results.write('*EndOfHeader\n')
+        watchdog = RunWatchdog(str(results), None, 0.05)
+        watchdog.start()
+        assert watchdog.check() is None
+        time.sleep(0.03)
+        results.write('0.25 30.1\n', mode='a')
+        assert watchdog.check() is None
+        time.sleep(0.06)
+        assert 'has not grown' in watchdog.check()
+
+    def test_median_wall_times(self, tmpdir):
+        """median_wall_times uses only runs of each member that completed
+        """
+        from bloomcast.ensemble import median_wall_times
+        metrics_file = tmpdir.join('SOG_run_metrics.log')
+        runs = [
+            ('avg_forcing', 0, False, None, 100),
+            ('avg_forcing', 0, False, None, 300),
+            ('avg_forcing', -15, True, None, 20),
+            ('avg_forcing', -15, True, None, 30),
+            ('avg_forcing', -15, False, 'it is hung', 9000),
+            ('avg_forcing', 1, False, None, 5),
+            ('late_bloom_forcing', 0, False, None, 120),
+        ]
+        metrics_file.write(''.join(
+            json.dumps({
+                'member': member, 'returncode': returncode,
+                'stopped_early': stopped_early, 'failed': failed,
+                'wall_time': wall_time}) + '\n'
+            for member, returncode, stopped_early, failed, wall_time in runs))
+        assert median_wall_times(str(metrics_file)) == {
+            'avg_forcing': 200, 'late_bloom_forcing': 120}
+
+    def test_median_wall_times_no_history(self, tmpdir):
+        """median_wall_times is empty when there is no metrics file
+        """
+        from bloomcast.ensemble import median_wall_times
+        assert median_wall_times(str(tmpdir.join('missing.log'))) == {}
+
+
+class TestRunProgress():
+    """Unit tests for RunProgress object.
+    """
+    HEADER = (
+        '*FieldNames: time, 3 m avg nitrate concentration\n'
+        '*FieldUnits: hr since 2013-09-19 18:49:00 LST, uM N\n'
+        '*EndOfHeader\n'
+    )
+
+    def test_update_reads_last_complete_line(self, tmpdir):
+        """update reads time from last complete line of results file
+        """
+        from bloomcast.ensemble import RunProgress
+        progress = RunProgress(str(tmpdir.join('std_bio.out')), 5400)
+        lines = ''.join(
+            '{0:.2f} 30.0\n'.format(i * 0.25) for i in range(1000))
+        tmpdir.join('std_bio.out').write(self.HEADER + lines + '250.0 2')
+        progress.update()
+        assert progress.latest_hours == 249.75
+        assert progress.remaining_hours == 5400 - 249.75
+
+    def test_update_header_only(self, tmpdir):
+        """update leaves latest time at 0 before any data is written
+        """
+        from bloomcast.ensemble import RunProgress
+        progress = RunProgress(str(tmpdir.join('std_bio.out')), 5400)
+        progress.update()
+        tmpdir.join('std_bio.out').write(self.HEADER)
+        progress.update()
+        assert progress.latest_hours == 0
+
+    def test_throughput_before_start(self, tmpdir):
+        """throughput is 0 before the run starts
+        """
+        from bloomcast.ensemble import RunProgress
+        progress = RunProgress(str(tmpdir.join('std_bio.out')), 5400)
+        assert progress.throughput() == 0
+
+
+def make_SOG_run_files(tmpdir):
+    """Create a SOG executable, infile, forcing data file, and results
+    files for SOG_RunCache tests in tmpdir.
+    """
+    tmpdir.join('SOG').write('SOG executable')
+    tmpdir.join('wind.dat').write('wind data')
+    infile = {
+        'initial_conditions': {
+            'init_datetime': {'value': '2013-09-19 18:49'},
+        },
+        'forcing_data': {
+            'wind_forcing_file': {'value': str(tmpdir.join('wind.dat'))},
+        },
+        'timeseries_results': {
+            'std_bio_ts_outfile': {
+                'value': str(tmpdir.join('timeseries', 'std_bio.out'))},
+        },
+        'profiles_results': {
+            'hoffmueller_file': {
+                'value': str(tmpdir.join('profiles', 'hoff.dat'))},
+        },
+    }
+    tmpdir.join('infile.yaml').write(yaml.safe_dump(infile))
+    tmpdir.join('timeseries', 'std_bio.out').write('bio', ensure=True)
+    tmpdir.join('profiles', 'hoff.dat').write('hoff', ensure=True)
+    return str(tmpdir.join('SOG')), str(tmpdir.join('infile.yaml'))
+
+
+class TestSOG_RunCache():
+    """Unit tests for SOG_RunCache object.
+    """
+    def test_store_restore_round_trip(self, tmpdir):
+        """restore copies stored results files back to their paths
+        """
+        from bloomcast.ensemble import SOG_RunCache
+        SOG_exec, infile = make_SOG_run_files(tmpdir)
+        cache = SOG_RunCache(str(tmpdir.join('cache')), 1024)
+        digest = cache.digest(SOG_exec, infile, [])
+        assert not cache.restore(digest, infile, [])
+        cache.store(digest, infile, [])
+        tmpdir.join('timeseries').remove()
+        tmpdir.join('profiles', 'hoff.dat').write('changed')
+        assert cache.restore(digest, infile, [])
+        assert tmpdir.join('timeseries', 'std_bio.out').read() == 'bio'
+        assert tmpdir.join('profiles', 'hoff.dat').read() == 'hoff'
+
+    def test_store_keeps_entry_stored_first_by_another_run(self, tmpdir):
+        """store discards its copy if the digest was stored meanwhile
+        """
+        from bloomcast.ensemble import SOG_RunCache
+        SOG_exec, infile = make_SOG_run_files(tmpdir)
+        cache = SOG_RunCache(str(tmpdir.join('cache')), 1024)
+        replace = os.replace
+
+        def racing_replace(src, dst):
+            tmpdir.join('cache', 'digest', 'std_bio.out').write(
+                'other', ensure=True)
+            replace(src, dst)
+        with mock.patch('bloomcast.ensemble.os.replace', racing_replace):
+            cache.store('digest', infile, [])
+        assert tmpdir.join('cache').listdir() == [
+            tmpdir.join('cache', 'digest')]
+        assert tmpdir.join('cache', 'digest', 'std_bio.out').read() == 'other'
+
+    def test_digest_changes_with_forcing_data(self, tmpdir):
+        """digest changes when a forcing data file changes
+        """
+        from bloomcast.ensemble import SOG_RunCache
+        SOG_exec, infile = make_SOG_run_files(tmpdir)
+        cache = SOG_RunCache(str(tmpdir.join('cache')), 1024)
+        digest = cache.digest(SOG_exec, infile, [])
+        assert cache.digest(SOG_exec, infile, []) == digest
+        tmpdir.join('wind.dat').write('new wind data')
+        assert cache.digest(SOG_exec, infile, []) != digest
+
+    def test_store_evicts_least_recently_used(self, tmpdir):
+        """store evicts least recently used entries beyond max_size
+        """
+        from bloomcast.ensemble import SOG_RunCache
+        SOG_exec, infile = make_SOG_run_files(tmpdir)
+        cache = SOG_RunCache(str(tmpdir.join('cache')), 10)
+        cache.store('old', infile, [])
+        os.utime(str(tmpdir.join('cache', 'old')), (0, 0))
+        cache.store('new', infile, [])
+        assert tmpdir.join('cache').listdir() == [tmpdir.join('cache', 'new')]
+
+    def test_scheduler_restores_cached_run(self, tmpdir):
+        """EnsembleScheduler restores cached members without running SOG
+        """
+        from bloomcast.ensemble import (
+            EnsembleScheduler,
+            SOG_RunCache,
+        )
+        SOG_exec, infile = make_SOG_run_files(tmpdir)
+        cache = SOG_RunCache(str(tmpdir.join('cache')), 1024)
+        cache.store(cache.digest(SOG_exec, infile, []), infile, [])
+        scheduler = EnsembleScheduler(SOG_exec, infile, run_cache=cache)
+        scheduler.add_member('avg_forcing', [])
+        mock_SOGcommand = mock.Mock(name='SOGcommand')
+        with mock.patch.dict('sys.modules', {'SOGcommand': mock_SOGcommand}):
+            keys = list(scheduler.run())
+        assert keys == ['avg_forcing']
+        assert not mock_SOGcommand.api.run.called
+
+
+class TestMonthsBefore():
+    """Unit tests for _months_before function.
+    """
+    def test_months_before_wraps_year(self):
+        """_months_before wraps back through year ends
+        """
+        from bloomcast.bloomcast import _months_before
+        result = _months_before(datetime.date(2014, 3, 15), 18)
+        assert result == datetime.date(2012, 9, 15)
+
+    def test_months_before_clamps_day(self):
+        """_months_before clamps day to end of shorter month
+        """
+        from bloomcast.bloomcast import _months_before
+        result = _months_before(datetime.date(2014, 8, 31), 18)
+        assert result == datetime.date(2013, 2, 28)